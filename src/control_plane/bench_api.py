@@ -0,0 +1,261 @@
+"""API latency benchmark for the control plane's HTTP endpoints.
+
+Seeds a SQLite database at production scale (default 10k agents, 5M
+messages), starts main.py under uvicorn against it (loopback MQTT, so no
+broker is needed) and drives concurrent HTTP load at one endpoint at a
+time. Reports p50/p95/p99/max latency and throughput per endpoint as JSON,
+tagged with the git commit so runs can be compared.
+
+Covered: /api/agents, /api/history (latest page, filtered by target, and a
+deep keyset page), /api/memory/{agent_id} and the SPA catch_all route.
+Without MEM0_API_KEY the memory endpoint reads the local memory backend,
+which the benchmark points at an empty store in a scratch directory.
+
+Usage:
+    python bench_api.py --seed --agents 10000 --messages 5000000 --db /tmp/bench-api.db
+    python bench_api.py --db /tmp/bench-api.db --concurrency 64 --duration 10
+    python bench_api.py --url http://localhost:8000   # an already running control plane
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from bench_ingest import git_commit
+from loadgen import percentiles
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# SQLAlchemy's SQLite DateTime storage format (naive UTC).
+SQLITE_TS = "%Y-%m-%d %H:%M:%S.%f"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure control-plane HTTP latency per endpoint.")
+    parser.add_argument("--db", default=None, help="SQLite path (default: a fresh temporary file, implies --seed)")
+    parser.add_argument("--seed", action="store_true", help="(re)create and seed the database first")
+    parser.add_argument("--agents", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=5000000)
+    parser.add_argument("--url", default=None, help="benchmark a running control plane instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent connections per endpoint")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds per endpoint")
+    parser.add_argument("--endpoints", default=None, help="comma-separated subset of endpoint names")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def seed(db_path: str, agents: int, messages: int, batch: int = 50000):
+    """Create the schema through the app's own init_db() and bulk-load synthetic rows."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.environ["BACON_DB_PATH"] = db_path
+    import database
+    database.init_db()
+    database.engine.dispose()
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    nodes = max(1, agents // 20)
+    agent_ids = [f"bench-agent-{i:05d}" for i in range(agents)]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    with conn:
+        conn.executemany(
+            "INSERT INTO node (id, hostname, os, capabilities) VALUES (?, ?, ?, ?)",
+            [(f"bench-node-{n:04d}", f"bench-node-{n:04d}", "linux", '["bench"]') for n in range(nodes)],
+        )
+        conn.executemany(
+            "INSERT INTO agent (id, node_id, role, operator, version, status, last_seen, parent_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(
+                agent_id, f"bench-node-{i % nodes:04d}", "unknown", "Benchmark", "1.2", "active",
+                (now - timedelta(seconds=rng.randrange(3600))).strftime(SQLITE_TS),
+                agent_ids[i - 1] if i % 5 else None,
+            ) for i, agent_id in enumerate(agent_ids)],
+        )
+
+    # Messages span the last 30 days, oldest first, like a real append-only log.
+    span = 30 * 24 * 3600
+    step = span / max(1, messages)
+    start = now - timedelta(seconds=span)
+    written = 0
+    while written < messages:
+        rows = []
+        for i in range(written, min(messages, written + batch)):
+            sender, target = rng.choice(agent_ids), rng.choice(agent_ids)
+            rows.append((
+                (start + timedelta(seconds=i * step)).strftime(SQLITE_TS), sender, target,
+                f"bacon/v1/signal/agent/{target}",
+                json.dumps({"type": "signal", "source": sender, "content": {"type": "WAKE", "reason": "bench"}}),
+                "delivered",
+            ))
+        with conn:
+            conn.executemany(
+                "INSERT INTO message (ts, sender, target, topic, payload, state) VALUES (?, ?, ?, ?, ?, ?)", rows,
+            )
+        written += len(rows)
+        print(f"  seeded {written}/{messages} messages", file=sys.stderr, end="\r")
+    print(file=sys.stderr)
+    conn.execute("ANALYZE")
+    conn.close()
+
+def endpoint_plan(agent_ids: List[str], deep_cursor: Optional[str]) -> Dict[str, Callable[[random.Random], str]]:
+    plan = {
+        "agents": lambda r: "/api/agents",
+        "history_latest": lambda r: "/api/history?limit=100",
+        "history_target": lambda r: f"/api/history?limit=50&target={r.choice(agent_ids)}",
+        "memory": lambda r: f"/api/memory/{r.choice(agent_ids)}",
+        "spa_catch_all": lambda r: f"/agents/{r.choice(agent_ids)}",
+        "static_file": lambda r: "/vite.svg",
+    }
+    if deep_cursor:
+        plan["history_deep_page"] = lambda r: f"/api/history?limit=100&cursor={deep_cursor}"
+    return plan
+
+async def find_deep_cursor(client: httpx.AsyncClient, pages: int = 50) -> Optional[str]:
+    """Walk `pages` pages into history so one scenario measures a deep keyset page."""
+    cursor = None
+    for _ in range(pages):
+        url = "/api/history?limit=1000" + (f"&cursor={cursor}" if cursor else "")
+        response = await client.get(url)
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        cursor = next_cursor
+    return cursor
+
+async def load(client: httpx.AsyncClient, make_path: Callable[[random.Random], str],
+               concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def worker(index: int):
+        nonlocal errors
+        rng = random.Random(index)
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                return
+            try:
+                response = await client.get(make_path(rng))
+                await response.aread()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            finished = time.perf_counter()
+            if started >= measure_from:
+                if ok:
+                    latencies.append(finished - started)
+                else:
+                    errors += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "latency_ms": {k: round(v * 1000, 3) for k, v in percentiles(latencies).items()},
+    }
+
+async def wait_ready(base_url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/ingest/stats")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"Control plane at {base_url} did not become ready")
+
+async def run(args, base_url: str) -> Dict[str, Any]:
+    await wait_ready(base_url)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        agent_ids = [a["id"] for a in (await client.get("/api/agents")).json()] or ["unknown"]
+        plan = endpoint_plan(agent_ids, await find_deep_cursor(client))
+        selected = args.endpoints.split(",") if args.endpoints else list(plan)
+        results = {}
+        for name in selected:
+            if name not in plan:
+                raise SystemExit(f"Unknown endpoint {name}; choose from {', '.join(plan)}")
+            results[name] = await load(client, plan[name], args.concurrency, args.duration, args.warmup)
+            r = results[name]
+            print(f"  {name:<18} {r['throughput_rps']:>9g} req/s  p50 {r['latency_ms']['p50']}ms  "
+                  f"p99 {r['latency_ms']['p99']}ms  errors {r['errors']}", file=sys.stderr)
+    return {
+        "benchmark": "api",
+        "commit": git_commit(),
+        "config": {
+            "agents": len(agent_ids),
+            "messages": args.messages if args.seed else None,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+        },
+        "endpoints": results,
+    }
+
+def start_server(db_path: str, port: int, scratch: str) -> subprocess.Popen:
+    """Run main.py from `scratch`, which also holds the local memory store."""
+    env = {
+        **os.environ,
+        "BACON_DB_PATH": db_path,
+        "BACON_MEMORY_DB_PATH": os.path.join(scratch, "bacon-memory.db"),
+        "MQTT_TRANSPORT": "loopback",
+        "PYTHONPATH": os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=scratch, env=env,
+    )
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = None
+    scratch = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        if args.db is None:
+            args.db = os.path.join(tempfile.mkdtemp(prefix="bacon-bench-"), "bench.db")
+            args.seed = True
+        if args.seed:
+            print(f"🌱 Seeding {args.db} with {args.agents} agents and {args.messages} messages...", file=sys.stderr)
+            seed(args.db, args.agents, args.messages)
+        scratch = tempfile.mkdtemp(prefix="bacon-bench-server-")
+        server = start_server(args.db, args.port, scratch)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        print(f"🚀 API benchmark against {base_url}", file=sys.stderr)
+        report = asyncio.run(run(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,244 @@
+"""Ingestion throughput benchmark for the control plane.
+
+Starts main.py's ingestion path (presence/signal monitors, PresenceBatcher,
+MessageLogWriter) against the in-process loopback broker and a scratch
+SQLite database, then replays heartbeat/signal mixes from loadgen.py at
+increasing rates. For each rate it records:
+
+- sustained msgs/s: published messages made visible in SQLite, per
+  second from the first publish until the last of them became visible
+  (after the backlog drains, so the final coalescing window counts)
+- publish -> DB visibility lag: from the publish call until the batch
+  holding that heartbeat/signal has committed
+- event-loop lag while the stage runs
+- how long the backlog took to drain once publishing stopped
+
+The publishers share the event loop with the control plane, so the numbers
+are a lower bound on what main.py absorbs from a remote broker. Results are
+JSON so two commits can be compared.
+
+Usage:
+    python bench_ingest.py --rates 500,1000,2000,5000 --duration 5 --output ingest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Tuple
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure control-plane ingestion throughput and lag.")
+    parser.add_argument("--rates", default="250,500,1000,2000,4000", help="comma-separated msgs/s steps")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per step")
+    parser.add_argument("--signal-fraction", type=float, default=0.2, help="share of traffic that is signals")
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--agents-per-node", type=int, default=25)
+    parser.add_argument("--sub-agents", type=int, default=1)
+    parser.add_argument("--publishers", type=int, default=16)
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="max seconds to wait for the backlog")
+    parser.add_argument("--keep-going", action="store_true", help="run every step even after one is not sustained")
+    parser.add_argument("--db", default=None, help="SQLite path (default: a fresh temporary file)")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+class VisibilityTracker:
+    """Matches published messages to the DB batches that made them visible.
+
+    Accounting is per message. Heartbeats coalesce per agent, so a flushed
+    record makes visible every heartbeat of that agent stamped at or before
+    its own ts (the newer state supersedes them), not just one.
+    """
+
+    def __init__(self):
+        # Per agent: (payload ts, publish time) of heartbeats not yet in the DB, oldest first.
+        self.presence_pending: Dict[str, Deque[Tuple[datetime, float]]] = {}
+        self.signal_pending: Dict[str, float] = {}
+        self.lags: List[float] = []
+        self.visible = 0
+        self.last_visible = 0.0
+        self._presence_outstanding = 0
+
+    def on_publish(self, kind: str, topic: str, body: str, started: float):
+        if kind == "presence":
+            ts = datetime.fromisoformat(json.loads(body)["ts"])
+            self.presence_pending.setdefault(topic.rsplit("/", 1)[-1], deque()).append((ts, started))
+            self._presence_outstanding += 1
+        else:
+            self.signal_pending[body] = started
+
+    def on_presence_flush(self, records: List[Dict[str, Any]]):
+        now = time.perf_counter()
+        for record in records:
+            pending = self.presence_pending.get(record["agent_id"])
+            while pending and pending[0][0] <= record["ts"]:
+                _, started = pending.popleft()
+                self.lags.append(now - started)
+                self.visible += 1
+                self.last_visible = now
+                self._presence_outstanding -= 1
+
+    def on_message_flush(self, rows: List[Dict[str, Any]]):
+        now = time.perf_counter()
+        for row in rows:
+            started = self.signal_pending.pop(row["payload"], None)
+            if started is not None:
+                self.lags.append(now - started)
+                self.visible += 1
+                self.last_visible = now
+
+    def pending(self) -> int:
+        """Published messages not yet visible in the DB."""
+        return self._presence_outstanding + len(self.signal_pending)
+
+async def run_stage(main, tracker: VisibilityTracker, agents, rate: float, args) -> Dict[str, Any]:
+    from loadgen import LoadGenerator, percentiles
+    from loop_monitor import LoopLagMonitor
+    from transport import LoopbackTransport
+
+    tracker.lags = []
+    visible_before = tracker.visible
+    presence_before = main.presence_batcher.stats()["rows_flushed"]
+    messages_before = main.message_log.stats()["rows_flushed"]
+    monitor = LoopLagMonitor(interval=0.05, warn_ms=float("inf"))
+    monitor.start()
+
+    generator = LoadGenerator(
+        LoopbackTransport(), agents,
+        presence_rate=rate * (1 - args.signal_fraction), signal_rate=rate * args.signal_fraction,
+        publishers=args.publishers, qos=1, seed=int(rate),
+    )
+    generator.on_publish = tracker.on_publish
+    stage_started = time.perf_counter()
+    published = await generator.run(args.duration)
+
+    # Rows written during the publishing window (heartbeats coalesce per agent).
+    presence_rows = main.presence_batcher.stats()["rows_flushed"] - presence_before
+    message_rows = main.message_log.stats()["rows_flushed"] - messages_before
+    visible_at_stop = tracker.visible - visible_before
+    backlog = tracker.pending()
+
+    drain_started = time.perf_counter()
+    await main.presence_batcher.flush()
+    while tracker.pending() and time.perf_counter() - drain_started < args.drain_timeout:
+        await asyncio.sleep(0.05)
+    drain_s = time.perf_counter() - drain_started
+    await monitor.close()
+
+    # Counted once the backlog has drained: messages made visible (coalesced
+    # heartbeats reach the DB once, so not rows written) over the time from
+    # the first publish to the last of them landing.
+    visible = tracker.visible - visible_before
+    window = tracker.last_visible - stage_started
+    sustained = round(visible / window, 1) if visible and window > 0 else 0.0
+    loop = monitor.stats()
+    return {
+        "target_rate": rate,
+        "published_rate": published["achieved_rate"],
+        "sustained_rate": sustained,
+        "published": published["sent"],
+        "publish_errors": published["errors"],
+        "rows_written": {"agents": presence_rows, "messages": message_rows},
+        "visible": visible,
+        "visible_at_stop": visible_at_stop,
+        "backlog_at_stop": backlog,
+        "drain_s": round(drain_s, 3),
+        "undrained": tracker.pending(),
+        "visibility_lag_ms": {k: round(v * 1000, 3) for k, v in percentiles(tracker.lags).items()},
+        "publish_latency_ms": published["publish_latency_ms"],
+        "event_loop_lag_ms": {"mean": loop["mean_lag_ms"], "max": loop["max_lag_ms"]},
+    }
+
+async def run(args) -> Dict[str, Any]:
+    import main
+    from loadgen import build_hierarchy
+
+    tracker = VisibilityTracker()
+    main.presence_batcher.on_flush = tracker.on_presence_flush
+    publish_deltas = main.message_log.on_flush
+
+    def on_message_flush(rows):
+        tracker.on_message_flush(rows)
+        publish_deltas(rows)
+
+    main.message_log.on_flush = on_message_flush
+
+    agents = build_hierarchy(args.nodes, args.agents_per_node, args.sub_agents)
+    await main.startup_event()
+    # Let the background online migrations finish so they don't skew step one.
+    await asyncio.sleep(0.2)
+    stages = []
+    try:
+        for rate in [float(r) for r in args.rates.split(",") if r.strip()]:
+            stage = await run_stage(main, tracker, agents, rate, args)
+            stage["kept_up"] = (
+                stage["undrained"] == 0
+                and stage["published_rate"] >= 0.95 * rate
+                and stage["drain_s"] < max(1.0, main.PRESENCE_WINDOW * 2)
+            )
+            stages.append(stage)
+            print(f"  {rate:>8g} msgs/s -> sustained {stage['sustained_rate']:g}, "
+                  f"lag p99 {stage['visibility_lag_ms']['p99']}ms, "
+                  f"loop max {stage['event_loop_lag_ms']['max']}ms, drain {stage['drain_s']}s",
+                  file=sys.stderr)
+            if not stage["kept_up"] and not args.keep_going:
+                break
+    finally:
+        await main.shutdown_event()
+
+    kept = [s["sustained_rate"] for s in stages if s["kept_up"]]
+    return {
+        "benchmark": "ingest",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "duration_s": args.duration,
+            "signal_fraction": args.signal_fraction,
+            "agents": len(agents),
+            "publishers": args.publishers,
+            "presence_window_s": main.PRESENCE_WINDOW,
+            "message_batch": main.MESSAGE_BATCH,
+            "message_flush_ms": main.MESSAGE_FLUSH_MS,
+        },
+        "max_sustained_rate": max(kept) if kept else 0.0,
+        "stages": stages,
+    }
+
+def configure_env(args) -> str:
+    """Point main.py at the loopback broker and a scratch database before it is imported.
+
+    The memory backend is switched off: this measures ingestion, not Mem0.
+    """
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="bacon-bench-"), "bench.db")
+    os.environ["MQTT_TRANSPORT"] = "loopback"
+    os.environ["BACON_DB_PATH"] = db_path
+    os.environ["MEM0_BACKEND"] = "off"
+    return db_path
+
+if __name__ == "__main__":
+    args = parse_args()
+    db_path = configure_env(args)
+    print(f"🚀 Ingestion benchmark (db: {db_path})", file=sys.stderr)
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,157 @@
+"""Recall benchmark for the local memory backend: IVF index vs brute force.
+
+Builds a synthetic memory corpus shaped like what send_signal records
+(signal type, target, reason drawn from per-topic vocabularies), embeds it
+with the backend's HashingEmbedder and, at each size, reports:
+
+- exact (brute-force) recall latency
+- IVF build time, then latency and recall@k against the exact top k for
+  each nprobe setting
+- incremental insert cost into the trained index
+
+Vectors are searched in memory exactly as LocalMemoryStore does, without
+SQLite, so the numbers isolate the search itself. A 1M corpus at the
+default 512 dimensions needs about 2 GB of RAM; --dim lowers that.
+
+Usage:
+    python bench_memory.py --sizes 100000,1000000 --queries 200 --output memory.json
+    python bench_memory.py --sizes 100000 --nprobe 1,4,8,16,32,64
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from bench_ingest import git_commit
+from ivf_index import IVFIndex, top_k
+from loadgen import percentiles
+from local_memory import HashingEmbedder
+
+SIGNALS = ["WAKE", "SLEEP", "PING", "TASK", "REVIEW", "DEPLOY", "ALERT"]
+TOPIC_WORDS = (
+    "build deploy test lint release rollback migrate index cache queue broker mqtt bridge presence heartbeat "
+    "signal inbox memory recall embedding sqlite vacuum backup restore disk cpu latency timeout retry throttle "
+    "network dns tls certificate token auth login session websocket dashboard graph layout node agent parent "
+    "orchestrator worker scheduler cron alert pager incident postmortem ticket review merge branch commit "
+    "python node rust docker kubernetes helm terraform ansible grafana prometheus metrics logs trace span"
+).split()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare IVF and brute-force recall for the local memory backend.")
+    parser.add_argument("--sizes", default="100000,1000000", help="comma-separated corpus sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5, help="results per recall")
+    parser.add_argument("--nprobe", default="1,4,8,16,32", help="comma-separated nprobe settings")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: sqrt(rows))")
+    parser.add_argument("--dim", type=int, default=512, help="embedding dimensions")
+    parser.add_argument("--inserts", type=int, default=1000, help="incremental inserts timed per size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+class Corpus:
+    """Deterministic signal-like memories grouped into topics."""
+
+    def __init__(self, seed: int, topics: int = 200, agents: int = 500):
+        self.rng = random.Random(seed)
+        self.topics = [self.rng.sample(TOPIC_WORDS, 6) for _ in range(topics)]
+        self.agents = [f"agent-{i:04d}" for i in range(agents)]
+
+    def text(self) -> str:
+        rng = self.rng
+        topic = rng.choice(self.topics)
+        reason = " ".join(rng.choice(topic) for _ in range(rng.randint(3, 6)))
+        return f"Sent {rng.choice(SIGNALS)} to {rng.choice(self.agents)} because {reason}"
+
+    def query(self) -> str:
+        topic = self.rng.choice(self.topics)
+        return " ".join(self.rng.sample(topic, 3))
+
+def embed_all(embedder: HashingEmbedder, texts: List[str]) -> np.ndarray:
+    matrix = np.empty((len(texts), embedder.dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        matrix[i] = embedder.embed(text)
+        if i % 50000 == 0:
+            print(f"  embedded {i}/{len(texts)}", file=sys.stderr, end="\r")
+    print(file=sys.stderr)
+    return matrix
+
+def timed(fn, runs) -> Tuple[Dict[str, float], List[Any]]:
+    latencies = []
+    results = []
+    for arg in runs:
+        started = time.perf_counter()
+        results.append(fn(arg))
+        latencies.append(time.perf_counter() - started)
+    return {k: round(v * 1000, 3) for k, v in percentiles(latencies).items()}, results
+
+def run_size(size: int, args, embedder: HashingEmbedder) -> Dict[str, Any]:
+    corpus = Corpus(args.seed)
+    matrix = embed_all(embedder, [corpus.text() for _ in range(size)])
+    queries = [embedder.embed(corpus.query()) for _ in range(args.queries)]
+
+    exact_ms, exact = timed(lambda q: top_k(matrix @ q, args.k)[0], queries)
+    started = time.perf_counter()
+    index = IVFIndex.build(matrix, nlist=args.nlist)
+    build_s = time.perf_counter() - started
+
+    settings = {}
+    for nprobe in [int(n) for n in args.nprobe.split(",") if n.strip()]:
+        latency_ms, found = timed(lambda q: index.search(matrix, q, args.k, nprobe)[0], queries)
+        hits = sum(len(set(f.tolist()) & set(e.tolist())) for f, e in zip(found, exact))
+        settings[str(nprobe)] = {
+            "latency_ms": latency_ms,
+            f"recall_at_{args.k}": round(hits / (args.k * len(queries)), 4),
+            "speedup_p50": round(exact_ms["p50"] / latency_ms["p50"], 1) if latency_ms["p50"] else None,
+        }
+        print(f"  {size:>8} rows nprobe {nprobe:>3}: p50 {latency_ms['p50']}ms "
+              f"(exact {exact_ms['p50']}ms), recall {settings[str(nprobe)][f'recall_at_{args.k}']}",
+              file=sys.stderr)
+
+    extra = embed_all(embedder, [corpus.text() for _ in range(args.inserts)])
+    started = time.perf_counter()
+    for vector in extra:
+        index.add(vector)
+    insert_us = (time.perf_counter() - started) / max(1, len(extra)) * 1e6
+
+    centroids, assign = index.to_arrays()
+    return {
+        "rows": size,
+        "nlist": index.nlist,
+        "build_s": round(build_s, 3),
+        "index_bytes": centroids.nbytes + assign.nbytes,
+        "insert_us": round(insert_us, 1),
+        "exact_latency_ms": exact_ms,
+        "ivf": settings,
+    }
+
+def run(args) -> Dict[str, Any]:
+    embedder = HashingEmbedder(args.dim)
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"📚 {size} memories", file=sys.stderr)
+        results.append(run_size(size, args, embedder))
+    return {
+        "benchmark": "memory_recall",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "config": {"dim": args.dim, "k": args.k, "queries": args.queries, "nlist": args.nlist},
+        "sizes": results,
+    }
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"✅ Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -1,15 +1,68 @@
 import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event
 from sqlmodel import create_engine, Session, SQLModel
+from metrics import REGISTRY
 from models import Agent, Message, Node
+from migrations import run_migrations, pending_migrations, apply_migration
 
 # Database Configuration
 DATABASE_PATH = os.environ.get("BACON_DB_PATH", "bacon.db")
+DB_WORKERS = int(os.environ.get("BACON_DB_WORKERS", "1"))
 sqlite_url = f"sqlite:///{DATABASE_PATH}"
 
-engine = create_engine(sqlite_url, echo=False)
+# Connections are handed between the DB executor and FastAPI's threadpool.
+engine = create_engine(sqlite_url, echo=False, connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets API readers keep going while batches and index builds write.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+# Blocking SQLModel work from async code runs here instead of on the event
+# loop. A single worker also serializes SQLite writers.
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="bacon-db")
+
+DB_QUEUE_SECONDS = REGISTRY.histogram(
+    "bacon_db_executor_wait_seconds", "Time DB jobs wait for a free executor worker.")
+DB_JOB_SECONDS = REGISTRY.histogram(
+    "bacon_db_job_seconds", "Time DB jobs run on the executor.")
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+
+async def migrate_online():
+    """Build pending online migrations (indexes) in the background.
+
+    Each one is a separate job on the DB executor, so queued ingest flushes
+    interleave between index builds instead of waiting for all of them.
+    """
+    for migration in await run_db(pending_migrations, engine, True):
+        await run_db(apply_migration, engine, migration)
 
 def get_session():
     return Session(engine)
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking DB callable on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    submitted = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        DB_QUEUE_SECONDS.observe(started - submitted)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            DB_JOB_SECONDS.observe(time.perf_counter() - started)
+
+    return await loop.run_in_executor(_db_executor, job)
+
+def shutdown_db():
+    _db_executor.shutdown(wait=True)
@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+
+from models import Message
+from registry import as_utc, utc_iso
+
+class HistoryFilter:
+    """Filters for Message history queries. Every field is optional."""
+
+    def __init__(self, sender: Optional[str] = None, target: Optional[str] = None,
+                 topic_prefix: Optional[str] = None, state: Optional[str] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None):
+        self.sender = sender
+        self.target = target
+        self.topic_prefix = topic_prefix
+        self.state = state
+        # Message.ts is stored as UTC, so bounds are normalized to UTC too.
+        self.since = as_utc(since) if since is not None else None
+        self.until = as_utc(until) if until is not None else None
+
+def encode_cursor(ts: datetime, message_id: int) -> str:
+    raw = f"{ts.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_str, id_str = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return as_utc(datetime.fromisoformat(ts_str)), int(id_str)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+def _statement(filters: HistoryFilter, cursor: Optional[Tuple[datetime, int]], limit: int):
+    statement = select(Message)
+    if filters.sender is not None:
+        statement = statement.where(Message.sender == filters.sender)
+    if filters.target is not None:
+        statement = statement.where(Message.target == filters.target)
+    if filters.topic_prefix:
+        # A half-open range instead of LIKE, so ix_message_topic_ts can be used.
+        statement = statement.where(
+            Message.topic >= filters.topic_prefix,
+            Message.topic < filters.topic_prefix + "\U0010ffff",
+        )
+    if filters.state is not None:
+        statement = statement.where(Message.state == filters.state)
+    if filters.since is not None:
+        statement = statement.where(Message.ts >= filters.since)
+    if filters.until is not None:
+        statement = statement.where(Message.ts < filters.until)
+    if cursor is not None:
+        # Keyset on (ts, id): strictly older than the last row already returned.
+        c_ts, c_id = cursor
+        statement = statement.where(or_(Message.ts < c_ts, and_(Message.ts == c_ts, Message.id < c_id)))
+    return statement.order_by(Message.ts.desc(), Message.id.desc()).limit(limit)
+
+def fetch_page(session: Session, filters: HistoryFilter, limit: int,
+               cursor: Optional[str] = None) -> Tuple[List[Message], Optional[str]]:
+    """One page, newest first, plus the cursor for the next page (None at the end)."""
+    position = decode_cursor(cursor) if cursor else None
+    rows = session.exec(_statement(filters, position, limit)).all()
+    next_cursor = encode_cursor(rows[-1].ts, rows[-1].id) if len(rows) == limit else None
+    return rows, next_cursor
+
+def message_dict(message: Message) -> Dict[str, Any]:
+    return {
+        "id": message.id,
+        "ts": utc_iso(message.ts),
+        "sender": message.sender,
+        "target": message.target,
+        "topic": message.topic,
+        "payload": message.payload,
+        "state": message.state,
+    }
+
+def iter_ndjson(engine, filters: HistoryFilter, max_rows: Optional[int] = None,
+                page_size: int = 1000, cursor: Optional[str] = None) -> Iterator[bytes]:
+    """Stream matching rows as NDJSON, walking keyset pages with a short session each.
+
+    Starts after `cursor` (a fetch_page cursor) when one is given.
+    """
+    sent = 0
+    while True:
+        size = page_size if max_rows is None else min(page_size, max_rows - sent)
+        if size <= 0:
+            return
+        with Session(engine) as session:
+            rows, cursor = fetch_page(session, filters, size, cursor)
+            chunk = "".join(json.dumps(message_dict(m), separators=(",", ":")) + "\n" for m in rows)
+        if chunk:
+            yield chunk.encode()
+        sent += len(rows)
+        if cursor is None:
+            return
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Set
+
+logger = logging.getLogger("bacon-broadcast-hub")
+
+# Queued in place of events when a client falls too far behind; the client
+# handler answers it with a fresh snapshot instead of the dropped deltas.
+RESYNC = object()
+
+class BroadcastHub:
+    """In-process fan-out of dashboard events to N WebSocket clients.
+
+    Each event is serialized once and queued to every client. Clients have a
+    bounded queue so one slow dashboard cannot hold memory or stall ingestion.
+    """
+
+    def __init__(self, client_queue_size: int = 256):
+        self.client_queue_size = client_queue_size
+        self._clients: Set[asyncio.Queue] = set()
+        self._published = 0
+        self._resyncs = 0
+
+    def connect(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self._clients.add(queue)
+        logger.info(f"Dashboard client connected ({len(self._clients)} total)")
+        return queue
+
+    def disconnect(self, queue: asyncio.Queue):
+        self._clients.discard(queue)
+        logger.info(f"Dashboard client disconnected ({len(self._clients)} total)")
+
+    def publish(self, event: Dict[str, Any]):
+        if not self._clients:
+            return
+        text = json.dumps(event, default=str)
+        self._published += 1
+        for queue in self._clients:
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                # Drop the backlog and ask the client to resynchronize.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+                self._resyncs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "events_published": self._published,
+            "resyncs": self._resyncs,
+        }
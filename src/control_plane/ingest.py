@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session
+
+from database import run_db
+from metrics import REGISTRY, SIZE_BUCKETS
+from models import Agent, Message, Node
+
+logger = logging.getLogger("bacon-ingest")
+
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "bacon_db_commit_seconds", "Write transaction latency on the DB executor, by writer.", ("writer",))
+DB_FLUSH_ROWS = REGISTRY.histogram(
+    "bacon_db_flush_rows", "Rows per committed flush, by writer.", ("writer",), buckets=SIZE_BUCKETS)
+_PRESENCE_COMMIT = DB_COMMIT_SECONDS.labels("presence")
+_PRESENCE_ROWS = DB_FLUSH_ROWS.labels("presence")
+_MESSAGE_COMMIT = DB_COMMIT_SECONDS.labels("messages")
+_MESSAGE_ROWS = DB_FLUSH_ROWS.labels("messages")
+
+class PresenceBatcher:
+    """Write-behind stage for presence heartbeats.
+
+    Heartbeats are coalesced per agent_id for `window` seconds and the dirty
+    Node/Agent rows are then upserted in a single transaction. `on_flush`
+    receives the records of each committed batch.
+
+    A batch that violates a constraint is retried row by row and the
+    offending records are dropped (counted in rows_rejected), so one bad
+    heartbeat cannot block presence persistence for every other agent.
+    Other failures keep the batch for the next flush.
+    """
+
+    def __init__(self, engine, window: float = 1.0,
+                 on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.engine = engine
+        self.window = window
+        self.on_flush = on_flush
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._dirty_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._stats = {
+            "heartbeats": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "rows_flushed": 0,
+            "flush_errors": 0,
+            "rows_rejected": 0,
+            "last_flush_size": 0,
+            "max_flush_size": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_lag_ms": 0.0,
+            "max_flush_lag_ms": 0.0,
+        }
+
+    def submit(self, record: Dict[str, Any]):
+        """Queue the latest heartbeat for an agent, replacing any unflushed one."""
+        self._stats["heartbeats"] += 1
+        if record["agent_id"] in self._dirty:
+            self._stats["coalesced"] += 1
+        elif not self._dirty:
+            self._dirty_since = time.monotonic()
+        self._dirty[record["agent_id"]] = record
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop the flush loop and write out anything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            dirty_since, self._dirty_since = self._dirty_since, None
+
+            started = time.monotonic()
+            records = list(batch.values())
+            try:
+                try:
+                    await run_db(self._write, records)
+                except IntegrityError as e:
+                    logger.warning(f"Presence flush of {len(batch)} agents hit a constraint ({e}); retrying row by row")
+                    records = await run_db(self._write_each, records)
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                logger.error(f"Presence flush of {len(batch)} agents failed: {e}")
+                # Keep the rows for the next flush unless a newer heartbeat arrived.
+                for agent_id, record in batch.items():
+                    self._dirty.setdefault(agent_id, record)
+                if dirty_since is not None:
+                    self._dirty_since = min(dirty_since, self._dirty_since or dirty_since)
+                return
+
+            finished = time.monotonic()
+            lag_ms = (finished - (dirty_since or started)) * 1000
+            stats = self._stats
+            stats["flushes"] += 1
+            stats["rows_flushed"] += len(records)
+            stats["rows_rejected"] += len(batch) - len(records)
+            stats["last_flush_size"] = len(records)
+            stats["max_flush_size"] = max(stats["max_flush_size"], len(records))
+            stats["last_flush_ms"] = round((finished - started) * 1000, 3)
+            _PRESENCE_ROWS.observe(len(records))
+            stats["last_flush_lag_ms"] = round(lag_ms, 3)
+            stats["max_flush_lag_ms"] = max(stats["max_flush_lag_ms"], stats["last_flush_lag_ms"])
+            logger.debug(f"Flushed presence for {len(records)} agents in {stats['last_flush_ms']}ms")
+
+            if self.on_flush is not None:
+                try:
+                    self.on_flush(records)
+                except Exception as e:
+                    logger.error(f"Presence on_flush callback failed: {e}")
+
+    def _write(self, records):
+        nodes = {}
+        for r in records:
+            nodes.setdefault(r["node_id"], {
+                "id": r["node_id"],
+                "hostname": r["node_id"],
+                "os": "unknown",
+                "capabilities": r["capabilities"],
+            })
+        agents = [{
+            "id": r["agent_id"],
+            "node_id": r["node_id"],
+            "role": "unknown",
+            "operator": r["operator"],
+            "version": r["version"],
+            "status": r["state"],
+            "last_seen": r["ts"],
+            "parent_id": r["parent_id"],
+        } for r in records]
+
+        # Existing nodes are left untouched; agents refresh everything but role.
+        node_stmt = sqlite_insert(Node).on_conflict_do_nothing(index_elements=["id"])
+        agent_stmt = sqlite_insert(Agent)
+        agent_stmt = agent_stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={
+                col: agent_stmt.excluded[col]
+                for col in ("node_id", "operator", "version", "status", "last_seen", "parent_id")
+            },
+        )
+        with _PRESENCE_COMMIT.time(), Session(self.engine) as session:
+            session.execute(node_stmt, list(nodes.values()))
+            session.execute(agent_stmt, agents)
+            session.commit()
+
+    def _write_each(self, records):
+        """Write records one transaction each; returns those written."""
+        written = []
+        for record in records:
+            try:
+                self._write([record])
+            except IntegrityError as e:
+                logger.error(f"Dropping presence for {record.get('agent_id')}: {e}")
+                continue
+            written.append(record)
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "pending": len(self._dirty), "window_s": self.window}
+
+_STOP = object()
+
+class MessageLogWriter:
+    """Group-commit writer for the Message log.
+
+    Rows are accepted into a bounded asyncio queue (submit() waits when it is
+    full) and drained in batches of up to `batch_size`, or whatever arrived
+    within `flush_interval` seconds, with one executemany insert per batch.
+    `on_flush` receives each committed batch with database ids filled in.
+
+    A batch that fails for any reason other than a transient database
+    error (OperationalError: locked, I/O) is retried row by row and only
+    the rows that fail on their own are rejected (counted in
+    rows_rejected). Transient errors keep the batch and retry with backoff;
+    meanwhile the queue fills and submit() holds back ingestion. Rows are
+    only given up (rows_dropped) when shutdown cannot get them written.
+    """
+
+    def __init__(
+        self,
+        engine,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_queue: int = 10000,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._stats = {
+            "accepted": 0,
+            "backpressure_waits": 0,
+            "flushes": 0,
+            "rows_flushed": 0,
+            "rows_rejected": 0,
+            "rows_dropped": 0,
+            "flush_errors": 0,
+            "last_flush_size": 0,
+            "max_flush_size": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    async def submit(self, row: Dict[str, Any]):
+        """Accept a Message row for the next group commit, waiting if the queue is full."""
+        if self._closing:
+            raise RuntimeError("Message log writer is shut down")
+        row.setdefault("ts", datetime.now(timezone.utc))
+        if self._queue.full():
+            self._stats["backpressure_waits"] += 1
+        await self._queue.put(row)
+        self._stats["accepted"] += 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop accepting rows and wait until everything accepted is written."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self.flush(batch)
+
+    async def flush(self, batch: List[Dict[str, Any]]):
+        started = time.monotonic()
+        pending = list(batch)
+        written: List[Dict[str, Any]] = []
+        rejected: List[Dict[str, Any]] = []
+        row_by_row = False
+        attempt = 0
+        while pending:
+            try:
+                if row_by_row:
+                    await run_db(self._write_each, pending, written, rejected)
+                else:
+                    await run_db(self._write, pending)
+                    written.extend(pending)
+                    pending.clear()
+            except OperationalError as e:
+                attempt += 1
+                self._stats["flush_errors"] += 1
+                if self._closing and attempt >= 3:
+                    logger.error(f"Message log flush of {len(pending)} rows failed at shutdown, dropping them: {e}")
+                    self._stats["rows_dropped"] += len(pending)
+                    break
+                delay = min(0.1 * 2 ** (attempt - 1), 5.0)
+                logger.error(f"Message log flush of {len(pending)} rows failed (attempt {attempt}): {e}; retrying in {delay:g}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                logger.warning(f"Message log flush of {len(pending)} rows failed ({e}); retrying row by row")
+                row_by_row = True
+
+        stats = self._stats
+        stats["rows_rejected"] += len(rejected)
+        if not written:
+            return
+        stats["flushes"] += 1
+        stats["rows_flushed"] += len(written)
+        stats["last_flush_size"] = len(written)
+        stats["max_flush_size"] = max(stats["max_flush_size"], len(written))
+        stats["last_flush_ms"] = round((time.monotonic() - started) * 1000, 3)
+        _MESSAGE_ROWS.observe(len(written))
+
+        if self.on_flush is not None:
+            try:
+                self.on_flush(written)
+            except Exception as e:
+                logger.error(f"Message log on_flush callback failed: {e}")
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        stmt = insert(Message).returning(Message.id, sort_by_parameter_order=True)
+        with _MESSAGE_COMMIT.time(), Session(self.engine) as session:
+            ids = session.execute(stmt, rows).scalars().all()
+            session.commit()
+        for row, row_id in zip(rows, ids):
+            row["id"] = row_id
+
+    def _write_each(self, pending, written, rejected):
+        """Write rows one transaction each, moving them from pending to written or rejected.
+
+        A transient error propagates with the unwritten rows still pending.
+        """
+        while pending:
+            row = pending[0]
+            try:
+                self._write([row])
+            except OperationalError:
+                raise
+            except Exception as e:
+                logger.error(f"Rejecting message row for {row.get('topic')}: {e}")
+                rejected.append(row)
+            else:
+                written.append(row)
+            pending.pop(0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "queued": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "batch_size": self.batch_size,
+        }
@@ -0,0 +1,132 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index over unit vectors.
+
+Rows are clustered with spherical k-means (NumPy only) into `nlist` lists.
+A search scores the query against the centroids, scans only the rows in the
+`nprobe` closest lists and returns the best k by cosine similarity. Higher
+nprobe trades latency for recall; nprobe == nlist is an exact scan.
+
+The index stores row numbers, not vectors: it is always searched together
+with the caller's (growing) float32 matrix. Rows added after training are
+assigned to their nearest centroid and searched from a tail; `needs_rebuild`
+says when that tail has grown enough that the centroids should be retrained.
+"""
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Scores per matrix product while assigning (64 MB of float32), to bound temporary memory.
+_CHUNK_SCORES = 1 << 24
+
+def default_nlist(rows: int) -> int:
+    return max(1, min(4096, int(math.sqrt(rows))))
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    chunk = max(1, _CHUNK_SCORES // len(centroids))
+    for start in range(0, len(vectors), chunk):
+        assign[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return assign
+
+def kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, sample: int = 32,
+           seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids, trained on at most `sample` points per list."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > nlist * sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), nlist * sample, replace=False))]
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Re-seed empty lists from random points so every list stays usable.
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        centroids = sums / np.maximum(norms, 1e-12)[:, None]
+    return centroids.astype(np.float32)
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, assign: np.ndarray, nprobe: int = 16):
+        self.centroids = centroids
+        self.nprobe = nprobe
+        self.trained_rows = len(assign)
+        # Trained rows grouped by list: order[offsets[l]:offsets[l + 1]].
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.searchsorted(assign[self.order], np.arange(len(centroids) + 1)).astype(np.int64)
+        self._tail = np.empty(1024, dtype=np.int32)
+        self.tail_rows = 0
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: Optional[int] = None, nprobe: int = 16, seed: int = 0) -> "IVFIndex":
+        nlist = min(nlist or default_nlist(len(matrix)), len(matrix))
+        centroids = kmeans(matrix, nlist, seed=seed)
+        return cls(centroids, _nearest(matrix, centroids), nprobe)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def rows(self) -> int:
+        return self.trained_rows + self.tail_rows
+
+    def add(self, vectors: np.ndarray):
+        """Assign rows appended to the matrix after the ones already indexed."""
+        assign = _nearest(np.atleast_2d(vectors), self.centroids)
+        needed = self.tail_rows + len(assign)
+        if needed > len(self._tail):
+            grown = np.empty(max(needed, len(self._tail) * 2), dtype=np.int32)
+            grown[:self.tail_rows] = self._tail[:self.tail_rows]
+            self._tail = grown
+        self._tail[self.tail_rows:needed] = assign
+        self.tail_rows = needed
+
+    def needs_rebuild(self, ratio: float = 0.5) -> bool:
+        """True once rows added since training exceed `ratio` of the trained rows."""
+        return self.tail_rows > ratio * self.trained_rows
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None,
+                   upto: Optional[int] = None) -> np.ndarray:
+        """Row numbers in the `nprobe` lists closest to the query.
+
+        `upto` ignores tail rows at or beyond that row number, for callers
+        searching a snapshot while another thread keeps adding.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        closeness = self.centroids @ query
+        probes = np.argpartition(-closeness, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        parts = [self.order[self.offsets[l]:self.offsets[l + 1]] for l in probes]
+        tail_rows = self.tail_rows if upto is None else min(self.tail_rows, upto - self.trained_rows)
+        if tail_rows > 0:
+            tail = self._tail[:tail_rows]
+            parts.append(np.flatnonzero(np.isin(tail, probes)) + self.trained_rows)
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(row numbers, scores) of the best k rows of `matrix`, best first."""
+        rows = self.candidates(query, nprobe, len(matrix))
+        return top_k(matrix[rows] @ query, k, rows)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(centroids, per-row list assignment) for persistence."""
+        assign = np.empty(self.rows, dtype=np.int32)
+        assign[self.order] = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.offsets))
+        assign[self.trained_rows:] = self._tail[:self.tail_rows]
+        return self.centroids, assign
+
+def top_k(scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """The k highest scores (and their row numbers), best first."""
+    if rows is None:
+        rows = np.arange(len(scores))
+    if k <= 0 or not len(scores):
+        return rows[:0], scores[:0]
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return rows[best], scores[best]
@@ -0,0 +1,223 @@
+"""Synthetic mesh load generator.
+
+Builds an agent hierarchy (nodes -> agents -> sub-agents linked by parent_id)
+and drives presence and signal traffic at target rates from many concurrent
+publishers, using the same payload shapes as simulate_heartbeat.py and
+test_hierarchy.py. Prints the achieved rate and publish latency percentiles.
+
+Usage:
+    python loadgen.py --nodes 50 --agents-per-node 20 --presence-rate 2000 --duration 30
+    python loadgen.py --transport loopback --signal-rate 500 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from transport import make_transport
+
+MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_USER = os.environ.get("MQTT_USER", "")
+MQTT_PASS = os.environ.get("MQTT_PASS", "")
+MQTT_TRANSPORT = os.environ.get("MQTT_TRANSPORT", "aiomqtt")
+
+PRESENCE_TOPIC = "bacon/v1/presence/agent/{}"
+SIGNAL_TOPIC = "bacon/v1/signal/agent/{}"
+SIGNAL_TYPES = ["WAKE", "DATA", "UPDATE"]
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles plus max, in the samples' own unit."""
+    if not samples:
+        return {**{f"p{p}": 0.0 for p in points}, "max": 0.0}
+    ordered = sorted(samples)
+    result = {f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in points}
+    result["max"] = ordered[-1]
+    return result
+
+def build_hierarchy(nodes: int, agents_per_node: int, sub_agents: int) -> List[Dict[str, Any]]:
+    """Agents for `nodes` hosts, each with `agents_per_node` agents and `sub_agents` children per agent.
+
+    Sub-agents are logically hosted by their parent, as in test_hierarchy.py.
+    """
+    agents = []
+    for n in range(nodes):
+        node_id = f"load-node-{n:04d}"
+        for a in range(agents_per_node):
+            agent_id = f"{node_id}-agent-{a:03d}"
+            agents.append({"agent_id": agent_id, "node_id": node_id, "parent_id": None})
+            for s in range(sub_agents):
+                agents.append({"agent_id": f"{agent_id}-sub-{s:02d}", "node_id": agent_id, "parent_id": agent_id})
+    return agents
+
+def presence_payload(agent: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {
+        "v": "1.2",
+        "agent_id": agent["agent_id"],
+        "node_id": agent["node_id"],
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "state": "active",
+        "meta": {
+            "operator": "Load Generator",
+            "queue_depth": 0
+        },
+        "capabilities": ["load-test"]
+    }
+    if agent["parent_id"]:
+        payload["parent_id"] = agent["parent_id"]
+    return payload
+
+def signal_payload(source: str, signal_type: str) -> Dict[str, Any]:
+    return {
+        "type": "signal",
+        "source": source,
+        "content": {"type": signal_type, "reason": "Synthetic load"},
+        "ts": datetime.now(timezone.utc).isoformat()
+    }
+
+class LoadGenerator:
+    """Publishes presence and signal traffic for a hierarchy at target rates.
+
+    The total rate is split evenly across `publishers`, each with its own
+    client and its own slice of the agents. Inter-send gaps are randomized by
+    +/- `jitter` (a fraction of the nominal gap). A publisher that falls
+    behind schedule sends immediately rather than sleeping, so the achieved
+    rate shows what the broker and clients could actually sustain.
+    """
+
+    def __init__(self, transport, agents: List[Dict[str, Any]], presence_rate: float = 100.0,
+                 signal_rate: float = 0.0, publishers: int = 8, jitter: float = 0.2, qos: int = 0,
+                 seed: Optional[int] = None):
+        if not agents:
+            raise ValueError("Load generator needs at least one agent")
+        self.transport = transport
+        self.agents = agents
+        self.presence_rate = presence_rate
+        self.signal_rate = signal_rate
+        self.publishers = max(1, min(publishers, len(agents)))
+        self.jitter = jitter
+        self.qos = qos
+        self._random = random.Random(seed)
+        self.sent = {"presence": 0, "signal": 0}
+        self.errors = 0
+        self.latencies: List[float] = []
+        self.on_publish = None  # optional callback(kind, topic, body, t_started), perf_counter clock
+
+    async def _publisher(self, index: int, deadline: float):
+        own = self.agents[index::self.publishers]
+        total_rate = self.presence_rate + self.signal_rate
+        gap = self.publishers / total_rate
+        signal_share = self.signal_rate / total_rate
+        rng = random.Random(self._random.random())
+        cursor = 0
+
+        async with self.transport.client(identifier=f"bacon-loadgen-{os.getpid()}-{index}") as client:
+            next_at = time.perf_counter() + rng.uniform(0, gap)
+            while True:
+                now = time.perf_counter()
+                if next_at >= deadline or now >= deadline:
+                    return
+                if next_at > now:
+                    await asyncio.sleep(next_at - now)
+                next_at += gap * rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+                if rng.random() < signal_share:
+                    kind = "signal"
+                    target = self.agents[rng.randrange(len(self.agents))]["agent_id"]
+                    topic = SIGNAL_TOPIC.format(target)
+                    payload = signal_payload(own[rng.randrange(len(own))]["agent_id"], rng.choice(SIGNAL_TYPES))
+                else:
+                    kind = "presence"
+                    agent = own[cursor % len(own)]
+                    cursor += 1
+                    topic = PRESENCE_TOPIC.format(agent["agent_id"])
+                    payload = presence_payload(agent)
+
+                body = json.dumps(payload)
+                started = time.perf_counter()
+                if self.on_publish is not None:
+                    self.on_publish(kind, topic, body, started)
+                try:
+                    await client.publish(topic, body, qos=self.qos)
+                except Exception:
+                    self.errors += 1
+                    continue
+                finished = time.perf_counter()
+                self.latencies.append(finished - started)
+                self.sent[kind] += 1
+
+    async def run(self, duration: float) -> Dict[str, Any]:
+        """Publish for `duration` seconds and return the report."""
+        if self.presence_rate + self.signal_rate <= 0:
+            raise ValueError("At least one of presence_rate or signal_rate must be positive")
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(self._publisher(i, deadline) for i in range(self.publishers)))
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        total = sum(self.sent.values())
+        return {
+            "agents": len(self.agents),
+            "publishers": self.publishers,
+            "qos": self.qos,
+            "target_rate": self.presence_rate + self.signal_rate,
+            "achieved_rate": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed_s": round(elapsed, 3),
+            "sent": dict(self.sent, total=total),
+            "errors": self.errors,
+            "publish_latency_ms": {k: round(v * 1000, 3) for k, v in percentiles(self.latencies).items()},
+        }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive synthetic presence/signal load at the BACON mesh.")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--agents-per-node", type=int, default=10)
+    parser.add_argument("--sub-agents", type=int, default=1, help="sub-agents per agent (parent_id)")
+    parser.add_argument("--presence-rate", type=float, default=100.0, help="presence msgs/s across all publishers")
+    parser.add_argument("--signal-rate", type=float, default=10.0, help="signal msgs/s across all publishers")
+    parser.add_argument("--publishers", type=int, default=8, help="concurrent publisher clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction of the nominal send gap")
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--transport", default=MQTT_TRANSPORT, help="aiomqtt (real broker) or loopback")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON only")
+    return parser.parse_args(argv)
+
+async def main(argv=None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    transport = make_transport(
+        args.transport, hostname=MQTT_BROKER, port=MQTT_PORT,
+        username=MQTT_USER or None, password=MQTT_PASS or None,
+    )
+    agents = build_hierarchy(args.nodes, args.agents_per_node, args.sub_agents)
+    generator = LoadGenerator(
+        transport, agents,
+        presence_rate=args.presence_rate, signal_rate=args.signal_rate,
+        publishers=args.publishers, jitter=args.jitter, qos=args.qos, seed=args.seed,
+    )
+    if not args.json:
+        print(f"🚀 {len(agents)} agents, {generator.publishers} publishers, "
+              f"{args.presence_rate + args.signal_rate:g} msgs/s target via {args.transport} for {args.duration:g}s...")
+    report = await generator.run(args.duration)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        latency = report["publish_latency_ms"]
+        print(f"✅ Sent {report['sent']['total']} ({report['sent']['presence']} presence, "
+              f"{report['sent']['signal']} signal), {report['errors']} errors")
+        print(f"   Achieved {report['achieved_rate']} msgs/s of {report['target_rate']:g} target")
+        print(f"   Publish latency ms: p50 {latency['p50']}  p95 {latency['p95']}  "
+              f"p99 {latency['p99']}  max {latency['max']}")
+    return report
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main())
@@ -0,0 +1,298 @@
+"""Offline memory backend: SQLite rows with float32 embeddings and NumPy search.
+
+LocalMemoryStore exposes the subset of Mem0's MemoryClient that
+MemoryGateway uses (`add`, `search`, `get_all`), so the gateway can run
+without MEM0_API_KEY or a network. Text is embedded by HashingEmbedder,
+a deterministic feature-hashing model over word unigrams/bigrams and
+character trigrams (stopwords dropped); it matches on shared wording, not
+meaning, which is enough for agents recalling their own signals and notes.
+
+Each agent's embeddings are kept in a contiguous float32 matrix loaded
+lazily from SQLite, so a recall is one matrix-vector product plus
+argpartition for the top k. Once an agent has BACON_MEMORY_ANN_MIN_ROWS
+memories, recall goes through an IVF index (ivf_index.py) instead, which
+is retrained as the agent's memories grow and saved alongside them.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from ivf_index import IVFIndex, top_k
+
+logger = logging.getLogger("bacon-local-memory")
+
+# Below this many memories per agent an exact scan is cheaper than an index.
+ANN_MIN_ROWS = int(os.environ.get("BACON_MEMORY_ANN_MIN_ROWS", "20000"))
+# IVF lists scanned per recall: higher is slower but closer to exact.
+ANN_NPROBE = int(os.environ.get("BACON_MEMORY_NPROBE", "16"))
+# Retrain once rows added since the last build exceed this share of it.
+ANN_REBUILD_RATIO = float(os.environ.get("BACON_MEMORY_ANN_REBUILD_RATIO", "0.5"))
+
+_WORD = re.compile(r"[a-z0-9_]+")
+# Function words carry no recall signal but dominate short memories.
+_STOPWORDS = frozenset(
+    "a an and are as at be because but by did do does for from had has have he her his i if in into is it its "
+    "me my of on or our she so that the their them then there these they this to was we were what when where "
+    "which who why will with you your".split()
+)
+
+class HashingEmbedder:
+    """Deterministic text embedding via signed feature hashing.
+
+    crc32 rather than hash() so vectors are stable across processes and
+    PYTHONHASHSEED. Vectors are L2-normalized, so a dot product is the
+    cosine similarity.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f" {w} "
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Words count twice as much as their trigrams.
+            weight = 2.0 if feature[0] != "c" else 1.0
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+class _AgentVectors:
+    """One agent's embeddings in a growable float32 matrix (rows match `ids`)."""
+
+    def __init__(self, dim: int, ids: List[str], matrix: np.ndarray):
+        self.ids = ids
+        self._buffer = np.empty((max(16, len(ids)), dim), dtype=np.float32)
+        self._buffer[:len(ids)] = matrix
+        self.size = len(ids)
+        self.index: Optional[IVFIndex] = None
+        self.rebuilding = False
+
+    def append(self, memory_id: str, vector: np.ndarray):
+        if self.size == len(self._buffer):
+            grown = np.empty((self.size * 2, self._buffer.shape[1]), dtype=np.float32)
+            grown[:self.size] = self._buffer[:self.size]
+            self._buffer = grown
+        self._buffer[self.size] = vector
+        self.ids.append(memory_id)
+        self.size += 1
+        if self.index is not None:
+            self.index.add(vector)
+
+    def snapshot(self) -> Tuple[List[str], np.ndarray, Optional[IVFIndex]]:
+        # Rows below `size` are never rewritten, so the view stays valid
+        # while later appends fill (or reallocate) the buffer; `ids` only
+        # grows, so callers index it below len(matrix) without a copy.
+        return self.ids, self._buffer[:self.size], self.index
+
+class LocalMemoryStore:
+    """Mem0-compatible memory store in a local SQLite file.
+
+    Thread-safe: MemoryGateway calls it from its worker pool. SQLite access
+    is serialized by a lock; the similarity search itself runs outside it.
+    """
+
+    def __init__(self, path: str, embedder: Optional[HashingEmbedder] = None,
+                 ann_min_rows: int = ANN_MIN_ROWS, nprobe: int = ANN_NPROBE,
+                 rebuild_ratio: float = ANN_REBUILD_RATIO):
+        self.path = path
+        self.embedder = embedder or HashingEmbedder()
+        self.ann_min_rows = ann_min_rows
+        self.nprobe = nprobe
+        self.rebuild_ratio = rebuild_ratio
+        self._lock = threading.Lock()
+        self._agents: Dict[str, _AgentVectors] = {}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT NOT NULL UNIQUE,"
+            " user_id TEXT NOT NULL,"
+            " memory TEXT NOT NULL,"
+            " metadata TEXT,"
+            " created_at TEXT NOT NULL,"
+            " embedding BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_memory_user ON memory (user_id, seq)")
+        # One IVF index per agent: centroids plus each memory's list, in seq order.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory_index ("
+            " user_id TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " nlist INTEGER NOT NULL,"
+            " centroids BLOB NOT NULL,"
+            " assign BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _vectors(self, user_id: str) -> _AgentVectors:
+        """The agent's matrix, loaded from SQLite on first use. Call with the lock held."""
+        vectors = self._agents.get(user_id)
+        if vectors is None:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM memory WHERE user_id = ? ORDER BY seq", (user_id,)
+            ).fetchall()
+            dim = self.embedder.dim
+            matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float32).reshape(len(rows), dim)
+            vectors = _AgentVectors(dim, [r[0] for r in rows], matrix)
+            vectors.index = self._load_index(user_id, vectors.size)
+            if vectors.index is not None and vectors.index.rows < vectors.size:
+                vectors.index.add(matrix[vectors.index.rows:])
+            self._agents[user_id] = vectors
+        return vectors
+
+    def _load_index(self, user_id: str, size: int) -> Optional[IVFIndex]:
+        row = self._conn.execute(
+            "SELECT dim, nlist, centroids, assign FROM memory_index WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None or row[0] != self.embedder.dim:
+            return None
+        centroids = np.frombuffer(row[2], dtype=np.float32).reshape(row[1], row[0])
+        assign = np.frombuffer(row[3], dtype=np.int32)
+        if len(assign) > size:
+            return None
+        return IVFIndex(centroids, assign, self.nprobe)
+
+    def _save_index(self, user_id: str, index: IVFIndex):
+        """Persist an index. Call with the lock held."""
+        centroids, assign = index.to_arrays()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memory_index (user_id, dim, nlist, centroids, assign) VALUES (?, ?, ?, ?, ?)",
+                (user_id, centroids.shape[1], len(centroids), centroids.tobytes(), assign.tobytes()),
+            )
+
+    def _rebuild(self, user_id: str, vectors: _AgentVectors):
+        """Train a new index on a snapshot, catch it up and swap it in.
+
+        Training runs outside the lock, so adds and recalls continue on the
+        old index (or the exact scan) meanwhile.
+        """
+        try:
+            with self._lock:
+                _, matrix, _ = vectors.snapshot()
+            started = time.perf_counter()
+            index = IVFIndex.build(matrix, nprobe=self.nprobe)
+            with self._lock:
+                _, current, _ = vectors.snapshot()
+                if len(current) > len(matrix):
+                    index.add(current[len(matrix):])
+                vectors.index = index
+                self._save_index(user_id, index)
+            logger.info(f"Rebuilt memory index for {user_id}: {index.rows} rows, {index.nlist} lists "
+                        f"in {time.perf_counter() - started:.2f}s")
+        finally:
+            vectors.rebuilding = False
+
+    def _wants_rebuild(self, vectors: _AgentVectors) -> bool:
+        """Claim a rebuild if one is due. Call with the lock held."""
+        if vectors.rebuilding or vectors.size < self.ann_min_rows:
+            return False
+        if vectors.index is not None and not vectors.index.needs_rebuild(self.rebuild_ratio):
+            return False
+        vectors.rebuilding = True
+        return True
+
+    def add(self, messages: Union[str, List[Dict[str, str]]], user_id: str,
+            metadata: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        """Store each user message verbatim (Mem0 would extract facts from them)."""
+        if isinstance(messages, str):
+            texts = [messages]
+        else:
+            texts = [m["content"] for m in messages if m.get("role", "user") == "user" and m.get("content")]
+        created_at = datetime.now(timezone.utc).isoformat()
+        meta = json.dumps(metadata, default=str) if metadata else None
+        rows = []
+        for text in texts:
+            vector = self.embedder.embed(text)
+            rows.append((uuid.uuid4().hex, user_id, text, meta, created_at, vector))
+        with self._lock:
+            vectors = self._vectors(user_id)
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO memory (id, user_id, memory, metadata, created_at, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*row[:5], row[5].tobytes()) for row in rows],
+                )
+            for row in rows:
+                vectors.append(row[0], row[5])
+            rebuild = self._wants_rebuild(vectors)
+        if rebuild:
+            # On the caller's (worker) thread; this add returns once it is done.
+            self._rebuild(user_id, vectors)
+        return {"results": [{"id": row[0], "memory": row[2], "event": "ADD"} for row in rows]}
+
+    def search(self, query: str, user_id: str, limit: int = 5, **kwargs) -> List[Dict[str, Any]]:
+        """Top `limit` memories by cosine similarity; an empty query returns the newest."""
+        if not query.strip():
+            return self._rows("WHERE user_id = ? ORDER BY seq DESC LIMIT ?", (user_id, limit))
+        with self._lock:
+            ids, matrix, index = self._vectors(user_id).snapshot()
+        if not len(matrix) or limit <= 0:
+            return []
+        vector = self.embedder.embed(query)
+        if index is not None:
+            rows, scores = index.search(matrix, vector, limit, kwargs.get("nprobe"))
+        else:
+            rows, scores = top_k(matrix @ vector, limit)
+        return self._with_scores([ids[i] for i in rows], [float(x) for x in scores])
+
+    def get_all(self, user_id: str, **kwargs) -> List[Dict[str, Any]]:
+        return self._rows("WHERE user_id = ? ORDER BY seq DESC", (user_id,))
+
+    def _with_scores(self, ids: List[str], scores: List[float]) -> List[Dict[str, Any]]:
+        placeholders = ",".join("?" * len(ids))
+        by_id = {r["id"]: r for r in self._rows(f"WHERE id IN ({placeholders})", tuple(ids))}
+        results = []
+        for memory_id, score in zip(ids, scores):
+            row = by_id.get(memory_id)
+            if row is not None:
+                results.append({**row, "score": round(score, 6)})
+        return results
+
+    def _rows(self, where: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, user_id, memory, metadata, created_at FROM memory {where}", params
+            ).fetchall()
+        return [{
+            "id": r[0],
+            "user_id": r[1],
+            "memory": r[2],
+            "metadata": json.loads(r[3]) if r[3] else None,
+            "created_at": r[4],
+        } for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def close(self):
+        """Save indexes with their incremental assignments, then close the database."""
+        with self._lock:
+            for user_id, vectors in self._agents.items():
+                if vectors.index is not None and vectors.index.tail_rows:
+                    self._save_index(user_id, vectors.index)
+            self._conn.close()
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("bacon-loop-monitor")
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a periodic sleeper.
+
+    Any lag beyond the sleep interval is time the loop spent blocked on
+    synchronous work (DB commits, blocking SDK calls, heavy serialization).
+    """
+
+    def __init__(self, interval: float = 0.25, warn_ms: float = 100.0):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self._task: Optional[asyncio.Task] = None
+        self._samples = 0
+        self._total_ms = 0.0
+        self._last_ms = 0.0
+        self._max_ms = 0.0
+        self._over_threshold = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - started - self.interval) * 1000)
+            self._samples += 1
+            self._total_ms += lag_ms
+            self._last_ms = lag_ms
+            self._max_ms = max(self._max_ms, lag_ms)
+            if lag_ms >= self.warn_ms:
+                self._over_threshold += 1
+                logger.warning(f"Event loop blocked for {lag_ms:.0f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": self._samples,
+            "last_lag_ms": round(self._last_ms, 3),
+            "max_lag_ms": round(self._max_ms, 3),
+            "mean_lag_ms": round(self._total_ms / self._samples, 3) if self._samples else 0.0,
+            "over_threshold": self._over_threshold,
+            "warn_ms": self.warn_ms,
+        }
@@ -5,15 +5,22 @@ import json
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
 from pathlib import Path
-from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi import FastAPI, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlmodel import Session, select
 
-from database import init_db, get_session
+from database import init_db, get_session, engine, shutdown_db, run_db, migrate_online
 from models import Agent, Message, Node, VisualizationSetting
 from mqtt_handler import MQTTHandler
 from memory_gateway import MemoryGateway
+from ingest import PresenceBatcher, MessageLogWriter
+from loop_monitor import LoopLagMonitor
+from hub import BroadcastHub, RESYNC
+from registry import AgentRegistry, as_utc, utc_iso
+from history import HistoryFilter, decode_cursor, fetch_page, iter_ndjson
+from metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -24,20 +31,91 @@ MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
 MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 MQTT_USER = os.environ.get("MQTT_USER", "")
 MQTT_PASS = os.environ.get("MQTT_PASS", "")
+MQTT_TRANSPORT = os.environ.get("MQTT_TRANSPORT", "aiomqtt")  # "loopback" for an in-process broker
+MQTT_PUBLISH_POOL = int(os.environ.get("MQTT_PUBLISH_POOL", "1"))
+PRESENCE_WINDOW = float(os.environ.get("BACON_PRESENCE_WINDOW", "1.0"))
+MESSAGE_BATCH = int(os.environ.get("BACON_MESSAGE_BATCH", "500"))
+MESSAGE_FLUSH_MS = int(os.environ.get("BACON_MESSAGE_FLUSH_MS", "50"))
+MESSAGE_QUEUE = int(os.environ.get("BACON_MESSAGE_QUEUE", "10000"))
+LOOP_LAG_WARN_MS = float(os.environ.get("BACON_LOOP_LAG_WARN_MS", "100"))
+MEMORY_WORKERS = int(os.environ.get("BACON_MEMORY_WORKERS", "4"))
+MEMORY_WRITE_BATCH = int(os.environ.get("BACON_MEMORY_WRITE_BATCH", "20"))
+MEMORY_WRITE_MS = int(os.environ.get("BACON_MEMORY_WRITE_MS", "500"))
+MEMORY_CACHE_SIZE = int(os.environ.get("BACON_MEMORY_CACHE_SIZE", "1024"))
+MEMORY_CACHE_TTL = float(os.environ.get("BACON_MEMORY_CACHE_TTL", "30"))  # 0 disables the recall cache
+HISTORY_MAX_PAGE = int(os.environ.get("BACON_HISTORY_MAX_PAGE", "1000"))
 
 app = FastAPI(title="BACON-AI Control Plane")
-mqtt = MQTTHandler(MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS)
-memory = MemoryGateway()
+app.add_middleware(MetricsMiddleware)
+mqtt = MQTTHandler(
+    MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS,
+    publish_pool_size=MQTT_PUBLISH_POOL,
+    transport=MQTT_TRANSPORT,
+)
+memory = MemoryGateway(
+    workers=MEMORY_WORKERS,
+    write_batch=MEMORY_WRITE_BATCH,
+    write_interval=MEMORY_WRITE_MS / 1000,
+    cache_size=MEMORY_CACHE_SIZE,
+    cache_ttl=MEMORY_CACHE_TTL,
+)
+hub = BroadcastHub()
+registry = AgentRegistry()
+
+def publish_message_deltas(rows: List[Dict[str, Any]]):
+    """Push freshly committed Message rows to connected dashboards."""
+    for row in rows:
+        hub.publish({"type": "message", "data": {**row, "ts": utc_iso(row["ts"])}})
+
+presence_batcher = PresenceBatcher(engine, window=PRESENCE_WINDOW)
+message_log = MessageLogWriter(
+    engine,
+    batch_size=MESSAGE_BATCH,
+    flush_interval=MESSAGE_FLUSH_MS / 1000,
+    max_queue=MESSAGE_QUEUE,
+    on_flush=publish_message_deltas,
+)
+loop_monitor = LoopLagMonitor(warn_ms=LOOP_LAG_WARN_MS)
+
+# Scrape-time gauges over state the components already track.
+REGISTRY.gauge("bacon_registry_agents", "Agents in the in-memory registry.", fn=lambda: len(registry))
+REGISTRY.gauge("bacon_presence_pending", "Agents with unflushed presence.", fn=lambda: presence_batcher.stats()["pending"])
+REGISTRY.gauge("bacon_message_log_queued", "Message rows waiting for a group commit.", fn=lambda: message_log.stats()["queued"])
+REGISTRY.gauge("bacon_event_loop_lag_seconds", "Most recent event-loop lag sample.",
+               fn=lambda: loop_monitor.stats()["last_lag_ms"] / 1000)
+REGISTRY.gauge("bacon_memory_write_pending", "Memories queued for the Mem0 background writer.",
+               fn=lambda: memory.stats()["pending"])
+REGISTRY.gauge("bacon_websocket_clients", "Connected dashboard WebSocket clients.", fn=lambda: hub.stats()["clients"])
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
     logger.info("Initializing Control Plane database...")
-    asyncio.create_task(presence_monitor())
-    asyncio.create_task(signal_monitor())
+    asyncio.create_task(migrate_online())
+    registry.load(*await run_db(load_registry_rows))
+    logger.info(f"Agent registry loaded with {len(registry)} agents")
+    loop_monitor.start()
+    presence_batcher.start()
+    message_log.start()
+    memory.start()
+    await presence_monitor()
+    await signal_monitor()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await mqtt.close()
+    await presence_batcher.close()
+    await message_log.close()
+    await memory.close()
+    await loop_monitor.close()
+    shutdown_db()
+
+def load_registry_rows():
+    with get_session() as session:
+        return session.exec(select(Agent)).all(), session.exec(select(Node)).all()
 
 async def signal_monitor():
-    """Background task to monitor agent signal messages."""
+    """Register the agent signal monitor on the shared MQTT subscriber."""
     logger.info("Starting Signal Monitor...")
     # Matches bacon/v1/signal/agent/{target}
     topic = "bacon/v1/signal/agent/+"
@@ -51,23 +129,20 @@ async def signal_monitor():
             content = payload.get("content", {}) if isinstance(payload.get("content"), dict) else payload
             sender = payload.get("source") or content.get("requester") or "unknown"
             
-            with get_session() as session:
-                log = Message(
-                    sender=sender,
-                    target=target,
-                    topic=topic,
-                    payload=json.dumps(payload),
-                    state="delivered"
-                )
-                session.add(log)
-                session.commit()
+            await message_log.submit({
+                "sender": sender,
+                "target": target,
+                "topic": topic,
+                "payload": json.dumps(payload),
+                "state": "delivered",
+            })
         except Exception as e:
             logger.error(f"Error handling signal message: {e}")
 
-    await mqtt.listen(topic, handle_signal)
+    await mqtt.subscribe(topic, handle_signal)
 
 async def presence_monitor():
-    """Background task to monitor agent presence signals."""
+    """Register the agent presence monitor on the shared MQTT subscriber."""
     logger.info("Starting Presence Monitor...")
     topic = "bacon/v1/presence/agent/+" 
     
@@ -75,68 +150,141 @@ async def presence_monitor():
         try:
             agent_id = payload.get("agent_id")
             node_id = payload.get("node_id")
-            parent_id = payload.get("parent_id")
-            capabilities = json.dumps(payload.get("capabilities", []))
-            state = payload.get("state", "unknown")
+            if not agent_id or not node_id:
+                logger.warning(f"Ignoring presence without agent_id/node_id on {topic}")
+                return
             ts_str = payload.get("ts")
-            
-            ts = datetime.fromisoformat(ts_str) if ts_str else datetime.now(timezone.utc)
-
-            with get_session() as session:
-                # Ensure Node exists
-                node = session.get(Node, node_id)
-                if not node:
-                    node = Node(id=node_id, hostname=node_id, os="unknown", capabilities=capabilities)
-                    session.add(node)
-                
-                # Update or create Agent
-                agent = session.get(Agent, agent_id)
-                
+            ts = as_utc(datetime.fromisoformat(ts_str)) if ts_str else datetime.now(timezone.utc)
+
+            record = {
+                "agent_id": agent_id,
+                "node_id": node_id,
+                "parent_id": payload.get("parent_id"),
+                "capabilities": json.dumps(payload.get("capabilities", [])),
+                "state": payload.get("state", "unknown"),
+                "ts": ts,
                 # Robust extraction: check meta nested first, then top level
-                operator = payload.get("meta", {}).get("operator") or payload.get("operator")
-                version = payload.get("v")
-                
-                if not agent:
-                    agent = Agent(
-                        id=agent_id, 
-                        node_id=node_id, 
-                        role="unknown", 
-                        operator=operator,
-                        version=version,
-                        status=state, 
-                        last_seen=ts,
-                        parent_id=parent_id
-                    )
-                    session.add(agent)
-                else:
-                    agent.status = state
-                    agent.last_seen = ts
-                    agent.operator = operator
-                    agent.version = version
-                    agent.parent_id = parent_id
-                
-                session.commit()
-                logger.debug(f"Updated agent {agent_id} state to {state}")
+                "operator": payload.get("meta", {}).get("operator") or payload.get("operator"),
+                "version": payload.get("v"),
+            }
+            # The registry is authoritative; SQLite is written behind it by
+            # the PresenceBatcher, coalesced per agent.
+            agent = registry.apply_presence(record)
+            presence_batcher.submit(record)
+            hub.publish({"type": "agent", "data": agent.to_dict()})
         except Exception as e:
             logger.error(f"Error processing presence on {topic}: {e}")
 
-    while True:
-        try:
-            await mqtt.listen(topic, handle_presence)
-        except Exception as e:
-            logger.error(f"MQTT presence listener crashed: {e}. Restarting in 5s...")
-            await asyncio.sleep(5)
+    await mqtt.subscribe(topic, handle_presence)
 
 @app.get("/api/agents")
-def list_agents():
-    with get_session() as session:
-        return session.exec(select(Agent)).all()
+async def list_agents():
+    """Served from the in-memory registry's cached snapshot, not SQLite."""
+    return Response(content=registry.snapshot_json(), media_type="application/json")
+
+@app.get("/api/ingest/stats")
+def ingest_stats():
+    """Ingestion write-behind metrics (flush sizes, lag and queue depth) and event-loop lag."""
+    return {
+        "presence": presence_batcher.stats(),
+        "messages": message_log.stats(),
+        "event_loop": loop_monitor.stats(),
+        "websocket": hub.stats(),
+        "memory": memory.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the control plane's metrics registry."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
 
 @app.get("/api/history")
-def get_history(limit: int = 100):
+def get_history(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sender: Optional[str] = None,
+    target: Optional[str] = None,
+    topic_prefix: Optional[str] = None,
+    state: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = "json",
+):
+    """Message history, newest first, keyset-paginated on (ts, id).
+
+    The next page's cursor is returned in the X-Next-Cursor header. A JSON
+    page holds `limit` rows (default 100), clamped to HISTORY_MAX_PAGE.
+    With format=ndjson every matching row after `cursor` (or `limit` rows)
+    is streamed instead.
+    """
+    filters = HistoryFilter(sender, target, topic_prefix, state, since, until)
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    if cursor is not None:
+        # Checked up front so a bad cursor is a 400, not a broken stream.
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if format == "ndjson":
+        return StreamingResponse(iter_ndjson(engine, filters, max_rows=limit, cursor=cursor),
+                                 media_type="application/x-ndjson")
+
+    page = 100 if limit is None else min(limit, HISTORY_MAX_PAGE)
+    if page <= 0:
+        return []
+    with get_session() as session:
+        try:
+            rows, next_cursor = fetch_page(session, filters, page, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+
+def recent_messages(limit: int = 20) -> List[Dict[str, Any]]:
     with get_session() as session:
-        statement = select(Message).order_by(Message.ts.desc()).limit(limit)
-        return session.exec(statement).all()
+        messages = session.exec(select(Message).order_by(Message.ts.desc()).limit(limit)).all()
+        return jsonable_encoder(messages)
+
+async def dashboard_snapshot(history_limit: int = 20) -> str:
+    """Serialized initial state for a freshly connected dashboard."""
+    messages = json.dumps(await run_db(recent_messages, history_limit))
+    agents = registry.snapshot_json().decode()
+    return f'{{"type": "snapshot", "agents": {agents}, "messages": {messages}}}'
+
+@app.websocket("/ws")
+async def dashboard_ws(websocket: WebSocket):
+    """Push channel for the dashboard: one snapshot, then agent/message deltas."""
+    await websocket.accept()
+    queue = hub.connect()
+
+    async def drain_client():
+        # Nothing is expected from the client; this only detects disconnects.
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.create_task(drain_client())
+    try:
+        await websocket.send_text(await dashboard_snapshot())
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                getter.cancel()
+                break
+            item = getter.result()
+            if item is RESYNC:
+                item = await dashboard_snapshot()
+            await websocket.send_text(item)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Dashboard websocket closed: {e}")
+    finally:
+        reader.cancel()
+        hub.disconnect(queue)
 
 @app.post("/api/signal")
 async def send_signal(target: str, signal_type: str, reason: str = "", priority: str = "normal"):
@@ -155,37 +303,35 @@ async def send_signal(target: str, signal_type: str, reason: str = "", priority:
     if not success:
         raise HTTPException(status_code=500, detail="Failed to publish signal")
     
-    # Log to DB
-    with get_session() as session:
-        log = Message(
-            sender="control-plane",
-            target=target,
-            topic=topic,
-            payload=json.dumps(payload),
-            state="delivered"
-        )
-        session.add(log)
-        session.commit()
+    # Log to DB (group-committed by the message log writer)
+    await message_log.submit({
+        "sender": "control-plane",
+        "target": target,
+        "topic": topic,
+        "payload": json.dumps(payload),
+        "state": "delivered",
+    })
         
-    # Also record to memory if significant
-    memory.learn(f"Sent {signal_type} to {target} because {reason}", agent_id=target)
+    # Also record to memory; queued for the background writer so the
+    # response never waits on Mem0.
+    memory.learn_later(f"Sent {signal_type} to {target} because {reason}", agent_id=target)
     
     return {"status": "sent", "target": target, "topic": topic}
 
 @app.post("/api/memory")
 async def add_memory(text: str, agent_id: Optional[str] = None):
     """Record a memory via the gateway."""
-    result = memory.learn(text, agent_id=agent_id)
+    result = await memory.alearn(text, agent_id=agent_id)
     if not result:
         raise HTTPException(status_code=500, detail="Failed to record memory")
     return {"status": "recorded", "agent_id": agent_id or "bacon-system"}
 
 @app.get("/api/memory/{agent_id}")
-def get_agent_memory(agent_id: str, query: str = "*"):
+async def get_agent_memory(agent_id: str, query: str = "*"):
     """Retrieve memories for a specific agent. If query is '*', returns all."""
     if query == "*":
-        return memory.get_all(agent_id=agent_id)
-    return memory.recall(query, agent_id=agent_id)
+        return await memory.aget_all(agent_id=agent_id)
+    return await memory.arecall(query, agent_id=agent_id)
 
 @app.get("/api/settings/{key}")
 def get_setting(key: str):
@@ -1,29 +1,130 @@
 import os
+import asyncio
+import functools
 import logging
-from typing import List, Dict, Any, Optional
-from mem0 import MemoryClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+from metrics import REGISTRY
+from recall_cache import RecallCache
+
+try:
+    from mem0 import MemoryClient
+except ImportError:  # Only the local backend is available
+    MemoryClient = None
 
 logger = logging.getLogger("bacon-memory-gateway")
 
+# "cloud" (Mem0 Platform), "local" (LocalMemoryStore), "off" (no memory,
+# for tests and benchmarks) or "auto": cloud when MEM0_API_KEY is set,
+# local otherwise.
+MEM0_BACKEND = os.environ.get("MEM0_BACKEND", "auto")
+BACKENDS = ("auto", "cloud", "local", "off")
+
+def default_local_path() -> str:
+    """BACON_MEMORY_DB_PATH, else bacon-memory.db next to BACON_DB_PATH, else in ~/.bacon."""
+    path = os.environ.get("BACON_MEMORY_DB_PATH")
+    if path:
+        return path
+    db_path = os.environ.get("BACON_DB_PATH")
+    if db_path and db_path != ":memory:":
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), "bacon-memory.db")
+    return os.path.join(os.path.expanduser("~"), ".bacon", "bacon-memory.db")
+
+MEM0_CALL_SECONDS = REGISTRY.histogram(
+    "bacon_mem0_call_seconds", "Mem0 client call latency, by operation.", ("op",))
+MEM0_ERRORS = REGISTRY.counter(
+    "bacon_mem0_errors_total", "Mem0 client calls that raised, by operation.", ("op",))
+
+_STOP = object()
+
 class MemoryGateway:
-    def __init__(self, user_id: str = "bacon-system"):
-        # Initialize Mem0 in Cloud mode using the dedicated MemoryClient.
-        # This bypasses local OpenAI and Vector DB checks.
+    """Mem0 access for the control plane and MCP server.
+
+    The sync methods call Mem0 directly. The async ones (`alearn`, `arecall`,
+    `aget_all`) run those calls on a bounded thread pool so Mem0 round trips
+    never block the event loop, and `learn_later` queues a write for a
+    background task. The writer drains the queue in batches and issues one
+    Mem0 add per memory (exactly what `learn` would send), concurrently on
+    the pool, retrying failed adds with backoff. Async lookups go through a
+    RecallCache that every write to an agent invalidates.
+
+    The backend is Mem0 Cloud or, with `backend="local"` (or no API key),
+    a LocalMemoryStore in SQLite with the same client surface. With
+    `backend="off"` every call is a no-op.
+    """
+
+    def __init__(self, user_id: str = "bacon-system", workers: int = 4, write_batch: int = 20,
+                 write_interval: float = 0.5, write_queue: int = 1000,
+                 write_retries: int = 3, retry_delay: float = 0.5,
+                 cache_size: int = 1024, cache_ttl: float = 30.0,
+                 backend: Optional[str] = None, local_path: Optional[str] = None):
+        backend = backend or MEM0_BACKEND
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown memory backend {backend!r} (expected {', '.join(BACKENDS)})")
         api_key = os.environ.get("MEM0_API_KEY")
-        if api_key:
-            self.client = MemoryClient(api_key=api_key)
-        else:
+        if backend == "auto":
+            backend = "cloud" if api_key else "local"
+        self.backend = backend
+        self.client = None
+        if backend == "off":
+            logger.info("Memory backend is off; memory calls are no-ops")
+        elif backend == "local":
+            from local_memory import LocalMemoryStore
+            path = local_path or default_local_path()
+            self.client = LocalMemoryStore(path)
+            logger.info(f"Using local memory backend at {path}")
+        elif not api_key:
             logger.error("MEM0_API_KEY not found. Cloud memory operations will fail.")
-            self.client = None
+        elif MemoryClient is None:
+            logger.error("mem0ai is not installed. Cloud memory operations will fail.")
+        else:
+            # Initialize Mem0 in Cloud mode using the dedicated MemoryClient.
+            # This bypasses local OpenAI and Vector DB checks.
+            self.client = MemoryClient(api_key=api_key)
+            logger.info("Using Mem0 Cloud memory backend")
         self.user_id = user_id
+        self.write_batch = write_batch
+        self.write_interval = write_interval
+        self.write_retries = write_retries
+        self.retry_delay = retry_delay
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bacon-mem0")
+        self._write_queue: asyncio.Queue = asyncio.Queue(maxsize=write_queue)
+        self._writer: Optional[asyncio.Task] = None
+        self.cache = RecallCache(max_entries=cache_size, ttl=cache_ttl)
+        self._write_stats = {
+            "queued": 0,
+            "dropped": 0,
+            "written": 0,
+            "batches": 0,
+            "calls": 0,
+            "retries": 0,
+            "errors": 0,
+        }
+
+    def _call(self, op: str, fn, *args, **kwargs):
+        """Invoke a Mem0 client method, recording its latency and any error."""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            MEM0_ERRORS.labels(op).inc()
+            raise
+        finally:
+            MEM0_CALL_SECONDS.labels(op).observe(time.perf_counter() - started)
 
     def learn(self, text: str, agent_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
         """Record a memory for a specific agent or the system."""
         if not self.client:
             return None
         user_id = agent_id or self.user_id
+        result = self._add(text, user_id, metadata)
+        self.cache.invalidate(user_id)
+        return result
+
+    def _add(self, text: str, user_id: str, metadata: Optional[Dict[str, Any]]):
         try:
-            return self.client.add(text, user_id=user_id, metadata=metadata)
+            return self._call("add", self.client.add, text, user_id=user_id, metadata=metadata)
         except Exception as e:
             logger.error(f"Failed to add memory: {e}")
             return None
@@ -32,25 +133,167 @@ class MemoryGateway:
         """Retrieve relevant memories for a query."""
         if not self.client:
             return []
-        user_id = agent_id or self.user_id
         try:
-            return self.client.search(query, user_id=user_id, limit=limit)
+            return self._search(query, agent_id or self.user_id, limit)
         except Exception as e:
             logger.error(f"Failed to recall memories: {e}")
             return []
 
+    def _search(self, query: str, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        return self._call("search", self.client.search, query, user_id=user_id, limit=limit)
+
     def get_all(self, agent_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Fetch all memories for a specific agent. fallbacks to search if get_all is restricted."""
         if not self.client:
             return []
-        user_id = agent_id or self.user_id
+        try:
+            return self._get_all(agent_id or self.user_id)
+        except Exception as e:
+            logger.error(f"Memory retrieval failed completely: {e}")
+            return []
+
+    def _get_all(self, user_id: str) -> List[Dict[str, Any]]:
+        """get_all with a search fallback; raises only if both fail."""
         try:
             # For Mem0 Cloud, search with empty query often works better if filters are required
-            return self.client.get_all(user_id=user_id)
+            return self._call("get_all", self.client.get_all, user_id=user_id)
         except Exception as e:
             logger.warning(f"get_all failed, trying search fallback: {e}")
-            try:
-                return self.client.search("", user_id=user_id, limit=100)
-            except Exception as e2:
-                logger.error(f"Memory retrieval failed completely: {e2}")
-                return []
+            return self._search("", user_id, 100)
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def alearn(self, text: str, agent_id: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        """learn() on the Mem0 thread pool; waits for the result."""
+        if not self.client:
+            return None
+        user_id = agent_id or self.user_id
+        result = await self._run(self._add, text, user_id, metadata)
+        self.cache.invalidate(user_id)
+        return result
+
+    async def arecall(self, query: str, agent_id: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """Cached recall(); failures return [] and are not cached."""
+        if not self.client:
+            return []
+        user_id = agent_id or self.user_id
+        try:
+            return await self.cache.get((user_id, query, limit), lambda: self._run(self._search, query, user_id, limit))
+        except Exception as e:
+            logger.error(f"Failed to recall memories: {e}")
+            return []
+
+    async def aget_all(self, agent_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Cached get_all(); failures return [] and are not cached."""
+        if not self.client:
+            return []
+        user_id = agent_id or self.user_id
+        try:
+            return await self.cache.get((user_id, "*", None), lambda: self._run(self._get_all, user_id))
+        except Exception as e:
+            logger.error(f"Memory retrieval failed completely: {e}")
+            return []
+
+    def learn_later(self, text: str, agent_id: Optional[str] = None,
+                    metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue a memory for the background writer and return immediately.
+
+        Returns False if Mem0 is not configured or the queue is full (the
+        write is dropped and counted rather than slowing the caller down).
+        """
+        if not self.client:
+            return False
+        self.start()
+        try:
+            self._write_queue.put_nowait((agent_id or self.user_id, text, metadata))
+        except asyncio.QueueFull:
+            self._write_stats["dropped"] += 1
+            logger.warning("Memory write queue full, dropping memory")
+            return False
+        self._write_stats["queued"] += 1
+        return True
+
+    def start(self):
+        """Start the background writer (called lazily by learn_later)."""
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._run_writer())
+
+    async def close(self):
+        """Write out queued memories, then stop the writer and thread pool."""
+        if self._writer is not None:
+            await self._write_queue.put(_STOP)
+            await self._writer
+            self._writer = None
+        if self.backend == "local" and self.client is not None:
+            # Let running calls finish before the store saves its indexes and closes.
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+            self.client.close()
+        else:
+            self._executor.shutdown(wait=False)
+
+    async def _run_writer(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._write_queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.write_interval
+            while len(batch) < self.write_batch:
+                try:
+                    item = self._write_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._write_queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        # One add per memory, as separate learn() calls would send: merged
+        # messages would make Mem0 extract facts from them as one
+        # conversation. The thread pool bounds how many run at once.
+        async def add(user_id: str, text: str, metadata: Optional[Dict[str, Any]]):
+            for attempt in range(self.write_retries + 1):
+                self._write_stats["calls"] += 1
+                try:
+                    return await self._run(self._call, "add", self.client.add, text,
+                                           user_id=user_id, metadata=metadata)
+                except Exception as e:
+                    if attempt == self.write_retries:
+                        raise
+                    self._write_stats["retries"] += 1
+                    delay = self.retry_delay * 2 ** attempt
+                    logger.warning(f"Failed to add memory for {user_id} ({e}); retrying in {delay:g}s")
+                    await asyncio.sleep(delay)
+
+        results = await asyncio.gather(*(add(*item) for item in batch), return_exceptions=True)
+        stats = self._write_stats
+        stats["batches"] += 1
+        for user_id in {item[0] for item in batch}:
+            self.cache.invalidate(user_id)
+        for (user_id, _, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                stats["errors"] += 1
+                logger.error(f"Failed to add memory for {user_id} after {self.write_retries + 1} attempts: {result}")
+            else:
+                stats["written"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._write_stats,
+            "pending": self._write_queue.qsize(),
+            "enabled": self.client is not None,
+            "backend": self.backend,
+            "cache": self.cache.stats(),
+        }
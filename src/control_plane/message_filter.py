@@ -0,0 +1,137 @@
+"""Declarative wake filters, evaluated before a waiting agent is woken.
+
+A filter spec is a small JSON object; every key is optional and all of
+them must hold:
+
+    {"equals": {"content.reason": "deploy"},   # dotted path == value
+     "type_in": ["WAKE", "INTERRUPT"],          # signal type, case-insensitive
+     "min_priority": "high",                    # low < normal < high < urgent < critical, or a number
+     "senders": ["control-plane", "zbook"]}     # sender allow-list (any identity matches)
+
+Publishers put these fields in different places: control-plane signals
+wrap {type, priority, requester} in the envelope's content, while agent
+messages carry type and from/source at the top level. The accessors below
+read whichever is present: the content value when it is set at all (even
+0 or ""), otherwise the envelope's. A message without a priority counts as
+normal.
+
+`compile_filter` builds each distinct spec once and returns the same
+MessageFilter for later calls, so its delivered/filtered counters add up
+across waits.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+PRIORITY_LEVELS = {"low": 0, "normal": 1, "high": 2, "urgent": 3, "critical": 4}
+FILTER_KEYS = ("equals", "type_in", "min_priority", "senders")
+# Keys whose value must be a container of this type (None counts as absent).
+FILTER_SHAPES = {"equals": dict, "type_in": list, "senders": list}
+# Distinct specs kept compiled; the oldest is forgotten beyond this.
+MAX_COMPILED = 256
+
+def lookup(payload: Any, path: str) -> Any:
+    """Value at a dotted path in nested dicts, or None."""
+    value = payload
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def _content(payload: Any) -> Dict[str, Any]:
+    content = payload.get("content") if isinstance(payload, dict) else None
+    return content if isinstance(content, dict) else {}
+
+def _signal_field(payload: Any, key: str) -> Any:
+    value = _content(payload).get(key)
+    return lookup(payload, key) if value is None else value
+
+def message_type(payload: Any) -> Optional[str]:
+    value = _signal_field(payload, "type")
+    return str(value).upper() if value is not None else None
+
+def message_priority(payload: Any) -> Optional[float]:
+    value = _signal_field(payload, "priority")
+    return priority_level("normal" if value is None else value)
+
+def message_senders(payload: Any) -> List[str]:
+    """Every identity the message names: host (source), agent (from, agent_id) and requester."""
+    if not isinstance(payload, dict):
+        return []
+    found = [payload.get(key) for key in ("from", "source", "agent_id", "requester")]
+    found.append(_content(payload).get("requester"))
+    return [str(value) for value in found if value is not None]
+
+def priority_level(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        name = value.strip().lower()
+        if name in PRIORITY_LEVELS:
+            return float(PRIORITY_LEVELS[name])
+        try:
+            return float(name)
+        except ValueError:
+            return None
+    return None
+
+class MessageFilter:
+    """A compiled filter spec: call it with a decoded payload to test it."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict):
+            raise ValueError(f"A filter must be an object, got {type(spec).__name__}")
+        unknown = set(spec) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))} (expected {', '.join(FILTER_KEYS)})")
+        for key, shape in FILTER_SHAPES.items():
+            if spec.get(key) is not None and not isinstance(spec[key], shape):
+                raise ValueError(f"Filter {key} must be a {shape.__name__}, got {type(spec[key]).__name__}")
+        self.spec = spec
+        self.delivered = 0
+        self.filtered = 0
+        self._checks: List[Callable[[Any], bool]] = []
+
+        for path, expected in (spec.get("equals") or {}).items():
+            self._checks.append(lambda p, path=path, expected=expected: lookup(p, path) == expected)
+        if spec.get("type_in") is not None:
+            types = frozenset(str(t).upper() for t in spec["type_in"])
+            self._checks.append(lambda p: message_type(p) in types)
+        if spec.get("min_priority") is not None:
+            floor = priority_level(spec["min_priority"])
+            if floor is None:
+                raise ValueError(f"Invalid min_priority: {spec['min_priority']!r}")
+            # An unreadable priority ranks lowest.
+            self._checks.append(lambda p: (message_priority(p) or 0.0) >= floor)
+        if spec.get("senders") is not None:
+            senders = frozenset(str(s) for s in spec["senders"])
+            self._checks.append(lambda p: not senders.isdisjoint(message_senders(p)))
+
+    def __call__(self, payload: Any) -> bool:
+        if all(check(payload) for check in self._checks):
+            self.delivered += 1
+            return True
+        self.filtered += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"filter": self.spec, "delivered": self.delivered, "filtered": self.filtered}
+
+_compiled: Dict[str, MessageFilter] = {}
+
+def compile_filter(spec: Optional[Dict[str, Any]]) -> Optional[MessageFilter]:
+    """The MessageFilter for a spec (None for no filter), built once per distinct spec."""
+    if spec is None or spec == {}:
+        return None
+    key = json.dumps(spec, sort_keys=True, default=str)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = MessageFilter(spec)
+        if len(_compiled) > MAX_COMPILED:
+            del _compiled[next(iter(_compiled))]
+    return compiled
+
+def filter_stats() -> List[Dict[str, Any]]:
+    return [f.stats() for f in _compiled.values()]
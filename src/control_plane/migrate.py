@@ -1,34 +1,38 @@
-import sqlite3
+"""Apply all pending schema migrations (see migrations.py) to the control-plane database.
+
+The control plane runs these itself at startup; this script is for upgrading
+a database offline, e.g. before a deploy.
+"""
 import os
+import sys
+
+from sqlmodel import create_engine
+
+from migrations import MIGRATIONS, applied_versions, run_migrations
 
 # Database Path
-DB_PATH = "bacon.db"
+DB_PATH = os.environ.get("BACON_DB_PATH", "bacon.db")
 
 def migrate():
     if not os.path.exists(DB_PATH):
         print(f"❌ Database {DB_PATH} not found.")
-        return
+        return False
 
     print(f"🛠️ Migrating database {DB_PATH}...")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Add parent_id to agent table if it doesn't exist
-        cursor.execute("PRAGMA table_info(agent)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        if "parent_id" not in columns:
-            print("➕ Adding 'parent_id' column to 'agent' table...")
-            cursor.execute("ALTER TABLE agent ADD COLUMN parent_id TEXT")
-            conn.commit()
-            print("✅ Migration successful!")
+        engine = create_engine(f"sqlite:///{DB_PATH}")
+        applied = run_migrations(engine) + run_migrations(engine, online=True)
+        if applied:
+            print(f"✅ Applied migrations: {', '.join(map(str, applied))}")
         else:
-            print("ℹ️ 'parent_id' column already exists.")
-            
-        conn.close()
+            print("ℹ️ Database is already up to date.")
+        current = applied_versions(engine)
+        for m in MIGRATIONS:
+            print(f"  {'✓' if m.version in current else '✗'} {m.version}: {m.description}")
+        return True
     except Exception as e:
         print(f"❌ Migration failed: {e}")
+        return False
 
 if __name__ == "__main__":
-    migrate()
+    sys.exit(0 if migrate() else 1)
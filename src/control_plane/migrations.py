@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable, List, Set
+
+from sqlalchemy import text
+
+logger = logging.getLogger("bacon-migrations")
+
+class Migration:
+    """One schema step. `online` steps (index builds) run after startup, off the request path."""
+
+    def __init__(self, version: int, description: str, apply: Callable, online: bool = False):
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.online = online
+
+def _add_agent_parent_id(conn):
+    columns = [row[1] for row in conn.execute(text("PRAGMA table_info(agent)"))]
+    if "parent_id" not in columns:
+        conn.execute(text("ALTER TABLE agent ADD COLUMN parent_id TEXT"))
+
+def _create_index(name: str, table: str, columns: str) -> Callable:
+    def apply(conn):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    return apply
+
+# Append only: applied versions are recorded in schema_migrations and never re-run.
+# Index names match the Index() declarations in models.py, so fresh databases
+# created by create_all() see these as no-ops.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Add agent.parent_id", _add_agent_parent_id),
+    Migration(2, "Index message(ts)", _create_index("ix_message_ts", "message", "ts"), online=True),
+    Migration(3, "Index message(target, ts)", _create_index("ix_message_target_ts", "message", "target, ts"), online=True),
+    Migration(4, "Index message(sender, ts)", _create_index("ix_message_sender_ts", "message", "sender, ts"), online=True),
+    Migration(5, "Index agent(last_seen)", _create_index("ix_agent_last_seen", "agent", "last_seen"), online=True),
+    Migration(6, "Index agent(parent_id)", _create_index("ix_agent_parent_id", "agent", "parent_id"), online=True),
+    Migration(7, "Index message(topic, ts)", _create_index("ix_message_topic_ts", "message", "topic, ts"), online=True),
+]
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TEXT NOT NULL)"
+        ))
+
+def applied_versions(engine) -> Set[int]:
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def pending_migrations(engine, online: bool) -> List[Migration]:
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m.online == online and m.version not in applied]
+
+def apply_migration(engine, migration: Migration):
+    """Apply one migration and record its version in the same transaction."""
+    logger.info(f"Applying migration {migration.version}: {migration.description}")
+    with engine.begin() as conn:
+        migration.apply(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+            {"v": migration.version, "d": migration.description, "t": datetime.now(timezone.utc).isoformat()},
+        )
+
+def run_migrations(engine, online: bool = False) -> List[int]:
+    """Apply every pending migration of one kind, in version order."""
+    applied = []
+    for migration in pending_migrations(engine, online):
+        apply_migration(engine, migration)
+        applied.append(migration.version)
+    return applied
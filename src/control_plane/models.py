@@ -1,5 +1,6 @@
 from datetime import datetime, timezone
 from typing import Optional
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 class Node(SQLModel, table=True):
@@ -9,6 +10,11 @@ class Node(SQLModel, table=True):
     capabilities: str  # JSON string
 
 class Agent(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_agent_last_seen", "last_seen"),
+        Index("ix_agent_parent_id", "parent_id"),
+    )
+
     id: str = Field(primary_key=True)
     node_id: str = Field(foreign_key="node.id")
     role: str
@@ -19,6 +25,14 @@ class Agent(SQLModel, table=True):
     parent_id: Optional[str] = None
 
 class Message(SQLModel, table=True):
+    # Existing databases get these through migrations.py
+    __table_args__ = (
+        Index("ix_message_ts", "ts"),
+        Index("ix_message_target_ts", "target", "ts"),
+        Index("ix_message_sender_ts", "sender", "ts"),
+        Index("ix_message_topic_ts", "topic", "ts"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     ts: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     sender: str  # from
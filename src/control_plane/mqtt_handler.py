@@ -2,19 +2,44 @@ import asyncio
 import json
 import logging
 import socket
+import time
 from datetime import datetime, timezone
-from typing import Optional, Callable, Dict, Any, Union
-import aiomqtt
+from typing import Optional, Callable, Dict, Any, List, Union
+from message_filter import compile_filter
+from metrics import REGISTRY
+from topic_trie import TopicTrie
+from transport import make_transport
 
 logger = logging.getLogger("bacon-mqtt-handler")
 
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "bacon_mqtt_publish_seconds", "Publish latency on a pooled connection (until PUBACK for QoS 1).")
+PUBLISH_FAILURES = REGISTRY.counter(
+    "bacon_mqtt_publish_failures_total", "Publishes that still failed after one reconnect.")
+CONNECTS = REGISTRY.counter(
+    "bacon_mqtt_connects_total", "MQTT connections opened, by role.", ("role",))
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "bacon_mqtt_messages_received_total", "Messages dispatched, by subscribed topic filter.", ("filter",))
+
 class MQTTHandler:
-    def __init__(self, broker: str, port: int = 1883, username: str = "", password: str = ""):
+    def __init__(self, broker: str, port: int = 1883, username: str = "", password: str = "",
+                 publish_pool_size: int = 1, transport: Union[str, Any, None] = None):
         self.broker = broker
         self.port = port
         self.username = username
         self.password = password
         self.hostname = socket.gethostname().lower().replace(".", "-")
+        # Long-lived publisher connections, opened lazily on first publish
+        # and reused by every publish call until close().
+        self._publishers: List[Optional[Any]] = [None] * max(1, publish_pool_size)
+        self._publisher_locks = [asyncio.Lock() for _ in self._publishers]
+        self._next_publisher = 0
+        # Subscription multiplexer: one shared connection holds every
+        # registered filter and dispatches through the topic trie.
+        self._subscriptions = TopicTrie()
+        self._subscriber: Optional[Any] = None
+        self._subscriber_task: Optional[asyncio.Task] = None
+        self._closed = asyncio.Event()
         self._connect_kwargs = {
             "hostname": self.broker,
             "port": self.port,
@@ -23,6 +48,11 @@ class MQTTHandler:
             self._connect_kwargs["username"] = self.username
         if self.password:
             self._connect_kwargs["password"] = self.password
+        # Every connection below comes from the transport, so "loopback" (or a
+        # LoopbackTransport instance) runs the handler against an in-process broker.
+        if transport is None or isinstance(transport, str):
+            transport = make_transport(transport or "aiomqtt", **self._connect_kwargs)
+        self.transport = transport
 
     def get_topic(self, session_id: Optional[str] = None, sub_topic: str = "data") -> str:
         """Construct MQTT topic for a session using v1 namespace."""
@@ -31,51 +61,135 @@ class MQTTHandler:
             return f"bacon/v1/presence/agent/{target}"
         return f"bacon/v1/{sub_topic}/{target}"
 
+    async def _get_publisher(self, slot: int) -> Any:
+        """Return the connected publisher for a pool slot, connecting it if needed."""
+        client = self._publishers[slot]
+        if client is not None:
+            return client
+        async with self._publisher_locks[slot]:
+            # Another publish may have connected this slot while we waited.
+            if self._publishers[slot] is None:
+                client = self.transport.client()
+                await client.__aenter__()
+                self._publishers[slot] = client
+                CONNECTS.labels("publisher").inc()
+                logger.info(f"Publisher connection {slot} established to {self.broker}:{self.port}")
+            return self._publishers[slot]
+
+    async def _drop_publisher(self, slot: int, client: Any):
+        """Discard a broken publisher so the next publish reconnects the slot."""
+        if self._publishers[slot] is client:
+            self._publishers[slot] = None
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception:
+            pass
+
     async def publish(self, topic: str, message: Union[str, Dict], message_type: str = "text"):
-        """Publish a message to a topic."""
+        """Publish a message to a topic over a pooled persistent connection."""
         envelope = {
             "type": message_type,
             "content": message,
             "source": self.hostname,
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
-        
-        try:
-            async with aiomqtt.Client(**self._connect_kwargs) as client:
-                await client.publish(
-                    topic,
-                    json.dumps(envelope),
-                    qos=1
-                )
-                logger.info(f"Published message to {topic}")
+        payload = json.dumps(envelope)
+
+        slot = self._next_publisher
+        self._next_publisher = (slot + 1) % len(self._publishers)
+
+        # One retry on a fresh connection covers a dropped broker session.
+        for attempt in range(2):
+            client = None
+            try:
+                client = await self._get_publisher(slot)
+                started = time.perf_counter()
+                await client.publish(topic, payload, qos=1)
+                PUBLISH_SECONDS.observe(time.perf_counter() - started)
+                logger.debug(f"Published message to {topic}")
                 return True
-        except Exception as e:
-            logger.error(f"Failed to publish message: {e}")
-            return False
+            except Exception as e:
+                if client is not None:
+                    await self._drop_publisher(slot, client)
+                if attempt == 0:
+                    logger.warning(f"Publish to {topic} failed ({e}), reconnecting...")
+                else:
+                    logger.error(f"Failed to publish message: {e}")
+        PUBLISH_FAILURES.inc()
+        return False
 
-    async def wait_for_message(self, topic: str, timeout: int = 3600, on_progress: Optional[Callable[[int, int, str], None]] = None):
-        """Block until a message is received on a topic."""
-        start_time = asyncio.get_event_loop().time()
+    async def close(self):
+        """Stop the shared subscriber and disconnect all pooled publisher connections."""
+        self._closed.set()
+        if self._subscriber_task is not None:
+            self._subscriber_task.cancel()
+            await asyncio.gather(self._subscriber_task, return_exceptions=True)
+            self._subscriber_task = None
+        for slot, client in enumerate(self._publishers):
+            if client is not None:
+                await self._drop_publisher(slot, client)
+        logger.info("MQTT connections closed")
+
+    async def wait_for_message(self, topic: str, timeout: int = 3600, on_progress: Optional[Callable[[int, int, str], None]] = None,
+                               max_messages: int = 1, linger_ms: int = 0, filter: Optional[Dict[str, Any]] = None):
+        """Block until a message is received on a topic.
+
+        With max_messages > 1, keeps collecting for up to `linger_ms` after
+        the first message (or until max_messages have arrived) and returns
+        them together in "messages", so a burst costs one wake.
+
+        `filter` is a message_filter spec; messages that fail it are skipped
+        without waking the caller and counted in "filtered".
+        """
+        matches = compile_filter(filter)
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
         message_received = asyncio.Event()
         received_data = {"payload": None, "topic": None}
+        batch: List[Dict[str, Any]] = []
+        skipped = {"count": 0}
+
+        def decode(msg) -> Dict[str, Any]:
+            payload = msg.payload.decode('utf-8')
+            try:
+                payload = json.loads(payload)
+            except json.JSONDecodeError:
+                pass
+            return {"topic": str(msg.topic), "message": payload}
+
+        async def next_match(messages, deadline: Optional[float] = None) -> Dict[str, Any]:
+            while True:
+                if deadline is None:
+                    entry = decode(await messages.__anext__())
+                else:
+                    entry = decode(await asyncio.wait_for(messages.__anext__(), max(0.0, deadline - loop.time())))
+                if matches is None or matches(entry["message"]):
+                    return entry
+                skipped["count"] += 1
 
         async def mqtt_listener():
             try:
-                async with aiomqtt.Client(**self._connect_kwargs) as client:
+                async with self.transport.client() as client:
+                    CONNECTS.labels("waiter").inc()
                     await client.subscribe(topic)
-                    async for msg in client.messages:
-                        payload = msg.payload.decode('utf-8')
+                    messages = client.messages.__aiter__()
+                    batch.append(await next_match(messages))
+                    received_data["payload"] = batch[0]["message"]
+                    received_data["topic"] = batch[0]["topic"]
+                    message_received.set()
+                    deadline = loop.time() + linger_ms / 1000
+                    while len(batch) < max_messages:
+                        if deadline <= loop.time():
+                            break
                         try:
-                            received_data["payload"] = json.loads(payload)
-                        except json.JSONDecodeError:
-                            received_data["payload"] = payload
-                        received_data["topic"] = str(msg.topic)
-                        message_received.set()
-                        return
+                            batch.append(await next_match(messages, deadline))
+                        except asyncio.TimeoutError:
+                            break
             except Exception as e:
                 logger.error(f"MQTT listener error: {e}")
-                received_data["payload"] = f"MQTT error: {str(e)}"
-                message_received.set()
+                if not message_received.is_set():
+                    received_data["payload"] = f"MQTT error: {str(e)}"
+                    message_received.set()
 
         async def reporter():
             if not on_progress:
@@ -84,7 +198,7 @@ class MQTTHandler:
             max_ticks = timeout // 30 + 1
             while not message_received.is_set():
                 tick += 1
-                elapsed = int(asyncio.get_event_loop().time() - start_time)
+                elapsed = int(loop.time() - start_time)
                 await on_progress(tick, max_ticks, f"Listening on {topic}... ({elapsed}s elapsed)")
                 try:
                     await asyncio.wait_for(message_received.wait(), timeout=30)
@@ -97,10 +211,15 @@ class MQTTHandler:
 
         try:
             await asyncio.wait_for(message_received.wait(), timeout=timeout)
+            # The timeout covers the first message; the linger window is bounded on its own.
+            await listener_task
             return {
                 "status": "received",
                 "message": received_data["payload"],
                 "topic": received_data["topic"] or topic,
+                "messages": batch,
+                "count": len(batch),
+                "filtered": skipped["count"],
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
         except asyncio.TimeoutError:
@@ -108,6 +227,7 @@ class MQTTHandler:
                 "status": "timeout",
                 "message": None,
                 "topic": topic,
+                "filtered": skipped["count"],
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
         finally:
@@ -118,23 +238,79 @@ class MQTTHandler:
             except Exception:
                 pass
 
-    async def listen(self, topic: str, callback: Callable[[str, Dict], None]):
-        """Subscribe to a topic and execute callback for each message."""
+    async def subscribe(self, topic: str, callback: Callable[[str, Dict], None]):
+        """Register a callback for a topic filter on the shared subscriber connection."""
+        is_new = topic not in self._subscriptions
+        self._subscriptions.add(topic, callback)
+        client = self._subscriber
+        if is_new and client is not None:
+            try:
+                await client.subscribe(topic, qos=1)
+                logger.info(f"Multiplexed subscriber added {topic}")
+            except Exception as e:
+                # The reconnect loop resubscribes every registered filter.
+                logger.warning(f"Live subscribe to {topic} failed: {e}")
+        if self._subscriber_task is None or self._subscriber_task.done():
+            self._closed.clear()
+            self._subscriber_task = asyncio.create_task(self._run_subscriber())
+
+    async def unsubscribe(self, topic: str, callback: Callable[[str, Dict], None]):
+        """Remove a callback; the broker subscription is dropped with its last callback."""
+        if self._subscriptions.remove(topic, callback) and self._subscriber is not None:
+            try:
+                await self._subscriber.unsubscribe(topic)
+            except Exception as e:
+                logger.warning(f"Unsubscribe from {topic} failed: {e}")
+
+    async def _run_subscriber(self):
+        """Hold the single subscriber connection, reconnecting with backoff."""
+        while not self._closed.is_set():
+            try:
+                async with self.transport.client() as client:
+                    # Publish the client before snapshotting filters so that a
+                    # concurrent subscribe() is either in the snapshot or live.
+                    self._subscriber = client
+                    CONNECTS.labels("subscriber").inc()
+                    filters = self._subscriptions.filters()
+                    if filters:
+                        await client.subscribe([(f, 1) for f in filters])
+                    logger.info(f"Multiplexed subscriber connected with {len(filters)} filters")
+                    async for msg in client.messages:
+                        await self._dispatch(str(msg.topic), msg.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Multiplexed subscriber error: {e}. Reconnecting in 5s...")
+            finally:
+                self._subscriber = None
+            await asyncio.sleep(5)  # Backoff before retry
+
+    async def _dispatch(self, topic: str, raw: Union[bytes, str]):
+        """Decode a message once and hand it to every matching callback."""
+        matches = self._subscriptions.match_by_filter(topic)
+        if not matches:
+            return
+        payload = raw.decode('utf-8') if isinstance(raw, (bytes, bytearray)) else raw
         try:
-            async with aiomqtt.Client(**self._connect_kwargs) as client:
-                await client.subscribe(topic)
-                logger.info(f"Persistent listener subscribed to {topic}")
-                async for msg in client.messages:
-                    payload = msg.payload.decode('utf-8')
-                    try:
-                        data = json.loads(payload)
-                    except json.JSONDecodeError:
-                        data = payload
-                    
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            data = payload
+
+        for topic_filter, callbacks in matches:
+            MESSAGES_RECEIVED.labels(topic_filter).inc()
+            for callback in callbacks:
+                try:
                     if asyncio.iscoroutinefunction(callback):
-                        await callback(str(msg.topic), data)
+                        await callback(topic, data)
                     else:
-                        callback(str(msg.topic), data)
-        except Exception as e:
-            logger.error(f"Persistent listener error on {topic}: {e}")
-            await asyncio.sleep(5)  # Backoff before retry
+                        callback(topic, data)
+                except Exception as e:
+                    logger.error(f"Subscriber callback error on {topic}: {e}")
+
+    async def listen(self, topic: str, callback: Callable[[str, Dict], None]):
+        """Subscribe to a topic and execute callback for each message until close()."""
+        await self.subscribe(topic, callback)
+        try:
+            await self._closed.wait()
+        finally:
+            await self.unsubscribe(topic, callback)
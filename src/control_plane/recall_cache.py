@@ -0,0 +1,121 @@
+import asyncio
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+from metrics import REGISTRY
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "bacon_memory_cache_requests_total", "Memory recall cache lookups, by result.", ("result",))
+_HIT = CACHE_REQUESTS.labels("hit")
+_MISS = CACHE_REQUESTS.labels("miss")
+_COLLAPSED = CACHE_REQUESTS.labels("collapsed")
+
+CacheKey = Tuple[str, Hashable, Hashable]
+
+class RecallCache:
+    """TTL + LRU cache for memory lookups keyed on (agent_id, query, limit).
+
+    Concurrent misses for the same key share one upstream call
+    (singleflight). `invalidate(agent_id)` drops that agent's entries and
+    in-flight loads and bumps its generation: a lookup already in flight
+    when the agent is written to is returned to the callers that joined it
+    but not cached, and later lookups start a fresh load. Errors are never
+    cached. Event-loop only; not thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._by_agent: Dict[str, Set[CacheKey]] = {}
+        self._generation: Dict[str, int] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "collapsed": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    async def get(self, key: CacheKey, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, or load it once for all concurrent callers."""
+        if not self.enabled:
+            return await load()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                _HIT.inc()
+                return value
+            self._stats["expired"] += 1
+            self._discard(key)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._stats["collapsed"] += 1
+            _COLLAPSED.inc()
+        else:
+            self._stats["misses"] += 1
+            _MISS.inc()
+            # The upstream call runs as its own task, so a cancelled caller
+            # does not cancel it for the others waiting on the same key.
+            pending = asyncio.ensure_future(load())
+            self._inflight[key] = pending
+            pending.add_done_callback(functools.partial(self._loaded, key, self._generation.get(key[0], 0)))
+        return await asyncio.shield(pending)
+
+    def _loaded(self, key: CacheKey, generation: int, task: asyncio.Future):
+        # After an invalidation a newer load may own this key.
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self._generation.get(key[0], 0) == generation:
+            self._store(key, task.result())
+
+    def _store(self, key: CacheKey, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._by_agent.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            self._unindex(oldest)
+            self._stats["evictions"] += 1
+
+    def _discard(self, key: CacheKey):
+        if self._entries.pop(key, None) is not None:
+            self._unindex(key)
+
+    def _unindex(self, key: CacheKey):
+        keys = self._by_agent.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_agent[key[0]]
+
+    def invalidate(self, agent_id: str):
+        """Forget everything cached for an agent after a write to its memories."""
+        self._generation[agent_id] = self._generation.get(agent_id, 0) + 1
+        for key in self._by_agent.pop(agent_id, ()):
+            self._entries.pop(key, None)
+        for key in [key for key in self._inflight if key[0] == agent_id]:
+            del self._inflight[key]
+        self._stats["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_agent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["collapsed"]
+        return {
+            **self._stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hit_rate": round((self._stats["hits"] + self._stats["collapsed"]) / lookups, 4) if lookups else 0.0,
+        }
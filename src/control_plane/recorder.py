@@ -0,0 +1,316 @@
+"""MQTT traffic recorder and time-scaled replay.
+
+Records mesh traffic into a compact, append-only file and replays it at
+1x, 10x, 100x (any factor) into a broker or straight into an in-process
+control plane, for deterministic load from real traffic.
+
+File format (little-endian), after an 8-byte magic header:
+
+    b"T" topic_id:u32 length:u16 topic          topic table entry
+    b"M" ts_us:u64 topic_id:u32 flags:u8 length:u32 payload
+                                                 one message
+
+Topics are written once and referenced by id afterwards; flags bit 0 is
+retain and bits 1-2 are the QoS. Timestamps are wall-clock microseconds,
+so sessions appended to the same file keep their real spacing (replay
+--max-gap caps idle stretches). A record cut short by a crash is dropped
+when the file is next opened for appending.
+
+Usage:
+    python recorder.py record mesh.bmqr --duration 3600
+    python recorder.py info mesh.bmqr
+    python recorder.py replay mesh.bmqr --speed 10
+    python recorder.py replay mesh.bmqr --speed 100 --control-plane
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from transport import make_transport
+
+logger = logging.getLogger("bacon-recorder")
+
+MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_USER = os.environ.get("MQTT_USER", "")
+MQTT_PASS = os.environ.get("MQTT_PASS", "")
+MQTT_TRANSPORT = os.environ.get("MQTT_TRANSPORT", "aiomqtt")
+
+MAGIC = b"BMQREC1\n"
+DEFAULT_FILTERS = ["bacon/v1/#", "bacon/agents/#", "bacon/conversation/#", "bacon/signal/#"]
+
+_TOPIC = struct.Struct("<IH")
+_MESSAGE = struct.Struct("<QIBI")
+
+class RecordedMessage:
+    __slots__ = ("ts_us", "topic", "payload", "qos", "retain")
+
+    def __init__(self, ts_us: int, topic: str, payload: bytes, qos: int, retain: bool):
+        self.ts_us = ts_us
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+def _records(f, topics: Dict[int, str]) -> Iterator[Tuple[int, Optional[RecordedMessage]]]:
+    """Stream whole records from the current position, filling `topics` as entries appear.
+
+    Yields (offset just past the record, message or None for topic entries)
+    and stops quietly at a truncated or unknown record.
+    """
+    while True:
+        kind = f.read(1)
+        if kind == b"T":
+            head = f.read(_TOPIC.size)
+            if len(head) < _TOPIC.size:
+                return
+            topic_id, length = _TOPIC.unpack(head)
+            raw = f.read(length)
+            if len(raw) < length:
+                return
+            topics[topic_id] = raw.decode("utf-8")
+            yield f.tell(), None
+        elif kind == b"M":
+            head = f.read(_MESSAGE.size)
+            if len(head) < _MESSAGE.size:
+                return
+            ts_us, topic_id, flags, length = _MESSAGE.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length or topic_id not in topics:
+                return
+            yield f.tell(), RecordedMessage(ts_us, topics[topic_id], payload, (flags >> 1) & 3, bool(flags & 1))
+        else:
+            return
+
+def _check_magic(f, path: str):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a BACON MQTT recording")
+
+def read_recording(path: str) -> Iterator[RecordedMessage]:
+    """Yield every complete message in a recording, in file order."""
+    with open(path, "rb") as f:
+        _check_magic(f, path)
+        for _, message in _records(f, {}):
+            if message is not None:
+                yield message
+
+class RecordingWriter:
+    """Append-only writer; reopening an existing file continues its topic table."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._topics: Dict[str, int] = {}
+        self.messages = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            topics: Dict[int, str] = {}
+            with open(path, "rb") as f:
+                _check_magic(f, path)
+                good = f.tell()
+                for good, _ in _records(f, topics):
+                    pass
+            self._topics = {topic: topic_id for topic_id, topic in topics.items()}
+            self._file = open(path, "r+b")
+            # Drop a partial record left by a crash before appending.
+            self._file.truncate(good)
+            self._file.seek(good)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+
+    def write(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False, ts_us: Optional[int] = None):
+        topic_id = self._topics.get(topic)
+        if topic_id is None:
+            topic_id = len(self._topics)
+            self._topics[topic] = topic_id
+            raw = topic.encode("utf-8")
+            self._file.write(b"T" + _TOPIC.pack(topic_id, len(raw)) + raw)
+        flags = (int(retain) & 1) | ((qos & 3) << 1)
+        ts_us = ts_us if ts_us is not None else time.time_ns() // 1000
+        self._file.write(b"M" + _MESSAGE.pack(ts_us, topic_id, flags, len(payload)) + payload)
+        self.messages += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+async def record(transport, path: str, filters: List[str], duration: Optional[float] = None,
+                 max_messages: Optional[int] = None, flush_interval: float = 1.0) -> int:
+    """Subscribe to `filters` and append every message to `path`. Returns the count written."""
+    writer = RecordingWriter(path)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration if duration else None
+    last_flush = loop.time()
+    try:
+        async with transport.client() as client:
+            await client.subscribe([(f, 1) for f in filters])
+            logger.info(f"Recording {', '.join(filters)} to {path}")
+            messages = client.messages.__aiter__()
+            while max_messages is None or writer.messages < max_messages:
+                timeout = None if deadline is None else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(messages.__anext__(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                writer.write(str(message.topic), bytes(message.payload), message.qos, message.retain)
+                if loop.time() - last_flush >= flush_interval:
+                    writer.flush()
+                    last_flush = loop.time()
+    finally:
+        writer.close()
+    return writer.messages
+
+async def replay(transport, path: str, speed: float = 1.0, max_gap: float = 5.0,
+                 topic_prefix: Optional[str] = None) -> Dict[str, float]:
+    """Publish a recording with its original spacing divided by `speed`.
+
+    Gaps longer than `max_gap` recorded seconds are shortened to `max_gap`.
+    Messages are published in order from a single client; `max_lag_ms`
+    reports how far behind schedule the replay fell.
+    """
+    sent = 0
+    max_lag = 0.0
+    started = time.perf_counter()
+    async with transport.client() as client:
+        schedule = 0.0
+        previous_us = None
+        for message in read_recording(path):
+            if topic_prefix and not message.topic.startswith(topic_prefix):
+                continue
+            if previous_us is not None:
+                schedule += min(max(0, message.ts_us - previous_us) / 1e6, max_gap) / speed
+            previous_us = message.ts_us
+            wait = started + schedule - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            else:
+                max_lag = max(max_lag, -wait)
+            # Retained state is not replayed, so a replay never rewrites the broker's retained store.
+            await client.publish(message.topic, message.payload, qos=message.qos)
+            sent += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "messages": sent,
+        "elapsed_s": round(elapsed, 3),
+        "rate": round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+        "max_lag_ms": round(max_lag * 1000, 3),
+    }
+
+def summarize(path: str) -> Dict[str, object]:
+    count = 0
+    size = 0
+    first = last = None
+    per_tree: Dict[str, int] = {}
+    for message in read_recording(path):
+        count += 1
+        size += len(message.payload)
+        first = message.ts_us if first is None else first
+        last = message.ts_us
+        tree = "/".join(message.topic.split("/")[:3])
+        per_tree[tree] = per_tree.get(tree, 0) + 1
+    return {
+        "file": path,
+        "bytes": os.path.getsize(path),
+        "messages": count,
+        "payload_bytes": size,
+        "span_s": round((last - first) / 1e6, 3) if count else 0.0,
+        "topics": dict(sorted(per_tree.items(), key=lambda kv: -kv[1])),
+    }
+
+async def replay_into_control_plane(path: str, speed: float, max_gap: float,
+                                    topic_prefix: Optional[str]) -> Dict[str, object]:
+    """Start main.py's ingestion in-process on the loopback broker and replay into it."""
+    import main
+    from transport import LoopbackTransport
+
+    await main.startup_event()
+    # The shared subscriber connects in the background; give it a moment.
+    await asyncio.sleep(0.2)
+    try:
+        result = await replay(LoopbackTransport(), path, speed, max_gap, topic_prefix)
+        # Let the subscriber finish dispatching before shutdown flushes the batchers.
+        seen = -1
+        while True:
+            stats = main.ingest_stats()
+            count = stats["presence"]["heartbeats"] + stats["messages"]["accepted"]
+            if count == seen:
+                break
+            seen = count
+            await asyncio.sleep(0.1)
+    finally:
+        await main.shutdown_event()
+    return {**result, "ingest": main.ingest_stats()}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay BACON mesh MQTT traffic.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="append live traffic to a recording")
+    rec.add_argument("path")
+    rec.add_argument("--filter", action="append", dest="filters", help=f"topic filter (default: {' '.join(DEFAULT_FILTERS)})")
+    rec.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    rec.add_argument("--max-messages", type=int, default=None)
+    rec.add_argument("--transport", default=MQTT_TRANSPORT)
+
+    rep = sub.add_parser("replay", help="publish a recording at a speed factor")
+    rep.add_argument("path")
+    rep.add_argument("--speed", type=float, default=1.0, help="time scale, e.g. 1, 10 or 100")
+    rep.add_argument("--max-gap", type=float, default=5.0, help="cap recorded idle gaps (seconds)")
+    rep.add_argument("--topic-prefix", default=None, help="only replay topics starting with this")
+    rep.add_argument("--transport", default=MQTT_TRANSPORT)
+    rep.add_argument("--control-plane", action="store_true",
+                     help="replay into an in-process control plane on the loopback broker (uses BACON_DB_PATH)")
+
+    info = sub.add_parser("info", help="summarize a recording")
+    info.add_argument("path")
+    return parser.parse_args(argv)
+
+def build_transport(kind: str):
+    return make_transport(
+        kind, hostname=MQTT_BROKER, port=MQTT_PORT,
+        username=MQTT_USER or None, password=MQTT_PASS or None,
+    )
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    if args.command == "info":
+        print(json.dumps(summarize(args.path), indent=2))
+    elif args.command == "record":
+        filters = args.filters or DEFAULT_FILTERS
+        print(f"🎙️ Recording {', '.join(filters)} to {args.path} (Ctrl+C to stop)...")
+        try:
+            count = asyncio.run(record(build_transport(args.transport), args.path, filters,
+                                       args.duration, args.max_messages))
+            print(f"✅ Recorded {count} messages")
+        except KeyboardInterrupt:
+            print("✅ Recording stopped")
+    elif args.command == "replay":
+        if args.speed <= 0:
+            raise SystemExit("--speed must be positive")
+        print(f"▶️ Replaying {args.path} at {args.speed:g}x...")
+        if args.control_plane:
+            os.environ["MQTT_TRANSPORT"] = "loopback"
+            # Replayed signals should not land in the real memory store.
+            os.environ.setdefault("MEM0_BACKEND", "off")
+            result = asyncio.run(replay_into_control_plane(args.path, args.speed, args.max_gap, args.topic_prefix))
+        else:
+            result = asyncio.run(replay(build_transport(args.transport), args.path, args.speed,
+                                        args.max_gap, args.topic_prefix))
+        print(json.dumps(result, indent=2, default=str))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    main_cli()
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+def as_utc(ts: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken to already be UTC."""
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+def utc_iso(ts: datetime) -> str:
+    """Naive-UTC ISO string, matching how SQLite hands timestamps back to the API."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.isoformat()
+
+class AgentRecord:
+    __slots__ = ("id", "node_id", "role", "operator", "version", "status", "last_seen", "parent_id")
+
+    def __init__(self, id: str, node_id: Optional[str], role: str = "unknown", operator: Optional[str] = None,
+                 version: Optional[str] = None, status: str = "unknown", last_seen: Optional[datetime] = None,
+                 parent_id: Optional[str] = None):
+        self.id = id
+        self.node_id = node_id
+        self.role = role
+        self.operator = operator
+        self.version = version
+        self.status = status
+        self.last_seen = last_seen or datetime.now(timezone.utc)
+        self.parent_id = parent_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "node_id": self.node_id,
+            "role": self.role,
+            "operator": self.operator,
+            "version": self.version,
+            "status": self.status,
+            "last_seen": utc_iso(self.last_seen),
+            "parent_id": self.parent_id,
+        }
+
+class NodeRecord:
+    __slots__ = ("id", "hostname", "os", "capabilities")
+
+    def __init__(self, id: str, hostname: str, os: str = "unknown", capabilities: str = "[]"):
+        self.id = id
+        self.hostname = hostname
+        self.os = os
+        self.capabilities = capabilities
+
+class AgentRegistry:
+    """Authoritative in-memory view of agents and nodes.
+
+    The presence monitor applies heartbeats here first; SQLite is written
+    behind it. Agents are indexed by id, node_id and parent_id, and the
+    serialized agent list is cached until the registry version changes.
+    """
+
+    def __init__(self):
+        self._agents: Dict[str, AgentRecord] = {}
+        self._nodes: Dict[str, NodeRecord] = {}
+        self._by_node: Dict[str, Set[str]] = {}
+        self._by_parent: Dict[str, Set[str]] = {}
+        self.version = 0
+        self._snapshot = b"[]"
+        self._snapshot_version = 0
+
+    def load(self, agents: Iterable[Any], nodes: Iterable[Any]):
+        """Seed the registry from persisted Agent/Node rows."""
+        for n in nodes:
+            self._nodes[n.id] = NodeRecord(n.id, n.hostname, n.os, n.capabilities)
+        for a in agents:
+            record = AgentRecord(a.id, a.node_id, a.role, a.operator, a.version, a.status, a.last_seen, a.parent_id)
+            self._agents[a.id] = record
+            self._index(record)
+        self.version += 1
+
+    def _index(self, record: AgentRecord):
+        if record.node_id is not None:
+            self._by_node.setdefault(record.node_id, set()).add(record.id)
+        if record.parent_id is not None:
+            self._by_parent.setdefault(record.parent_id, set()).add(record.id)
+
+    def _unindex(self, record: AgentRecord):
+        for index, key in ((self._by_node, record.node_id), (self._by_parent, record.parent_id)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(record.id)
+                if not ids:
+                    del index[key]
+
+    def apply_presence(self, record: Dict[str, Any]) -> AgentRecord:
+        """Apply a normalized presence record and return the updated agent."""
+        node_id = record["node_id"]
+        if node_id is not None and node_id not in self._nodes:
+            self._nodes[node_id] = NodeRecord(node_id, node_id, "unknown", record["capabilities"])
+
+        agent = self._agents.get(record["agent_id"])
+        if agent is None:
+            agent = AgentRecord(record["agent_id"], node_id)
+            self._agents[agent.id] = agent
+        else:
+            self._unindex(agent)
+        agent.node_id = node_id
+        agent.operator = record["operator"]
+        agent.version = record["version"]
+        agent.status = record["state"]
+        agent.last_seen = record["ts"]
+        agent.parent_id = record["parent_id"]
+        self._index(agent)
+        self.version += 1
+        return agent
+
+    def get(self, agent_id: str) -> Optional[AgentRecord]:
+        return self._agents.get(agent_id)
+
+    def get_node(self, node_id: str) -> Optional[NodeRecord]:
+        return self._nodes.get(node_id)
+
+    def agents_on_node(self, node_id: str) -> List[AgentRecord]:
+        return [self._agents[i] for i in self._by_node.get(node_id, ())]
+
+    def children(self, parent_id: str) -> List[AgentRecord]:
+        return [self._agents[i] for i in self._by_parent.get(parent_id, ())]
+
+    def snapshot_json(self) -> bytes:
+        """Serialized agent list, rebuilt only when the registry has changed."""
+        if self._snapshot_version != self.version:
+            self._snapshot = json.dumps([a.to_dict() for a in self._agents.values()]).encode()
+            self._snapshot_version = self.version
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return len(self._agents)
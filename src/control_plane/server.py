@@ -12,6 +12,7 @@ from typing import Optional
 from mcp.server.fastmcp import FastMCP
 from mqtt_handler import MQTTHandler
 from memory_gateway import MemoryGateway
+from message_filter import filter_stats
 
 # Setup logging
 logging.basicConfig(
@@ -25,9 +26,13 @@ MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
 MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 MQTT_USER = os.environ.get("MQTT_USER", "")
 MQTT_PASS = os.environ.get("MQTT_PASS", "")
+MQTT_TRANSPORT = os.environ.get("MQTT_TRANSPORT", "aiomqtt")  # "loopback" for an in-process broker
 
 # Initialize modular components
-mqtt = MQTTHandler(MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS)
+mqtt = MQTTHandler(
+    MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS,
+    transport=MQTT_TRANSPORT,
+)
 memory = MemoryGateway()
 
 # Initialize MCP server
@@ -41,6 +46,9 @@ async def wait_for_message(
     topic: Optional[str] = None,
     timeout: int = 3600,
     session_id: Optional[str] = None,
+    max_messages: int = 1,
+    linger_ms: int = 0,
+    filter: Optional[dict] = None,
     ctx=None
 ) -> dict:
     """
@@ -49,6 +57,14 @@ async def wait_for_message(
     This tool is designed to be called by a background sub-agent to enable
     cross-machine wake functionality. It sends progress notifications every
     30 seconds to keep the MCP connection alive.
+    
+    With max_messages > 1, everything arriving within linger_ms of the first
+    message (up to max_messages) is returned together in "messages".
+    
+    filter wakes the caller only for matching messages, e.g.
+    {"type_in": ["WAKE", "INTERRUPT"], "min_priority": "high",
+     "senders": ["control-plane"], "equals": {"content.reason": "deploy"}};
+    skipped messages are counted in "filtered".
     """
     target_topic = topic or mqtt.get_topic(session_id)
     logger.info(f"Starting wait_for_message on topic: {target_topic}")
@@ -57,7 +73,13 @@ async def wait_for_message(
         if ctx:
             await ctx.report_progress(tick, max_ticks, message)
             
-    return await mqtt.wait_for_message(target_topic, timeout=timeout, on_progress=on_progress)
+    try:
+        return await mqtt.wait_for_message(
+            target_topic, timeout=timeout, on_progress=on_progress,
+            max_messages=max_messages, linger_ms=linger_ms, filter=filter,
+        )
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid filter: {e}", "topic": target_topic}
 
 @mcp.tool()
 async def send_message(
@@ -78,13 +100,13 @@ async def send_message(
 @mcp.tool()
 async def learn_memory(text: str, agent_id: Optional[str] = None):
     """Save a semantic memory for the system or a specific agent."""
-    result = memory.learn(text, agent_id=agent_id)
+    result = await memory.alearn(text, agent_id=agent_id)
     return {"status": "success" if result else "error"}
 
 @mcp.tool()
 async def recall_memory(query: str, agent_id: Optional[str] = None):
     """Retrieve relevant memories based on a query."""
-    results = memory.recall(query, agent_id=agent_id)
+    results = await memory.arecall(query, agent_id=agent_id)
     return {"memories": results}
 
 @mcp.tool()
@@ -97,6 +119,7 @@ async def get_status() -> dict:
         "mqtt_broker": mqtt.broker,
         "mqtt_port": mqtt.port,
         "default_topic": mqtt.get_topic(),
+        "filters": filter_stats(),
     }
 
 if __name__ == "__main__":
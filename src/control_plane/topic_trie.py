@@ -0,0 +1,99 @@
+from typing import Any, Dict, Iterator, List, Tuple
+
+class _TrieNode:
+    __slots__ = ("children", "values", "filter")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.values: List[Any] = []
+        self.filter = ""
+
+class TopicTrie:
+    """Maps MQTT topic filters (with `+`/`#` wildcards) to registered values.
+
+    `match(topic)` walks the trie once per topic level instead of testing every
+    registered filter, so dispatch cost does not grow with the number of monitors.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._count: Dict[str, int] = {}
+
+    def add(self, topic_filter: str, value: Any):
+        node = self._root
+        for level in topic_filter.split("/"):
+            node = node.children.setdefault(level, _TrieNode())
+        node.filter = topic_filter
+        node.values.append(value)
+        self._count[topic_filter] = self._count.get(topic_filter, 0) + 1
+
+    def remove(self, topic_filter: str, value: Any) -> bool:
+        """Remove one registration. Returns True if the filter has no values left."""
+        path = [self._root]
+        for level in topic_filter.split("/"):
+            node = path[-1].children.get(level)
+            if node is None:
+                return topic_filter not in self._count
+            path.append(node)
+        try:
+            path[-1].values.remove(value)
+        except ValueError:
+            return topic_filter not in self._count
+        self._count[topic_filter] -= 1
+        if self._count[topic_filter] == 0:
+            del self._count[topic_filter]
+        # Prune empty branches bottom-up
+        levels = topic_filter.split("/")
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.values or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+        return topic_filter not in self._count
+
+    def _match_nodes(self, topic: str) -> List[_TrieNode]:
+        levels = topic.split("/")
+        # Wildcards at the first level must not match $SYS-style topics.
+        skip_wildcards = topic.startswith("$")
+        matched: List[_TrieNode] = []
+        stack: List[Tuple[_TrieNode, int]] = [(self._root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            wildcards_ok = not (skip_wildcards and depth == 0)
+            if wildcards_ok:
+                multi = node.children.get("#")
+                if multi is not None and multi.values:
+                    matched.append(multi)
+            if depth == len(levels):
+                if node.values:
+                    matched.append(node)
+                continue
+            child = node.children.get(levels[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            if wildcards_ok:
+                single = node.children.get("+")
+                if single is not None:
+                    stack.append((single, depth + 1))
+        return matched
+
+    def match(self, topic: str) -> List[Any]:
+        """Return every value whose filter matches the concrete topic."""
+        return [value for node in self._match_nodes(topic) for value in node.values]
+
+    def match_by_filter(self, topic: str) -> List[Tuple[str, List[Any]]]:
+        """Like match(), grouped as (filter, values) for each matching filter."""
+        return [(node.filter, list(node.values)) for node in self._match_nodes(topic)]
+
+    def filters(self) -> List[str]:
+        """Registered topic filters, one entry per distinct filter."""
+        return list(self._count)
+
+    def __contains__(self, topic_filter: str) -> bool:
+        return topic_filter in self._count
+
+    def __len__(self) -> int:
+        return len(self._count)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._count)
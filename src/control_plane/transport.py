@@ -0,0 +1,195 @@
+"""
+MQTT transports for MQTTHandler and the load/benchmark tools.
+
+A transport hands out client objects with the subset of the aiomqtt.Client
+API the mesh uses: async context manager, publish(), subscribe(),
+unsubscribe() and the `messages` async iterator.
+
+- AiomqttTransport talks to a real broker (the Hostinger default).
+- LoopbackTransport talks to an in-process LoopbackBroker, so the control
+  plane, MCP servers and load generators can run together at full speed
+  with no network. Select it with MQTT_TRANSPORT=loopback.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+import aiomqtt
+
+from topic_trie import TopicTrie
+
+logger = logging.getLogger("bacon-mqtt-transport")
+
+class AiomqttTransport:
+    """Clients connected to a real MQTT broker."""
+
+    name = "aiomqtt"
+
+    def __init__(self, **connect_kwargs):
+        self.connect_kwargs = connect_kwargs
+
+    def client(self, **overrides) -> aiomqtt.Client:
+        return aiomqtt.Client(**{**self.connect_kwargs, **overrides})
+
+class LoopbackMessage:
+    __slots__ = ("topic", "payload", "qos", "retain")
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+def _encode_payload(payload: Any) -> bytes:
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if isinstance(payload, (int, float)):
+        return str(payload).encode("ascii")
+    raise TypeError(f"Unsupported payload type: {type(payload).__name__}")
+
+class LoopbackBroker:
+    """In-process MQTT broker: wildcard subscriptions, QoS 0/1 and retained messages.
+
+    Subscriptions live in a TopicTrie. A QoS1 publish returns only after the
+    message is queued to every matching subscriber, which is the point where
+    a real broker would send PUBACK. Each client gets a message once even if
+    several of its filters match, at the highest granted QoS.
+    """
+
+    def __init__(self):
+        self._subscriptions = TopicTrie()
+        self._retained: Dict[str, LoopbackMessage] = {}
+        self.stats = {"connects": 0, "published": 0, "delivered": 0, "acks": 0}
+
+    def subscribe(self, client: "LoopbackClient", topic_filter: str, qos: int):
+        self._subscriptions.remove(topic_filter, (client, 0))
+        self._subscriptions.remove(topic_filter, (client, 1))
+        self._subscriptions.add(topic_filter, (client, min(qos, 1)))
+        # Retained messages are delivered on every (re)subscribe, per MQTT.
+        matcher = TopicTrie()
+        matcher.add(topic_filter, True)
+        for topic, message in self._retained.items():
+            if matcher.match(topic):
+                client._deliver(LoopbackMessage(topic, message.payload, min(qos, message.qos), True))
+
+    def unsubscribe(self, client: "LoopbackClient", topic_filter: str):
+        self._subscriptions.remove(topic_filter, (client, 0))
+        self._subscriptions.remove(topic_filter, (client, 1))
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        if "+" in topic or "#" in topic:
+            raise ValueError(f"Cannot publish to a wildcard topic: {topic}")
+        self.stats["published"] += 1
+        if retain:
+            # An empty retained payload clears the retained message.
+            if payload:
+                self._retained[topic] = LoopbackMessage(topic, payload, qos, True)
+            else:
+                self._retained.pop(topic, None)
+
+        granted: Dict[LoopbackClient, int] = {}
+        for client, sub_qos in self._subscriptions.match(topic):
+            granted[client] = max(granted.get(client, 0), sub_qos)
+        for client, sub_qos in granted.items():
+            client._deliver(LoopbackMessage(topic, payload, min(qos, sub_qos), False))
+        self.stats["delivered"] += len(granted)
+        if qos > 0:
+            self.stats["acks"] += 1
+
+    def retained(self) -> List[str]:
+        return list(self._retained)
+
+class _MessageIterator:
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> LoopbackMessage:
+        return await self._queue.get()
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+class LoopbackClient:
+    """Drop-in for aiomqtt.Client against a LoopbackBroker."""
+
+    def __init__(self, broker: LoopbackBroker, identifier: Optional[str] = None, **_ignored):
+        self.broker = broker
+        self.identifier = identifier
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._filters: Set[str] = set()
+        self._connected = False
+        self.messages = _MessageIterator(self._queue)
+
+    async def __aenter__(self) -> "LoopbackClient":
+        self._connected = True
+        self.broker.stats["connects"] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for topic_filter in list(self._filters):
+            self.broker.unsubscribe(self, topic_filter)
+        self._filters.clear()
+        self._connected = False
+
+    def _check(self):
+        if not self._connected:
+            raise aiomqtt.MqttError("Loopback client is not connected")
+
+    def _deliver(self, message: LoopbackMessage):
+        self._queue.put_nowait(message)
+
+    async def publish(self, topic: str, payload: Any = None, qos: int = 0, retain: bool = False, **_kwargs):
+        self._check()
+        self.broker.publish(topic, _encode_payload(payload), qos, retain)
+        # Yield like a network round trip would, so publishers cannot starve subscribers.
+        await asyncio.sleep(0)
+
+    async def subscribe(self, topic: Union[str, List[Tuple[str, int]]], qos: int = 0, **_kwargs):
+        self._check()
+        pairs = [(topic, qos)] if isinstance(topic, str) else topic
+        for topic_filter, filter_qos in pairs:
+            self._filters.add(topic_filter)
+            self.broker.subscribe(self, topic_filter, filter_qos)
+
+    async def unsubscribe(self, topic: Union[str, List[str]], **_kwargs):
+        self._check()
+        for topic_filter in [topic] if isinstance(topic, str) else topic:
+            self._filters.discard(topic_filter)
+            self.broker.unsubscribe(self, topic_filter)
+
+_default_broker: Optional[LoopbackBroker] = None
+
+def loopback_broker() -> LoopbackBroker:
+    """The process-wide broker shared by every LoopbackTransport by default."""
+    global _default_broker
+    if _default_broker is None:
+        _default_broker = LoopbackBroker()
+    return _default_broker
+
+class LoopbackTransport:
+    """Clients connected to an in-process LoopbackBroker."""
+
+    name = "loopback"
+
+    def __init__(self, broker: Optional[LoopbackBroker] = None):
+        self.broker = broker or loopback_broker()
+
+    def client(self, **kwargs) -> LoopbackClient:
+        return LoopbackClient(self.broker, **kwargs)
+
+def make_transport(kind: str, **connect_kwargs):
+    """Build the transport named by MQTT_TRANSPORT ("aiomqtt" or "loopback")."""
+    if kind == "loopback":
+        logger.info("Using in-process loopback MQTT transport")
+        return LoopbackTransport()
+    if kind not in ("aiomqtt", "mqtt", ""):
+        raise ValueError(f"Unknown MQTT transport: {kind}")
+    return AiomqttTransport(**connect_kwargs)
@@ -0,0 +1,54 @@
+"""Copy message_filter.py into the MCP server packages.
+
+bacon_mqtt_mcp and stay_awake_mcp are installed on their own, without the
+control plane, so each ships a generated copy of message_filter.py. Edit
+this directory's message_filter.py, then rerun:
+
+    python vendor_filters.py           # rewrite the copies
+    python vendor_filters.py --check   # exit 1 if a copy is out of date
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, "message_filter.py")
+TARGETS = [
+    os.path.join(HERE, "wake-test", "bacon_mqtt_mcp", "message_filter.py"),
+    os.path.join(HERE, "..", "stay_awake_mcp", "message_filter.py"),
+]
+HEADER = (
+    "# GENERATED FILE - do not edit.\n"
+    "# Copied from src/control_plane/message_filter.py by src/control_plane/vendor_filters.py.\n"
+)
+
+def render() -> str:
+    with open(SOURCE) as f:
+        return HEADER + f.read()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Vendor message_filter.py into the MCP servers.")
+    parser.add_argument("--check", action="store_true", help="only report copies that are out of date")
+    args = parser.parse_args(argv)
+
+    text = render()
+    stale = []
+    for target in TARGETS:
+        try:
+            with open(target) as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current == text:
+            continue
+        stale.append(os.path.relpath(target, HERE))
+        if not args.check:
+            with open(target, "w") as f:
+                f.write(text)
+
+    for path in stale:
+        print(f"{'stale' if args.check else 'wrote'}: {path}")
+    return 1 if args.check and stale else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
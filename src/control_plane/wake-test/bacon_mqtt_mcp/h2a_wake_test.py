@@ -22,17 +22,21 @@ Usage:
     
     # Full automated test (runs both with timing)
     python h2a_wake_test.py --role orchestrator --wait-time 300
+
+    # Headless latency benchmark: 200 concurrent sender/listener pairs
+    python h2a_wake_test.py --role bench --pairs 200 --rounds 5 --loopback
 """
 
 import argparse
 import asyncio
 import json
 import os
+import random
 import subprocess
 import sys
 import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional
 
 # Configuration
 MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
@@ -427,6 +431,156 @@ Now begin by spawning the listener agent.
 """
 
 
+# =============================================================================
+# Headless Wake Latency Benchmark
+# =============================================================================
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    """Nearest-rank p50/p95/p99 and max, in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    result = {}
+    for p in (50, 95, 99):
+        rank = max(0, -(-p * len(ordered) // 100) - 1)
+        result[f"p{p}"] = round(ordered[min(rank, len(ordered) - 1)] * 1000, 3)
+    result["max"] = round(ordered[-1] * 1000, 3)
+    return result
+
+
+async def run_wake_benchmark(pairs: int, rounds: int, loopback: bool,
+                             wait_time: int = 60, spread: float = 0.0) -> dict:
+    """
+    Measure send->wake latency for many concurrent sender/listener pairs.
+
+    Each round starts `pairs` wait_for_message calls on distinct sessions.
+    Once every listener is subscribed, each sender calls send_message
+    (after a random delay of up to `spread` seconds). Per pair we record:
+
+    - setup: wait_for_message call -> its subscription is in place
+    - send: send_message call duration (connect + publish)
+    - wake: send_message call -> wait_for_message returned
+    - total: wait_for_message call -> returned, minus the time parked idle
+
+    With --loopback both sides run against the control plane's in-process
+    broker, so hundreds of concurrent waiters can be measured
+    without a network.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # Benchmark sessions are throwaway; keep them out of the durable inbox.
+    os.environ.setdefault("BACON_INBOX_DB", ":memory:")
+    import server
+
+    if loopback:
+        sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+        from transport import LoopbackTransport
+        base_factory = LoopbackTransport().client
+    else:
+        import aiomqtt
+
+        def base_factory(**kwargs):
+            return aiomqtt.Client(
+                hostname=server.MQTT_BROKER,
+                port=server.MQTT_PORT,
+                username=server.MQTT_USERNAME or None,
+                password=server.MQTT_PASSWORD or None,
+                **kwargs
+            )
+
+    subscribed: Dict[str, asyncio.Event] = {}
+    subscribed_at: Dict[str, float] = {}
+
+    def timed_factory(**kwargs):
+        """Wrap each client so the benchmark sees when its subscription lands."""
+        client = base_factory(**kwargs)
+        subscribe = client.subscribe
+
+        async def timed_subscribe(topic, *args, **kw):
+            await subscribe(topic, *args, **kw)
+            subscribed_at[topic] = time.perf_counter()
+            if topic in subscribed:
+                subscribed[topic].set()
+
+        client.subscribe = timed_subscribe
+        return client
+
+    previous_factory = server.CLIENT_FACTORY
+    server.CLIENT_FACTORY = timed_factory
+    logging_level = server.logger.level
+    server.logger.setLevel("WARNING")
+
+    samples: Dict[str, List[float]] = {"setup": [], "send": [], "wake": [], "total": []}
+    received = timeouts = errors = 0
+    run_id = f"{os.getpid()}-{int(time.time())}"
+
+    async def pair(round_no: int, index: int, all_subscribed: asyncio.Event):
+        nonlocal received, timeouts, errors
+        session_id = f"wake-bench-{run_id}-{round_no}-{index}"
+        topic = server.get_topic(session_id)
+        subscribed[topic] = asyncio.Event()
+
+        called = time.perf_counter()
+        listener = asyncio.create_task(server.wait_for_message(session_id=session_id, timeout=wait_time))
+        try:
+            await asyncio.wait_for(subscribed[topic].wait(), timeout=wait_time)
+        except asyncio.TimeoutError:
+            errors += 1
+            listener.cancel()
+            return
+        await all_subscribed.wait()
+        if spread:
+            await asyncio.sleep(random.uniform(0, spread))
+
+        sent = time.perf_counter()
+        result = await server.send_message(message=f"WAKE {index}", target_session=session_id, message_type="wake")
+        send_done = time.perf_counter()
+        outcome = await listener
+        woke = time.perf_counter()
+
+        if result["status"] != "sent":
+            errors += 1
+        elif outcome["status"] == "received":
+            received += 1
+            samples["setup"].append(subscribed_at[topic] - called)
+            samples["send"].append(send_done - sent)
+            samples["wake"].append(woke - sent)
+            samples["total"].append((subscribed_at[topic] - called) + (woke - sent))
+        else:
+            timeouts += 1
+
+    log(f"Wake benchmark: {pairs} pairs x {rounds} rounds via {'loopback' if loopback else MQTT_BROKER}", "info")
+    started = time.perf_counter()
+    try:
+        for round_no in range(rounds):
+            all_subscribed = asyncio.Event()
+            tasks = [asyncio.create_task(pair(round_no, i, all_subscribed)) for i in range(pairs)]
+            round_topics = [server.get_topic(f"wake-bench-{run_id}-{round_no}-{i}") for i in range(pairs)]
+            await asyncio.sleep(0)
+            await asyncio.wait(
+                [asyncio.create_task(subscribed[t].wait()) for t in round_topics if t in subscribed],
+                timeout=wait_time
+            )
+            all_subscribed.set()
+            await asyncio.gather(*tasks)
+            log(f"Round {round_no + 1}/{rounds}: {received} woken so far", "progress")
+    finally:
+        server.CLIENT_FACTORY = previous_factory
+        server.logger.setLevel(logging_level)
+
+    return {
+        "status": "complete",
+        "transport": "loopback" if loopback else f"{MQTT_BROKER}:{MQTT_PORT}",
+        "pairs": pairs,
+        "rounds": rounds,
+        "received": received,
+        "timeouts": timeouts,
+        "errors": errors,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "latency_ms": {name: _percentiles(values) for name, values in samples.items()},
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
 # =============================================================================
 # Main
 # =============================================================================
@@ -451,12 +605,15 @@ Examples:
   
   # Generate Claude Code prompt
   python h2a_wake_test.py --role prompt --session-id zbook --wait-time 300
+
+  # Headless wake latency benchmark against the in-process broker
+  python h2a_wake_test.py --role bench --pairs 200 --rounds 5 --loopback
 """
     )
     
     parser.add_argument(
         "--role", 
-        choices=["listener", "sender", "orchestrator", "interactive", "prompt"],
+        choices=["listener", "sender", "orchestrator", "interactive", "prompt", "bench"],
         required=True,
         help="Role to play in the test"
     )
@@ -487,6 +644,29 @@ Examples:
         default=None,
         help="Custom wake message"
     )
+    parser.add_argument(
+        "--pairs",
+        type=int,
+        default=100,
+        help="Bench: concurrent sender/listener pairs per round (default: 100)"
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=3,
+        help="Bench: number of rounds (default: 3)"
+    )
+    parser.add_argument(
+        "--spread",
+        type=float,
+        default=0.0,
+        help="Bench: spread sends randomly over this many seconds (default: 0)"
+    )
+    parser.add_argument(
+        "--loopback",
+        action="store_true",
+        help="Bench: use the control plane's in-process MQTT broker"
+    )
     
     args = parser.parse_args()
     
@@ -518,6 +698,13 @@ Examples:
         result = await run_orchestrator(args.wait_time)
         print(f"\nResult: {json.dumps(result, indent=2)}")
         
+    elif args.role == "bench":
+        result = await run_wake_benchmark(
+            args.pairs, args.rounds, args.loopback,
+            wait_time=min(args.wait_time, 120), spread=args.spread
+        )
+        print(f"\nResult: {json.dumps(result, indent=2)}")
+        
     elif args.role == "interactive":
         await run_interactive_test()
         
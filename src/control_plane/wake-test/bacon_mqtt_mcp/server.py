@@ -6,6 +6,7 @@ by leveraging MQTT as the message transport and MCP's progress notification
 mechanism to keep long-running blocking calls alive.
 
 Architecture:
+  - One persistent MQTT subscription buffers each topic's messages locally
   - A background sub-agent calls wait_for_message() which blocks
   - Progress notifications every 30s prevent timeout
   - When a message arrives, the tool returns
@@ -20,11 +21,22 @@ import json
 import logging
 import os
 import socket
+import sqlite3
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Optional
+from itertools import islice
+from typing import Any, Callable, Optional
 
 from mcp.server.fastmcp import FastMCP
 
+try:
+    from .message_filter import compile_filter, filter_stats
+except ImportError:
+    # Imported as a plain module (python server.py, h2a_wake_test.py).
+    from message_filter import compile_filter, filter_stats
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,15 +49,44 @@ MQTT_BROKER = os.environ.get("MQTT_BROKER", "srv906866.hstgr.cloud")
 MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
 MQTT_USERNAME = os.environ.get("MQTT_USERNAME", "")
 MQTT_PASSWORD = os.environ.get("MQTT_PASSWORD", "")
+# Messages kept per subscribed topic until read (oldest dropped when full)
+INBOX_SIZE = int(os.environ.get("BACON_INBOX_SIZE", "1000"))
 
 # Get hostname for default topic construction
 HOSTNAME = socket.gethostname().lower().replace(".", "-")
 
-# Initialize MCP server
-mcp = FastMCP(
-    name="bacon-mqtt",
-    instructions="Cross-machine Claude wake system using MQTT messaging",
-)
+# Durable inbox: the SQLite file holding unacknowledged messages, and the
+# fixed client id of the persistent MQTT session that fills it. Only one
+# server per client id should run at a time. ":memory:" disables durability.
+INBOX_DB = os.environ.get("BACON_INBOX_DB", os.path.join(os.path.expanduser("~"), ".bacon", "mqtt-inbox.db"))
+MQTT_CLIENT_ID = os.environ.get("BACON_MQTT_CLIENT_ID", f"bacon-mqtt-mcp-{HOSTNAME}")
+# Topics no tool has touched for this many seconds are unsubscribed and
+# their stored messages deleted (0 keeps them forever).
+INBOX_IDLE_TTL = float(os.environ.get("BACON_INBOX_IDLE_TTL", str(7 * 24 * 3600)))
+
+# Replaces aiomqtt.Client when set: test_inbox.py and h2a_wake_test.py's
+# bench role hand in control_plane/transport.py's loopback client.
+CLIENT_FACTORY: Optional[Callable[..., Any]] = None
+
+
+def mqtt_client(**kwargs):
+    """Create an MQTT client for the configured broker."""
+    if CLIENT_FACTORY is not None:
+        return CLIENT_FACTORY(**kwargs)
+
+    try:
+        import aiomqtt
+    except ImportError:
+        raise RuntimeError("aiomqtt not installed. Run: pip install aiomqtt") from None
+    connect_kwargs = {
+        "hostname": MQTT_BROKER,
+        "port": MQTT_PORT,
+    }
+    if MQTT_USERNAME:
+        connect_kwargs["username"] = MQTT_USERNAME
+    if MQTT_PASSWORD:
+        connect_kwargs["password"] = MQTT_PASSWORD
+    return aiomqtt.Client(**connect_kwargs, **kwargs)
 
 
 def get_topic(session_id: Optional[str] = None) -> str:
@@ -54,11 +95,483 @@ def get_topic(session_id: Optional[str] = None) -> str:
     return f"bacon/claude/{target}/inbox"
 
 
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT topic filter matching with + and # wildcards."""
+    if topic_filter == topic:
+        return True
+    filter_parts = topic_filter.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class InboxStore:
+    """SQLite-backed append-only log per consumer, with committed offsets.
+
+    Each TopicBuffer is a consumer (a topic filter, optionally with a
+    wake filter): its messages are appended under its name and deleted
+    once committed. After a restart, the subscriptions and every
+    unacknowledged message are reloaded from one indexed read instead of
+    waiting for senders to resend. A consumer
+    lives until it is forgotten (explicitly or when idle too long).
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.durable = path != ":memory:"
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS inbox_consumer ("
+                " consumer TEXT PRIMARY KEY,"
+                " committed INTEGER NOT NULL DEFAULT 0,"
+                " last_used REAL NOT NULL DEFAULT 0,"
+                " topic TEXT,"
+                " filter TEXT)"
+            )
+            # Files from before idle expiry and filtered consumers: every
+            # consumer counts as used now and is its own unfiltered topic.
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(inbox_consumer)")]
+            if "last_used" not in columns:
+                self.conn.execute("ALTER TABLE inbox_consumer ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+                self.conn.execute("UPDATE inbox_consumer SET last_used = ?", (time.time(),))
+            if "topic" not in columns:
+                self.conn.execute("ALTER TABLE inbox_consumer ADD COLUMN topic TEXT")
+                self.conn.execute("ALTER TABLE inbox_consumer ADD COLUMN filter TEXT")
+                self.conn.execute("UPDATE inbox_consumer SET topic = consumer")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS inbox_message ("
+                " consumer TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " received_at TEXT NOT NULL,"
+                " PRIMARY KEY (consumer, seq)) WITHOUT ROWID"
+            )
+
+    def consumers(self) -> list[tuple[str, Optional[dict]]]:
+        """(topic, filter spec) of every stored consumer."""
+        return [
+            (topic, json.loads(spec) if spec else None)
+            for topic, spec in self.conn.execute("SELECT topic, filter FROM inbox_consumer")
+        ]
+
+    def load(self, consumer: str, topic: Optional[str] = None,
+             spec: Optional[dict] = None) -> tuple[int, float, list[dict]]:
+        """(committed offset, last used, unacknowledged messages) for a consumer, registering it if new."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO inbox_consumer (consumer, last_used, topic, filter) VALUES (?, ?, ?, ?)",
+                (consumer, time.time(), topic or consumer, json.dumps(spec, sort_keys=True) if spec else None)
+            )
+        committed, last_used = self.conn.execute(
+            "SELECT committed, last_used FROM inbox_consumer WHERE consumer = ?", (consumer,)
+        ).fetchone()
+        rows = self.conn.execute(
+            "SELECT seq, topic, payload, received_at FROM inbox_message"
+            " WHERE consumer = ? AND seq > ? ORDER BY seq", (consumer, committed)
+        ).fetchall()
+        return committed, last_used, [
+            {"seq": seq, "topic": topic, "message": json.loads(payload), "received_at": received_at}
+            for seq, topic, payload, received_at in rows
+        ]
+
+    def append(self, consumer: str, entry: dict):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO inbox_message (consumer, seq, topic, payload, received_at) VALUES (?, ?, ?, ?, ?)",
+                (consumer, entry["seq"], entry["topic"], json.dumps(entry["message"]), entry["received_at"])
+            )
+
+    def delete(self, consumer: str, seq: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM inbox_message WHERE consumer = ? AND seq = ?", (consumer, seq))
+
+    def commit(self, consumer: str, seq: int):
+        with self.conn:
+            self.conn.execute("UPDATE inbox_consumer SET committed = ? WHERE consumer = ?", (seq, consumer))
+            self.conn.execute("DELETE FROM inbox_message WHERE consumer = ? AND seq <= ?", (consumer, seq))
+
+    def touch(self, consumer: str, when: float):
+        with self.conn:
+            self.conn.execute("UPDATE inbox_consumer SET last_used = ? WHERE consumer = ?", (when, consumer))
+
+    def forget(self, consumer: str):
+        """Drop a consumer with its offset and every stored message."""
+        with self.conn:
+            self.conn.execute("DELETE FROM inbox_message WHERE consumer = ?", (consumer,))
+            self.conn.execute("DELETE FROM inbox_consumer WHERE consumer = ?", (consumer,))
+
+    def close(self):
+        self.conn.close()
+
+
+def consumer_name(topic: str, spec: Optional[dict] = None) -> str:
+    """Buffer and store key: the topic, plus the wake filter of a filtered consumer."""
+    return f"{topic} {json.dumps(spec, sort_keys=True)}" if spec else topic
+
+
+class TopicBuffer:
+    """Messages received on one topic filter, in arrival order.
+
+    With a wake filter spec the buffer is a separate consumer of the
+    topic that only keeps matching messages (the rest are counted in
+    `filtered`); unfiltered buffers of the same topic still get every
+    message. Each message gets a sequence number. `delivered` is the last
+    one handed to a reader and `committed` the last one acknowledged; committed
+    messages are removed, so with auto-ack a read is a popleft per message.
+    With a store, appends and commits are written through to disk and
+    unacknowledged messages are delivered again after a restart.
+    """
+
+    def __init__(self, topic: str, maxlen: int, store: Optional[InboxStore] = None,
+                 spec: Optional[dict] = None):
+        self.topic = topic
+        self.spec = spec or None
+        self.name = consumer_name(topic, self.spec)
+        self.matches = compile_filter(self.spec)
+        self.maxlen = maxlen
+        self.store = store
+        self.entries: deque = deque()
+        self.last_seq = 0
+        self.delivered = 0
+        self.committed = 0
+        self.received = 0
+        self.dropped = 0
+        self.filtered = 0
+        self.last_used = time.time()
+        self._arrived = asyncio.Event()
+        if store is not None:
+            self.committed, self.last_used, restored = store.load(self.name, topic, self.spec)
+            self.entries.extend(restored[-maxlen:])
+            self.last_seq = restored[-1]["seq"] if restored else self.committed
+            self.delivered = self.committed
+
+    def append(self, message: dict):
+        if self.matches is not None and not self.matches(message["message"]):
+            self.filtered += 1
+            return
+        if len(self.entries) >= self.maxlen:
+            oldest = self.entries.popleft()
+            self.dropped += 1
+            if self.store is not None:
+                self.store.delete(self.name, oldest["seq"])
+        self.last_seq += 1
+        entry = {"seq": self.last_seq, **message}
+        self.entries.append(entry)
+        if self.store is not None:
+            self.store.append(self.name, entry)
+        self.received += 1
+        self._arrived.set()
+
+    def touch(self):
+        """Mark the buffer as in use, postponing idle expiry."""
+        self.last_used = time.time()
+        if self.store is not None:
+            self.store.touch(self.name, self.last_used)
+
+    def unread(self) -> int:
+        first = self.entries[0]["seq"] if self.entries else self.last_seq + 1
+        return self.last_seq - max(self.delivered, first - 1)
+
+    def read(self, max_messages: int = 1, peek: bool = False, auto_ack: bool = True) -> list[dict]:
+        """Up to `max_messages` unread messages, oldest first.
+
+        peek leaves both cursors alone; otherwise the delivery cursor moves
+        past the returned messages, and auto_ack also commits them.
+        """
+        if not self.entries:
+            return []
+        start = max(0, self.delivered + 1 - self.entries[0]["seq"])
+        batch = list(islice(self.entries, start, start + max(0, max_messages)))
+        if batch and not peek:
+            self.delivered = batch[-1]["seq"]
+            if auto_ack:
+                self.commit(self.delivered)
+        return batch
+
+    def commit(self, seq: Optional[int] = None) -> int:
+        """Acknowledge delivered messages up to `seq` (default: all delivered)."""
+        seq = self.delivered if seq is None else min(seq, self.delivered)
+        if seq <= self.committed:
+            return self.committed
+        while self.entries and self.entries[0]["seq"] <= seq:
+            self.entries.popleft()
+        self.committed = seq
+        if self.store is not None:
+            self.store.commit(self.name, seq)
+        return self.committed
+
+    def rewind(self):
+        """Deliver unacknowledged messages again."""
+        self.delivered = self.committed
+
+    async def wait(self):
+        """Return once there is an unread message."""
+        while not self.unread():
+            self._arrived.clear()
+            await self._arrived.wait()
+
+    def stats(self) -> dict:
+        return {
+            "topic": self.topic,
+            "filter": self.spec,
+            "filtered": self.filtered,
+            "pending": self.unread(),
+            "buffered": len(self.entries),
+            "received": self.received,
+            "dropped": self.dropped,
+            "delivered": self.delivered,
+            "committed": self.committed,
+            "idle_seconds": int(time.time() - self.last_used),
+        }
+
+
+class Inbox:
+    """One background MQTT connection feeding a TopicBuffer per topic.
+
+    A topic is subscribed the first time a tool asks for it and stays
+    subscribed, so nothing sent between tool calls is missed and calls
+    never pay for connect + subscribe. The connection is re-established
+    (and every topic resubscribed) with backoff if it drops.
+
+    With a store, the connection is a persistent session (fixed client id,
+    clean_session off) so the broker queues QoS 1 messages while the
+    server is down, and the topics and unacknowledged messages of the
+    previous run are restored at startup.
+
+    A topic stays subscribed until `forget` is called or, with idle_ttl,
+    until no tool has used it for that many seconds. Pinned topics never
+    expire. Buffers are keyed by consumer_name: a topic has one unfiltered
+    buffer plus one per wake filter asked for, all fed by one subscription.
+    """
+
+    def __init__(self, maxlen: int = 1000, store: Optional[InboxStore] = None, idle_ttl: float = 0.0):
+        self.maxlen = maxlen
+        self.idle_ttl = idle_ttl
+        self.store: Optional[InboxStore] = None
+        self.buffers: dict[str, TopicBuffer] = {}
+        self.pinned: set[str] = set()
+        self.connected = False
+        self.last_error: Optional[str] = None
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+        # Forgotten topics still to be unsubscribed (the broker session keeps them otherwise).
+        self._stale: set[str] = set()
+        if store is not None:
+            self.open(store)
+
+    def open(self, store: InboxStore, pinned: tuple[str, ...] = ()):
+        """Attach a store and restore its topics; call before the inbox is first used."""
+        self.store = store
+        self.pinned.update(pinned)
+        for topic, spec in store.consumers():
+            name = consumer_name(topic, spec)
+            if name in self.buffers:
+                continue
+            try:
+                self.buffers[name] = TopicBuffer(topic, self.maxlen, store, spec)
+            except ValueError as e:
+                logger.error(f"Dropping stored consumer {name}: {e}")
+                store.forget(name)
+        self.expire()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def subscribed(self, topic: str) -> bool:
+        return any(buf.topic == topic for buf in self.buffers.values())
+
+    async def buffer(self, topic: str, spec: Optional[dict] = None) -> TopicBuffer:
+        """The buffer for `topic` (and wake filter), subscribing to the topic first if needed."""
+        self.start()
+        self.expire()
+        await self._unsubscribe_stale()
+        name = consumer_name(topic, spec)
+        buf = self.buffers.get(name)
+        if buf is None:
+            subscribed = self.subscribed(topic)
+            buf = TopicBuffer(topic, self.maxlen, self.store, spec)
+            self._seed(buf)
+            self.buffers[name] = buf
+            self._stale.discard(topic)
+            # Not connected yet: the subscriber picks it up when it connects.
+            if not subscribed and self._client is not None:
+                try:
+                    await self._client.subscribe(topic, qos=1)
+                except Exception:
+                    # Unregistered again so the next call retries the subscribe.
+                    self.buffers.pop(name, None)
+                    if self.store is not None:
+                        self.store.forget(name)
+                    raise
+                logger.info(f"Subscribed to {topic}")
+        buf.touch()
+        return buf
+
+    def _seed(self, buf: TopicBuffer):
+        """Start a new filtered consumer from what the topic's unfiltered buffer has not handed out."""
+        source = self.buffers.get(buf.topic)
+        if buf.spec is None or source is None:
+            return
+        for entry in source.read(source.maxlen, peek=True):
+            buf.append({key: entry[key] for key in ("topic", "message", "received_at")})
+
+    def _drop(self, name: str) -> bool:
+        buf = self.buffers.pop(name, None)
+        if buf is None:
+            return False
+        if self.store is not None:
+            self.store.forget(name)
+        if not self.subscribed(buf.topic):
+            self._stale.add(buf.topic)
+        return True
+
+    async def forget(self, topic: str) -> bool:
+        """Unsubscribe from a topic and delete the buffered messages and offsets of all its consumers."""
+        names = [name for name, buf in self.buffers.items() if buf.topic == topic]
+        for name in names:
+            self._drop(name)
+        await self._unsubscribe_stale()
+        return bool(names)
+
+    def expire(self) -> list[str]:
+        """Forget unpinned consumers idle for longer than idle_ttl."""
+        if self.idle_ttl <= 0:
+            return []
+        cutoff = time.time() - self.idle_ttl
+        idle = [name for name, buf in self.buffers.items() if buf.last_used < cutoff and name not in self.pinned]
+        for name in idle:
+            self._drop(name)
+            logger.info(f"Forgot idle consumer {name}")
+        return idle
+
+    async def _unsubscribe_stale(self):
+        client = self._client
+        if client is None or not self._stale:
+            return
+        topics = sorted(self._stale)
+        try:
+            await client.unsubscribe(topics)
+        except Exception as e:
+            # Retried on the next call or reconnect.
+            logger.warning(f"Unsubscribe from {', '.join(topics)} failed: {e}")
+            return
+        self._stale.difference_update(topics)
+        logger.info(f"Unsubscribed from {', '.join(topics)}")
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                durable = self.store is not None and self.store.durable
+                session = {"identifier": MQTT_CLIENT_ID, "clean_session": False} if durable else {}
+                async with mqtt_client(**session) as client:
+                    self._client = client
+                    for topic in sorted({buf.topic for buf in self.buffers.values()}):
+                        await client.subscribe(topic, qos=1)
+                        logger.info(f"Subscribed to {topic}")
+                    await self._unsubscribe_stale()
+                    self.connected = True
+                    backoff = 1.0
+                    async for msg in client.messages:
+                        self._dispatch(msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"MQTT inbox error: {e}; reconnecting in {backoff:.0f}s")
+            finally:
+                self._client = None
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _dispatch(self, msg):
+        topic = str(msg.topic)
+        try:
+            payload = msg.payload.decode('utf-8')
+            try:
+                payload = json.loads(payload)
+            except json.JSONDecodeError:
+                pass
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
+            return
+        message = {
+            "topic": topic,
+            "message": payload,
+            "received_at": datetime.now(timezone.utc).isoformat(),
+        }
+        for buf in self.buffers.values():
+            if topic_matches(buf.topic, topic):
+                buf.append(message)
+        logger.debug(f"Message received on {topic}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+            self.buffers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "last_error": self.last_error,
+            "store": self.store.path if self.store else None,
+            "idle_ttl_s": self.idle_ttl,
+            "topics": {topic: buf.stats() for topic, buf in self.buffers.items()},
+        }
+
+
+inbox = Inbox(INBOX_SIZE, idle_ttl=INBOX_IDLE_TTL)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # The store is opened here, not at import, so importing the package
+    # creates no files. This host's own inbox never expires.
+    inbox.open(InboxStore(INBOX_DB), pinned=(get_topic(),))
+    # Subscribe to this host's inbox as soon as the server starts.
+    await inbox.buffer(get_topic())
+    try:
+        yield {}
+    finally:
+        await inbox.close()
+
+
+# Initialize MCP server
+mcp = FastMCP(
+    name="bacon-mqtt",
+    instructions="Cross-machine Claude wake system using MQTT messaging",
+    lifespan=lifespan,
+)
+
+
 @mcp.tool()
 async def wait_for_message(
     topic: Optional[str] = None,
     timeout: int = 3600,
     session_id: Optional[str] = None,
+    max_messages: int = 1,
+    linger_ms: int = 0,
+    filter: Optional[dict] = None,
 ) -> dict:
     """
     Block until a message arrives on the specified MQTT topic.
@@ -67,11 +580,27 @@ async def wait_for_message(
     cross-machine wake functionality. It sends progress notifications every
     30 seconds to keep the MCP connection alive.
     
+    Messages come from the server's persistent inbox subscription: one that
+    arrived since the last call is returned immediately.
+    
+    Batched mode (max_messages > 1) returns every message already buffered
+    plus any arriving within linger_ms of the first, up to max_messages,
+    so a burst wakes the caller once instead of once per message.
+    
+    filter wakes the caller only for matching messages. Each distinct filter
+    reads the topic as its own consumer, so skipped messages stay pending
+    for plain check_messages / wait_for_message callers, e.g.
+    {"type_in": ["WAKE", "INTERRUPT"], "min_priority": "high",
+     "senders": ["control-plane"], "equals": {"content.reason": "deploy"}}
+    
     Args:
         topic: Full MQTT topic to subscribe to. If not provided, uses
                bacon/claude/{session_id}/inbox or bacon/claude/{hostname}/inbox
         timeout: Maximum seconds to wait (default: 3600 = 1 hour)
         session_id: Session identifier for topic construction
+        max_messages: Most messages to return in one call (default: 1)
+        linger_ms: After the first message, wait this long for more (default: 0)
+        filter: Only wake for messages matching this spec (default: every message)
     
     Returns:
         dict with keys:
@@ -80,64 +609,83 @@ async def wait_for_message(
             - topic: The topic that was subscribed to
             - elapsed_seconds: How long we waited
             - timestamp: When the message was received
+            - messages: Every message returned, as {seq, topic, message, received_at}
+            - count: len(messages)
+            - filtered: Messages that arrived during this call and failed the filter
+            - pending: Messages still buffered on the topic (if status="received")
     """
+    # Determine topic
+    subscribe_topic = topic or get_topic(session_id)
+    logger.info(f"Starting wait_for_message on topic: {subscribe_topic}")
+    start_time = asyncio.get_event_loop().time()
+
     try:
-        import aiomqtt
-    except ImportError:
+        compile_filter(filter)
+    except ValueError as e:
         return {
             "status": "error",
-            "message": "aiomqtt not installed. Run: pip install aiomqtt",
-            "topic": None,
+            "message": f"Invalid filter: {e}",
+            "topic": subscribe_topic,
             "elapsed_seconds": 0,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
-    
-    # Determine topic
-    subscribe_topic = topic or get_topic(session_id)
-    logger.info(f"Starting wait_for_message on topic: {subscribe_topic}")
-    
-    # Event and storage for received message
+
+    try:
+        buf = await inbox.buffer(subscribe_topic, filter)
+    except Exception as e:
+        logger.error(f"MQTT subscribe error: {e}")
+        return {
+            "status": "error",
+            "message": f"MQTT error: {str(e)}",
+            "topic": subscribe_topic,
+            "elapsed_seconds": 0,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    filtered_before = buf.filtered
+
+    async def received(batch: list[dict]) -> dict:
+        deadline = asyncio.get_event_loop().time() + linger_ms / 1000
+        while len(batch) < max_messages:
+            batch += buf.read(max_messages - len(batch))
+            remaining = deadline - asyncio.get_event_loop().time()
+            if len(batch) >= max_messages or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(buf.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        first = batch[0]
+        return {
+            "status": "received",
+            "message": first["message"],
+            "topic": first["topic"],
+            "messages": batch,
+            "count": len(batch),
+            "filtered": buf.filtered - filtered_before,
+            "elapsed_seconds": int(asyncio.get_event_loop().time() - start_time),
+            "timestamp": first["received_at"],
+            "pending": buf.unread()
+        }
+
+    # Already buffered: return without waiting
+    batch = buf.read(max_messages)
+    if batch:
+        return await received(batch)
+
     message_received = asyncio.Event()
-    received_data = {"payload": None, "topic": None}
-    start_time = asyncio.get_event_loop().time()
-    
+    received_data = {"batch": None}
+
     async def mqtt_listener():
-        """Subscribe to MQTT and wait for a message."""
-        try:
-            # Build connection kwargs
-            connect_kwargs = {
-                "hostname": MQTT_BROKER,
-                "port": MQTT_PORT,
-            }
-            if MQTT_USERNAME:
-                connect_kwargs["username"] = MQTT_USERNAME
-            if MQTT_PASSWORD:
-                connect_kwargs["password"] = MQTT_PASSWORD
-            
-            async with aiomqtt.Client(**connect_kwargs) as client:
-                await client.subscribe(subscribe_topic)
-                logger.info(f"Subscribed to {subscribe_topic}, waiting for messages...")
-                
-                async for msg in client.messages:
-                    try:
-                        payload = msg.payload.decode('utf-8')
-                        # Try to parse as JSON
-                        try:
-                            received_data["payload"] = json.loads(payload)
-                        except json.JSONDecodeError:
-                            received_data["payload"] = payload
-                        received_data["topic"] = str(msg.topic)
-                        logger.info(f"Message received on {msg.topic}")
-                        message_received.set()
-                        return
-                    except Exception as e:
-                        logger.error(f"Error processing message: {e}")
-                        continue
-        except Exception as e:
-            logger.error(f"MQTT listener error: {e}")
-            received_data["payload"] = f"MQTT error: {str(e)}"
-            message_received.set()
-    
+        """Take the next messages the inbox buffers on this topic."""
+        while True:
+            await buf.wait()
+            # Another caller on the same topic may have taken them first.
+            batch = buf.read(max_messages)
+            if batch:
+                received_data["batch"] = batch
+                message_received.set()
+                return
+
     async def progress_reporter(ctx):
         """Send progress notifications to keep connection alive."""
         tick = 0
@@ -180,25 +728,29 @@ async def wait_for_message(
             message_received.wait(),
             timeout=timeout
         )
-        
-        elapsed = int(asyncio.get_event_loop().time() - start_time)
-        
-        return {
-            "status": "received",
-            "message": received_data["payload"],
-            "topic": received_data["topic"] or subscribe_topic,
-            "elapsed_seconds": elapsed,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
+        # The timeout covers the first message; lingering is bounded on its own.
+        return await received(received_data["batch"])
         
     except asyncio.TimeoutError:
+        if received_data["batch"] is not None:
+            # Taken from the buffer just as the wait expired
+            return await received(received_data["batch"])
         elapsed = int(asyncio.get_event_loop().time() - start_time)
         logger.info(f"Timeout after {elapsed}s waiting for message")
         
+        if not inbox.connected and inbox.last_error:
+            return {
+                "status": "error",
+                "message": f"MQTT error: {inbox.last_error}",
+                "topic": subscribe_topic,
+                "elapsed_seconds": elapsed,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
         return {
             "status": "timeout",
             "message": None,
             "topic": subscribe_topic,
+            "filtered": buf.filtered - filtered_before,
             "elapsed_seconds": elapsed,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
@@ -239,16 +791,6 @@ async def send_message(
             - topic: The topic message was published to
             - timestamp: When the message was sent
     """
-    try:
-        import aiomqtt
-    except ImportError:
-        return {
-            "status": "error",
-            "message": "aiomqtt not installed. Run: pip install aiomqtt",
-            "topic": None,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-    
     # Determine topic
     publish_topic = topic or get_topic(target_session)
     
@@ -261,16 +803,7 @@ async def send_message(
     }
     
     try:
-        connect_kwargs = {
-            "hostname": MQTT_BROKER,
-            "port": MQTT_PORT,
-        }
-        if MQTT_USERNAME:
-            connect_kwargs["username"] = MQTT_USERNAME
-        if MQTT_PASSWORD:
-            connect_kwargs["password"] = MQTT_PASSWORD
-        
-        async with aiomqtt.Client(**connect_kwargs) as client:
+        async with mqtt_client() as client:
             await client.publish(
                 publish_topic,
                 json.dumps(envelope),
@@ -299,78 +832,105 @@ async def send_message(
 async def check_messages(
     topic: Optional[str] = None,
     session_id: Optional[str] = None,
-    timeout: float = 0.5,
+    timeout: float = 0.0,
+    max_messages: int = 1,
+    peek: bool = False,
+    auto_ack: bool = True,
 ) -> dict:
     """
     Quick non-blocking check for pending messages.
     
-    Unlike wait_for_message, this returns immediately if no message
-    is available. Useful for polling patterns.
+    Reads from the server's local inbox, which stays subscribed to every
+    topic checked or waited on, so this returns immediately and nothing
+    sent between checks is missed. The first check of a new topic only
+    starts its subscription.
     
     Args:
         topic: Full MQTT topic to check
         session_id: Session identifier for topic construction
-        timeout: How long to wait for a message (default: 0.5s)
+        timeout: Seconds to wait if nothing is pending (default: 0, don't wait)
+        max_messages: Most messages to return (default: 1)
+        peek: Return pending messages without consuming them
+        auto_ack: Acknowledge returned messages (default). With False they
+                  stay buffered until ack_messages commits them
     
     Returns:
         dict with keys:
             - has_message: bool
-            - message: The message if one was received
+            - message: The first message returned (for single-message callers)
+            - messages: List of {seq, topic, message, received_at}
             - topic: The topic checked
+            - pending: Unread messages left after this call
+            - cursor: {delivered, committed} sequence numbers
     """
-    try:
-        import aiomqtt
-    except ImportError:
-        return {
-            "has_message": False,
-            "message": "aiomqtt not installed",
-            "topic": None
-        }
-    
     check_topic = topic or get_topic(session_id)
     
     try:
-        connect_kwargs = {
-            "hostname": MQTT_BROKER,
-            "port": MQTT_PORT,
-        }
-        if MQTT_USERNAME:
-            connect_kwargs["username"] = MQTT_USERNAME
-        if MQTT_PASSWORD:
-            connect_kwargs["password"] = MQTT_PASSWORD
-        
-        async with aiomqtt.Client(**connect_kwargs) as client:
-            await client.subscribe(check_topic)
-            
-            try:
-                async with asyncio.timeout(timeout):
-                    async for msg in client.messages:
-                        try:
-                            payload = msg.payload.decode('utf-8')
-                            try:
-                                payload = json.loads(payload)
-                            except json.JSONDecodeError:
-                                pass
-                            return {
-                                "has_message": True,
-                                "message": payload,
-                                "topic": str(msg.topic)
-                            }
-                        except Exception:
-                            continue
-            except asyncio.TimeoutError:
-                return {
-                    "has_message": False,
-                    "message": None,
-                    "topic": check_topic
-                }
-                
+        buf = await inbox.buffer(check_topic)
     except Exception as e:
         return {
             "has_message": False,
             "message": f"Error: {str(e)}",
             "topic": check_topic
         }
+    
+    if not buf.unread() and timeout > 0:
+        try:
+            await asyncio.wait_for(buf.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    batch = buf.read(max_messages, peek=peek, auto_ack=auto_ack)
+    return {
+        "has_message": bool(batch),
+        "message": batch[0]["message"] if batch else None,
+        "messages": batch,
+        "topic": check_topic,
+        "pending": buf.unread(),
+        "cursor": {"delivered": buf.delivered, "committed": buf.committed}
+    }
+
+
+@mcp.tool()
+async def ack_messages(
+    seq: Optional[int] = None,
+    topic: Optional[str] = None,
+    session_id: Optional[str] = None,
+    redeliver: bool = False,
+    forget: bool = False,
+) -> dict:
+    """
+    Commit messages read with check_messages(auto_ack=False).
+    
+    Args:
+        seq: Acknowledge every delivered message up to this sequence number
+             (default: all delivered so far, unless redeliver is set)
+        topic: Full MQTT topic
+        session_id: Session identifier for topic construction
+        redeliver: Hand out still-unacknowledged messages again; without
+                   seq this acknowledges nothing (a negative ack)
+        forget: Done with this topic: unsubscribe and delete its buffered
+                messages and offset (use when a session ends)
+    
+    Returns:
+        dict with keys:
+            - topic: The topic acknowledged
+            - committed: Last committed sequence number
+            - pending: Unread messages after this call
+            - forgotten: Whether the topic was dropped (forget only)
+    """
+    ack_topic = topic or get_topic(session_id)
+    if forget:
+        forgotten = await inbox.forget(ack_topic)
+        return {"topic": ack_topic, "committed": 0, "pending": 0, "forgotten": forgotten}
+    buf = inbox.buffers.get(ack_topic)
+    if buf is None:
+        return {"topic": ack_topic, "committed": 0, "pending": 0}
+    if seq is not None or not redeliver:
+        buf.commit(seq)
+    if redeliver:
+        buf.rewind()
+    return {"topic": ack_topic, "committed": buf.committed, "pending": buf.unread()}
 
 
 @mcp.tool()
@@ -388,6 +948,8 @@ async def get_status() -> dict:
         "mqtt_broker": MQTT_BROKER,
         "mqtt_port": MQTT_PORT,
         "default_topic": get_topic(),
+        "inbox": inbox.stats(),
+        "filters": filter_stats(),
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
@@ -0,0 +1,325 @@
+"""
+Offline tests for the bacon-mqtt inbox (TopicBuffer, Inbox, InboxStore).
+
+MQTT traffic goes through control_plane/transport.py's in-process
+LoopbackTransport, so no broker is needed.
+
+Usage:
+    python -m pytest -q test_inbox.py
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from transport import LoopbackTransport  # noqa: E402
+
+from bacon_mqtt_mcp import server  # noqa: E402
+from bacon_mqtt_mcp.server import Inbox, InboxStore, TopicBuffer  # noqa: E402
+
+TOPIC = "bacon/claude/test/inbox"
+
+
+def entry(n: int, **fields) -> dict:
+    return {"topic": TOPIC, "message": {"n": n, **fields}, "received_at": "2026-01-01T00:00:00+00:00"}
+
+
+def numbers(entries: list[dict]) -> list[int]:
+    return [e["message"]["n"] for e in entries]
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    loopback = LoopbackTransport()
+    monkeypatch.setattr(server, "CLIENT_FACTORY", loopback.client)
+    return loopback
+
+
+async def connect(inbox: Inbox):
+    inbox.start()
+    while not inbox.connected:
+        await asyncio.sleep(0.01)
+
+
+async def publish(transport: LoopbackTransport, *payloads: dict, topic: str = TOPIC):
+    async with transport.client() as client:
+        for payload in payloads:
+            await client.publish(topic, json.dumps(payload), qos=1)
+    # Let the inbox's subscriber task dispatch them.
+    await asyncio.sleep(0.05)
+
+
+# TopicBuffer cursors
+
+def test_auto_ack_read_commits_and_removes():
+    buf = TopicBuffer(TOPIC, maxlen=10)
+    for n in range(3):
+        buf.append(entry(n))
+    assert numbers(buf.read(2)) == [0, 1]
+    assert (buf.delivered, buf.committed, buf.unread()) == (2, 2, 1)
+    assert [e["seq"] for e in buf.entries] == [3]
+
+
+def test_manual_ack_commit_and_rewind():
+    buf = TopicBuffer(TOPIC, maxlen=10)
+    for n in range(3):
+        buf.append(entry(n))
+    assert numbers(buf.read(2, auto_ack=False)) == [0, 1]
+    assert (buf.delivered, buf.committed, buf.unread()) == (2, 0, 1)
+
+    buf.rewind()
+    assert buf.unread() == 3
+    assert numbers(buf.read(3, auto_ack=False)) == [0, 1, 2]
+
+    # Commits never pass what was delivered.
+    assert buf.commit(1) == 1
+    assert buf.commit(10) == 3
+    assert not buf.entries and buf.unread() == 0
+
+
+def test_peek_leaves_cursors():
+    buf = TopicBuffer(TOPIC, maxlen=10)
+    buf.append(entry(0))
+    assert numbers(buf.read(5, peek=True)) == [0]
+    assert (buf.delivered, buf.committed, buf.unread()) == (0, 0, 1)
+
+
+def test_full_buffer_drops_oldest():
+    buf = TopicBuffer(TOPIC, maxlen=2)
+    for n in range(3):
+        buf.append(entry(n))
+    assert buf.dropped == 1
+    assert numbers(buf.read(5)) == [1, 2]
+
+
+def test_wait_returns_once_a_message_arrives():
+    async def main():
+        buf = TopicBuffer(TOPIC, maxlen=10)
+        waiter = asyncio.create_task(buf.wait())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        buf.append(entry(0))
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(main())
+
+
+# Inbox subscriptions
+
+def test_messages_between_calls_are_buffered(transport):
+    async def main():
+        inbox = Inbox(maxlen=10)
+        await connect(inbox)
+        buf = await inbox.buffer(TOPIC)
+        await publish(transport, {"n": 0}, {"n": 1})
+        assert numbers(buf.read(5)) == [0, 1]
+        await inbox.close()
+
+    asyncio.run(main())
+
+
+def test_failed_subscribe_is_retried(transport):
+    async def main():
+        inbox = Inbox(maxlen=10)
+        await connect(inbox)
+        subscribe = inbox._client.subscribe
+        failures = [RuntimeError("broker said no")]
+
+        async def flaky(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return await subscribe(*args, **kwargs)
+
+        inbox._client.subscribe = flaky
+        with pytest.raises(RuntimeError):
+            await inbox.buffer(TOPIC)
+        assert TOPIC not in inbox.buffers
+
+        buf = await inbox.buffer(TOPIC)
+        await publish(transport, {"n": 0})
+        assert numbers(buf.read()) == [0]
+        await inbox.close()
+
+    asyncio.run(main())
+
+
+# Durable store
+
+def test_unacknowledged_messages_survive_restart(tmp_path):
+    path = str(tmp_path / "inbox.db")
+    buf = TopicBuffer(TOPIC, maxlen=10, store=InboxStore(path))
+    for n in range(3):
+        buf.append(entry(n))
+    buf.read(1)
+    buf.read(1, auto_ack=False)
+    buf.store.close()
+
+    restored = TopicBuffer(TOPIC, maxlen=10, store=InboxStore(path))
+    assert restored.committed == 1
+    assert numbers(restored.read(5)) == [1, 2]
+    restored.append(entry(3))
+    assert restored.last_seq == 4
+    restored.store.close()
+
+
+def test_inbox_restores_topics_at_open(tmp_path, transport):
+    path = str(tmp_path / "inbox.db")
+
+    async def main():
+        first = Inbox(maxlen=10, store=InboxStore(path))
+        await connect(first)
+        await first.buffer(TOPIC)
+        await publish(transport, {"n": 0})
+        await first.close()
+
+        # Nothing has asked for the topic yet, but it is subscribed again.
+        second = Inbox(maxlen=10, store=InboxStore(path))
+        await connect(second)
+        await publish(transport, {"n": 1})
+        assert numbers(second.buffers[TOPIC].read(5)) == [0, 1]
+        await second.close()
+
+    asyncio.run(main())
+
+
+def test_forget_unsubscribes_and_deletes(tmp_path, transport):
+    async def main():
+        inbox = Inbox(maxlen=10, store=InboxStore(str(tmp_path / "inbox.db")))
+        await connect(inbox)
+        await inbox.buffer(TOPIC)
+        await publish(transport, {"n": 0})
+        assert await inbox.forget(TOPIC)
+        assert not await inbox.forget(TOPIC)
+        assert inbox.store.consumers() == []
+        # Unsubscribed from the broker session too, not just dropped locally.
+        assert inbox._stale == set()
+
+        await publish(transport, {"n": 1})
+        assert TOPIC not in inbox.buffers
+        await inbox.close()
+
+    asyncio.run(main())
+
+
+def test_idle_topics_expire_but_pinned_ones_stay(tmp_path):
+    store = InboxStore(str(tmp_path / "inbox.db"))
+    inbox = Inbox(maxlen=10, idle_ttl=60)
+    inbox.open(store, pinned=("pinned",))
+    for topic in ("idle", "pinned", "busy"):
+        inbox.buffers[topic] = TopicBuffer(topic, 10, store)
+    for topic in ("idle", "pinned"):
+        inbox.buffers[topic].last_used = time.time() - 120
+
+    assert inbox.expire() == ["idle"]
+    assert sorted(inbox.buffers) == ["busy", "pinned"]
+    assert sorted(topic for topic, _ in store.consumers()) == ["busy", "pinned"]
+    assert inbox._stale == {"idle"}
+    store.close()
+
+
+def test_store_from_before_expiry_is_migrated(tmp_path):
+    path = str(tmp_path / "inbox.db")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE inbox_consumer (consumer TEXT PRIMARY KEY, committed INTEGER NOT NULL DEFAULT 0)")
+        conn.execute(
+            "CREATE TABLE inbox_message (consumer TEXT NOT NULL, seq INTEGER NOT NULL, topic TEXT NOT NULL,"
+            " payload TEXT NOT NULL, received_at TEXT NOT NULL, PRIMARY KEY (consumer, seq)) WITHOUT ROWID"
+        )
+        conn.execute("INSERT INTO inbox_consumer VALUES (?, 1)", (TOPIC,))
+        conn.execute("INSERT INTO inbox_message VALUES (?, 2, ?, ?, ?)", (TOPIC, TOPIC, json.dumps({"n": 2}), "t"))
+    conn.close()
+
+    store = InboxStore(path)
+    assert store.consumers() == [(TOPIC, None)]
+    committed, last_used, rows = store.load(TOPIC)
+    assert committed == 1 and last_used > time.time() - 60
+    assert numbers(rows) == [2]
+    store.close()
+
+
+# Wake filters
+
+WAKE_ONLY = {"type_in": ["WAKE"]}
+
+
+def test_filtered_consumer_does_not_consume(transport):
+    async def main():
+        inbox = Inbox(maxlen=10)
+        await connect(inbox)
+        everything = await inbox.buffer(TOPIC)
+        wakes = await inbox.buffer(TOPIC, WAKE_ONLY)
+        await publish(transport, {"n": 0, "type": "text"}, {"n": 1, "type": "wake"})
+
+        assert numbers(wakes.read(5)) == [1]
+        assert wakes.filtered == 1
+        assert numbers(everything.read(5)) == [0, 1]
+        await inbox.close()
+
+    asyncio.run(main())
+
+
+def test_filtered_consumer_starts_from_unread_messages(transport):
+    async def main():
+        inbox = Inbox(maxlen=10)
+        await connect(inbox)
+        everything = await inbox.buffer(TOPIC)
+        await publish(transport, {"n": 0, "type": "wake"}, {"n": 1, "type": "text"}, {"n": 2, "type": "wake"})
+        everything.read(1)
+
+        wakes = await inbox.buffer(TOPIC, WAKE_ONLY)
+        assert numbers(wakes.read(5)) == [2]
+        assert everything.unread() == 2
+        await inbox.close()
+
+    asyncio.run(main())
+
+
+def test_wait_for_message_filter_leaves_other_messages(monkeypatch, transport):
+    monkeypatch.setattr(server, "inbox", Inbox(maxlen=10))
+
+    async def main():
+        await server.check_messages(topic=TOPIC)
+        await connect(server.inbox)
+        await publish(transport, {"n": 0, "type": "text"}, {"n": 1, "type": "WAKE"})
+
+        woke = await server.wait_for_message(topic=TOPIC, timeout=1, filter=WAKE_ONLY)
+        assert woke["status"] == "received" and woke["message"]["n"] == 1
+
+        checked = await server.check_messages(topic=TOPIC, max_messages=10)
+        assert numbers(checked["messages"]) == [0, 1]
+
+        invalid = await server.wait_for_message(topic=TOPIC, timeout=1, filter={"type_in": "WAKE"})
+        assert invalid["status"] == "error"
+        await server.inbox.close()
+
+    asyncio.run(main())
+
+
+def test_filtered_consumers_are_restored_and_forgotten(tmp_path, transport):
+    path = str(tmp_path / "inbox.db")
+
+    async def main():
+        first = Inbox(maxlen=10, store=InboxStore(path))
+        await connect(first)
+        await first.buffer(TOPIC, WAKE_ONLY)
+        await publish(transport, {"n": 0, "type": "text"}, {"n": 1, "type": "wake"})
+        await first.close()
+
+        second = Inbox(maxlen=10, store=InboxStore(path))
+        assert second.store.consumers() == [(TOPIC, WAKE_ONLY)]
+        wakes = await second.buffer(TOPIC, WAKE_ONLY)
+        assert numbers(wakes.read(5)) == [1]
+
+        assert await second.forget(TOPIC)
+        assert not second.buffers and second.store.consumers() == []
+        await second.close()
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+Tests for the wake filters (message_filter.py, vendored from the control
+plane by control_plane/vendor_filters.py).
+
+Usage:
+    python -m pytest -q test_message_filter.py
+"""
+
+import pytest
+
+from bacon_mqtt_mcp import message_filter
+from bacon_mqtt_mcp.message_filter import MessageFilter, compile_filter, message_priority, message_type
+
+
+def signal(type_: str, priority=None, requester: str = "control-plane") -> dict:
+    """A control-plane signal envelope, fields wrapped in content."""
+    content = {"type": type_, "requester": requester}
+    if priority is not None:
+        content["priority"] = priority
+    return {"type": "signal", "source": "srv906866", "content": content}
+
+
+def test_type_is_read_from_content_then_envelope():
+    assert message_type(signal("WAKE")) == "WAKE"
+    assert message_type({"type": "wake", "content": "hello"}) == "WAKE"
+    assert message_type({"content": {"type": None}, "type": "interrupt"}) == "INTERRUPT"
+    assert message_type({"content": "no type"}) is None
+    assert message_type("raw text") is None
+
+
+def test_falsy_fields_are_not_replaced():
+    assert message_priority(signal("WAKE", 0)) == 0.0
+    assert message_priority({"content": {"priority": 0}, "priority": "critical"}) == 0.0
+    assert message_priority({}) == 1.0
+    assert message_type({"content": {"type": ""}, "type": "WAKE"}) == ""
+
+
+def test_type_in():
+    wake = MessageFilter({"type_in": ["wake", "INTERRUPT"]})
+    assert wake(signal("WAKE")) and wake(signal("interrupt"))
+    assert not wake(signal("PING"))
+    # A message without a type is not the type "NONE".
+    assert not MessageFilter({"type_in": ["NONE"]})({"content": "hi"})
+    assert not MessageFilter({"type_in": []})(signal("WAKE"))
+
+
+def test_min_priority():
+    high = MessageFilter({"min_priority": "high"})
+    assert high(signal("WAKE", "urgent")) and high(signal("WAKE", 2))
+    assert not high(signal("WAKE", "normal")) and not high(signal("WAKE"))
+    assert not MessageFilter({"min_priority": 1})(signal("WAKE", 0))
+    assert MessageFilter({"min_priority": "normal"})({"type": "text"})
+
+
+def test_senders_and_equals():
+    senders = MessageFilter({"senders": ["control-plane", "zbook"]})
+    assert senders(signal("WAKE"))
+    assert senders({"from": "zbook", "type": "text"})
+    assert not senders({"from": "elitebook"})
+    deploy = MessageFilter({"equals": {"content.reason": "deploy", "content.n": 0}})
+    assert deploy({"content": {"reason": "deploy", "n": 0}})
+    assert not deploy({"content": {"reason": "deploy"}})
+
+
+@pytest.mark.parametrize("spec", [
+    {"bogus": 1},
+    {"min_priority": "soon"},
+    {"type_in": "WAKE"},
+    {"senders": "zbook"},
+    {"equals": [["content.reason", "deploy"]]},
+    ["WAKE"],
+    "WAKE",
+])
+def test_invalid_specs_raise(spec):
+    with pytest.raises(ValueError):
+        compile_filter(spec)
+
+
+def test_compiled_once_per_spec():
+    assert compile_filter(None) is None and compile_filter({}) is None
+    first = compile_filter({"type_in": ["WAKE"], "min_priority": "high"})
+    assert compile_filter({"min_priority": "high", "type_in": ["WAKE"]}) is first
+    assert first.stats() in message_filter.filter_stats()
+
@@ -38,7 +38,8 @@ interface MessageHistory {
   state: string;
 }
 
-const BACON_API = '/api/agents';
+const BACON_WS = '/ws';
+const HISTORY_LIMIT = 20;
 
 // Helper Component for Legend
 const LegendItem = ({ color, label, shape, isLink, onClick }: {
@@ -274,47 +275,64 @@ const App: React.FC = () => {
     return () => clearTimeout(timer);
   }, [nodeSettings, typeConfigs, settingsLoaded]);
 
-  // Poll for agent updates
+  // Live agent and message state pushed over the control-plane WebSocket
   useEffect(() => {
-    const fetchAgents = async () => {
-      try {
-        const response = await fetch(BACON_API);
-        const data: Agent[] = await response.json();
-        // Filter stale agents (not seen in last 60s)
-        const activeAgents = data.filter(a => {
-          // Force UTC parsing by appending Z if missing
-          const ts = a.last_seen.endsWith('Z') ? a.last_seen : `${a.last_seen}Z`;
-          const lastSeen = new Date(ts).getTime();
-          // Increase threshold to 24 hours for test stability (86,400,000 ms)
-          return (Date.now() - lastSeen) < 86400000;
-        });
-        setAgents(activeAgents);
-        // Do not set loading false here, wait for first zoom in onEngineStop
-      } catch (error) {
-        console.error('Failed to fetch agents:', error);
-      }
+    // Filter stale agents (not seen in last 24 hours, kept high for test stability)
+    const isActive = (a: Agent) => {
+      // Force UTC parsing by appending Z if missing
+      const ts = a.last_seen.endsWith('Z') ? a.last_seen : `${a.last_seen}Z`;
+      return (Date.now() - new Date(ts).getTime()) < 86400000;
     };
 
-    fetchAgents();
-    const interval = setInterval(fetchAgents, 5000);
-    return () => clearInterval(interval);
-  }, []);
+    let socket: WebSocket | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let retryDelay = 1000;
+    let closed = false;
 
-  // Poll for message history
-  useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const response = await fetch('/api/history?limit=20');
-        const data: MessageHistory[] = await response.json();
-        setMessages(data);
-      } catch (error) {
-        console.error('Failed to fetch history:', error);
-      }
+    const connect = () => {
+      const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+      socket = new WebSocket(`${protocol}://${window.location.host}${BACON_WS}`);
+
+      socket.onopen = () => { retryDelay = 1000; };
+
+      socket.onmessage = (event) => {
+        try {
+          const msg = JSON.parse(event.data);
+          if (msg.type === 'snapshot') {
+            setAgents((msg.agents as Agent[]).filter(isActive));
+            setMessages(msg.messages as MessageHistory[]);
+            // Do not set loading false here, wait for first zoom in onEngineStop
+          } else if (msg.type === 'agent') {
+            const delta = msg.data as Agent;
+            setAgents(prev => {
+              const idx = prev.findIndex(a => a.id === delta.id);
+              if (idx === -1) return isActive(delta) ? [...prev, delta] : prev;
+              const next = prev.slice();
+              next[idx] = { ...prev[idx], ...delta };
+              return next;
+            });
+          } else if (msg.type === 'message') {
+            setMessages(prev => [msg.data as MessageHistory, ...prev].slice(0, HISTORY_LIMIT));
+          }
+        } catch (error) {
+          console.error('Failed to handle dashboard event:', error);
+        }
+      };
+
+      socket.onclose = () => {
+        if (closed) return;
+        // Reconnect with capped exponential backoff; the server resends a snapshot
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      };
     };
 
-    fetchHistory();
-    const interval = setInterval(fetchHistory, 4000);
-    return () => clearInterval(interval);
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socket?.close();
+    };
   }, []);
 
   // Global Reheat - continuously keep simulation active
@@ -10,6 +10,10 @@ export default defineConfig({
       '/api': {
         target: 'http://srv906866.hstgr.cloud:8000',
         changeOrigin: true,
+      },
+      '/ws': {
+        target: 'ws://srv906866.hstgr.cloud:8000',
+        ws: true,
       }
     }
   },
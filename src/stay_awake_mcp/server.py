@@ -18,13 +18,17 @@ import asyncio
 import json
 import logging
 import os
+import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Callable, Optional
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent, Tool
 
+from message_filter import compile_filter, filter_stats
+
 # Conditional import for aiomqtt
 try:
     import aiomqtt
@@ -39,6 +43,8 @@ MQTT_PORT = int(os.environ.get("BACON_MQTT_PORT", "1883"))
 MQTT_USERNAME = os.environ.get("BACON_MQTT_USERNAME", "bacon-ai")
 MQTT_PASSWORD = os.environ.get("BACON_MQTT_PASSWORD", "Hjgev5QmuTHiNVWR")
 PROGRESS_INTERVAL = int(os.environ.get("BACON_PROGRESS_INTERVAL", "30"))
+MAILBOX_SIZE = int(os.environ.get("BACON_MAILBOX_SIZE", "1000"))
+MAILBOX_TTL = float(os.environ.get("BACON_MAILBOX_TTL", "3600"))
 
 # Logging setup
 logging.basicConfig(
@@ -50,6 +56,182 @@ logger = logging.getLogger(__name__)
 # Create MCP server
 server = Server("bacon-stay-awake")
 
+# Any callable returning an aiomqtt.Client-like object; when set, the
+# server runs against it even without aiomqtt installed.
+CLIENT_FACTORY: Optional[Callable[..., Any]] = None
+
+
+def mqtt_client(**kwargs):
+    """Create an MQTT client for the configured broker."""
+    if CLIENT_FACTORY is not None:
+        return CLIENT_FACTORY(**kwargs)
+    return aiomqtt.Client(
+        hostname=MQTT_BROKER,
+        port=MQTT_PORT,
+        username=MQTT_USERNAME,
+        password=MQTT_PASSWORD,
+        **kwargs
+    )
+
+
+def wake_topics() -> list[str]:
+    return [
+        f"bacon/signal/{AGENT_ID}",
+        f"bacon/conversation/{AGENT_ID}-inbox",
+        "bacon/broadcast/all"
+    ]
+
+
+class Mailbox:
+    """One long-lived subscription to the agent's wake topics, buffered in memory.
+
+    Messages that arrive between wait_for_wake_signal calls are queued
+    rather than lost, and waits never reconnect. When the mailbox is full
+    the oldest message is dropped (and counted) to make room. The
+    subscriber reconnects with backoff and resubscribes every topic.
+
+    Each message gets a sequence number. A waiter takes the first message
+    that passes its filter; the ones it skips stay queued for other waiters.
+    Messages no waiter takes within `max_age` seconds expire (and are
+    counted), so filtered-out traffic does not sit in the mailbox forever.
+    """
+
+    def __init__(self, topics: list[str], maxsize: int = 1000, max_age: float = 3600.0):
+        self.topics = list(topics)
+        self.messages: deque = deque()
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.last_seq = 0
+        self.connected = False
+        self.last_error: Optional[str] = None
+        self.received = 0
+        self.dropped = 0
+        self.expired = 0
+        self._arrived = asyncio.Event()
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with mqtt_client() as client:
+                    await client.subscribe([(topic, 1) for topic in self.topics])
+                    self._client = client
+                    self.connected = True
+                    backoff = 1.0
+                    logger.info(f"Mailbox subscribed to: {', '.join(self.topics)}")
+                    async for message in client.messages:
+                        self._put(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"MQTT mailbox error: {e}; reconnecting in {backoff:.0f}s")
+            finally:
+                self._client = None
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _put(self, message):
+        try:
+            payload = json.loads(message.payload.decode())
+        except Exception:
+            payload = {"raw": message.payload.decode(errors="replace")}
+        self.expire()
+        if len(self.messages) >= self.maxsize:
+            self.messages.popleft()
+            self.dropped += 1
+        self.last_seq += 1
+        self.messages.append({
+            "seq": self.last_seq,
+            "topic": str(message.topic),
+            "payload": payload,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "arrived": time.monotonic()
+        })
+        self.received += 1
+        self._arrived.set()
+        logger.info(f"Message received on {message.topic}")
+
+    def expire(self) -> int:
+        """Drop messages older than max_age (0 keeps them); returns how many."""
+        if self.max_age <= 0:
+            return 0
+        cutoff = time.monotonic() - self.max_age
+        expired = 0
+        while self.messages and self.messages[0]["arrived"] < cutoff:
+            self.messages.popleft()
+            expired += 1
+        self.expired += expired
+        return expired
+
+    def take(self, matches: Optional[Callable[[Any], bool]] = None,
+             after: int = 0) -> tuple[Optional[dict], int, int]:
+        """Remove and return the first message after seq `after` that passes `matches`.
+
+        Messages that fail the filter are left queued. Also returns the last
+        seq looked at, to pass back as `after` so each message is checked
+        once per waiter, and how many messages were skipped.
+        """
+        self.expire()
+        skipped = 0
+        for index, message in enumerate(self.messages):
+            if message["seq"] <= after:
+                continue
+            if matches is None or matches(message["payload"]):
+                del self.messages[index]
+                return message, message["seq"], skipped
+            skipped += 1
+        return None, max(after, self.last_seq), skipped
+
+    async def wait_after(self, seq: int):
+        """Return once a message newer than `seq` has arrived."""
+        while self.last_seq <= seq:
+            self._arrived.clear()
+            await self._arrived.wait()
+
+    async def add_topics(self, topics: list[str]):
+        """Subscribe to extra topics for the rest of the session."""
+        new = [topic for topic in topics if topic not in self.topics]
+        if not new:
+            return
+        self.topics.extend(new)
+        # When disconnected, the next reconnect subscribes to them.
+        if self._client is not None:
+            await self._client.subscribe([(topic, 1) for topic in new])
+            logger.info(f"Mailbox subscribed to: {', '.join(new)}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "topics": self.topics,
+            "queued": len(self.messages),
+            "capacity": self.maxsize,
+            "received": self.received,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "max_age": self.max_age,
+            "last_error": self.last_error
+        }
+
+
+mailbox = Mailbox(wake_topics(), MAILBOX_SIZE, MAILBOX_TTL)
+
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
@@ -59,11 +241,18 @@ async def list_tools() -> list[Tool]:
             name="wait_for_wake_signal",
             description=f"""Wait for a WAKE signal on MQTT for agent '{AGENT_ID}'.
 
-Subscribes to:
+Reads from the server's mailbox, which stays subscribed to:
 - bacon/signal/{AGENT_ID} - Direct signals
 - bacon/conversation/{AGENT_ID}-inbox - Incoming messages
 - bacon/broadcast/all - Broadcast messages
 
+Messages that arrived since the last call are returned immediately,
+oldest first; otherwise waits for the next one.
+
+With a filter, only matching messages wake the agent; the rest stay in
+the mailbox for other waiters and are counted as "filtered", e.g.
+{{"type_in": ["WAKE", "INTERRUPT"], "min_priority": "high", "senders": ["control-plane"]}}
+
 Sends progress notifications every {PROGRESS_INTERVAL} seconds to keep the agent alive.
 Maximum wait time is configurable (default 1 hour).
 
@@ -79,7 +268,19 @@ Returns the message content when received, or timeout status.""",
                     "additional_topics": {
                         "type": "array",
                         "items": {"type": "string"},
-                        "description": "Additional MQTT topics to subscribe to"
+                        "description": "Additional MQTT topics to subscribe to (kept for the rest of the session)"
+                    },
+                    "filter": {
+                        "type": "object",
+                        "description": "Only wake for matching messages. Keys (all optional, all must hold): "
+                                       "equals {dotted.path: value}, type_in [types], "
+                                       "min_priority (low/normal/high/urgent/critical or a number), senders [agent ids]",
+                        "properties": {
+                            "equals": {"type": "object"},
+                            "type_in": {"type": "array", "items": {"type": "string"}},
+                            "min_priority": {"type": ["string", "number"]},
+                            "senders": {"type": "array", "items": {"type": "string"}}
+                        }
                     }
                 }
             }
@@ -89,7 +290,7 @@ Returns the message content when received, or timeout status.""",
             description=f"""Send a message to another agent or broadcast.
 
 Sends from '{AGENT_ID}' to the specified target agent.
-Topic format: bacon/conversation/{target}-inbox""",
+Topic format: bacon/conversation/{{target}}-inbox""",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -150,6 +351,8 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
             "mqtt_broker": MQTT_BROKER,
             "mqtt_port": MQTT_PORT,
             "progress_interval": PROGRESS_INTERVAL,
+            "mailbox": mailbox.stats(),
+            "filters": filter_stats(),
             "topics": {
                 "signal": f"bacon/signal/{AGENT_ID}",
                 "inbox": f"bacon/conversation/{AGENT_ID}-inbox",
@@ -162,7 +365,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         status = arguments.get("status", "online")
         capabilities = arguments.get("capabilities", ["general"])
 
-        if aiomqtt is None:
+        if aiomqtt is None and CLIENT_FACTORY is None:
             return [TextContent(type="text", text=f"[SIMULATED] Would announce {AGENT_ID} as {status}")]
 
         presence = {
@@ -176,12 +379,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         topic = f"bacon/agents/{AGENT_ID}/presence"
 
         try:
-            async with aiomqtt.Client(
-                hostname=MQTT_BROKER,
-                port=MQTT_PORT,
-                username=MQTT_USERNAME,
-                password=MQTT_PASSWORD
-            ) as client:
+            async with mqtt_client() as client:
                 await client.publish(topic, json.dumps(presence), qos=1)
 
             return [TextContent(type="text", text=f"Presence announced: {AGENT_ID} is {status}")]
@@ -193,7 +391,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         content = arguments["content"]
         message_type = arguments.get("message_type", "conversation")
 
-        if aiomqtt is None:
+        if aiomqtt is None and CLIENT_FACTORY is None:
             return [TextContent(type="text", text=f"[SIMULATED] Would send to {target}: {content}")]
 
         if target == "broadcast":
@@ -210,12 +408,7 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         }
 
         try:
-            async with aiomqtt.Client(
-                hostname=MQTT_BROKER,
-                port=MQTT_PORT,
-                username=MQTT_USERNAME,
-                password=MQTT_PASSWORD
-            ) as client:
+            async with mqtt_client() as client:
                 await client.publish(topic, json.dumps(message), qos=1)
 
             return [TextContent(type="text", text=f"Message sent to {target} on {topic}")]
@@ -225,15 +418,25 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
     if name == "wait_for_wake_signal":
         timeout = arguments.get("timeout", 3600)
         additional_topics = arguments.get("additional_topics", [])
-
-        # Build topic list
-        topics = [
-            f"bacon/signal/{AGENT_ID}",
-            f"bacon/conversation/{AGENT_ID}-inbox",
-            "bacon/broadcast/all"
-        ] + additional_topics
-
-        if aiomqtt is None:
+        try:
+            matches = compile_filter(arguments.get("filter"))
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: invalid filter: {e}")]
+        cursor = {"after": 0, "filtered": 0}
+
+        def take() -> Optional[dict]:
+            """The next mailbox message passing the filter, skipping ones already checked."""
+            message, cursor["after"], skipped = mailbox.take(matches, cursor["after"])
+            cursor["filtered"] += skipped
+            return message
+
+        def reply(message: dict) -> list[TextContent]:
+            result = {key: value for key, value in message.items() if key not in ("seq", "arrived")}
+            result["pending"] = len(mailbox.messages)
+            result["filtered"] = cursor["filtered"]
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
+
+        if aiomqtt is None and CLIENT_FACTORY is None:
             # Simulated wait with progress
             logger.info("MQTT not available - simulating wait with progress...")
             for tick in range(1, min(timeout // PROGRESS_INTERVAL, 10) + 1):
@@ -241,43 +444,29 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
                 await asyncio.sleep(PROGRESS_INTERVAL)
             return [TextContent(type="text", text="[SIMULATED] Timeout - no MQTT available")]
 
+        mailbox.start()
+        try:
+            await mailbox.add_topics(additional_topics)
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
+
+        message = take()
+        if message is not None:
+            return reply(message)
+
         message_received = asyncio.Event()
         received_message = {"data": None}
         start_time = asyncio.get_event_loop().time()
 
         async def mqtt_listener():
-            """Listen for MQTT messages."""
-            try:
-                async with aiomqtt.Client(
-                    hostname=MQTT_BROKER,
-                    port=MQTT_PORT,
-                    username=MQTT_USERNAME,
-                    password=MQTT_PASSWORD
-                ) as client:
-                    for topic in topics:
-                        await client.subscribe(topic)
-                        logger.info(f"Subscribed to: {topic}")
-
-                    async for message in client.messages:
-                        try:
-                            payload = json.loads(message.payload.decode())
-                        except:
-                            payload = {"raw": message.payload.decode()}
-
-                        received_message["data"] = {
-                            "topic": str(message.topic),
-                            "payload": payload,
-                            "timestamp": datetime.now(timezone.utc).isoformat()
-                        }
-                        logger.info(f"Message received on {message.topic}")
-                        message_received.set()
-                        return
-            except asyncio.CancelledError:
-                logger.info("MQTT listener cancelled")
-            except Exception as e:
-                logger.error(f"MQTT error: {e}")
-                received_message["data"] = {"error": str(e)}
-                message_received.set()
+            """Take the next message from the mailbox that passes the filter."""
+            while True:
+                await mailbox.wait_after(cursor["after"])
+                message = take()
+                if message is not None:
+                    received_message["data"] = message
+                    message_received.set()
+                    return
 
         async def progress_reporter(ctx):
             """Send progress notifications to keep agent alive."""
@@ -320,12 +509,12 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
         progress_task = asyncio.create_task(progress_reporter(None))  # ctx would come from framework
 
         try:
-            await asyncio.wait_for(
-                asyncio.gather(listener_task, progress_task, return_exceptions=True),
-                timeout=timeout + 10
+            # Whichever finishes first: a message, or the reporter timing out.
+            await asyncio.wait(
+                {listener_task, progress_task},
+                timeout=timeout + 10,
+                return_when=asyncio.FIRST_COMPLETED
             )
-        except asyncio.TimeoutError:
-            pass
         finally:
             listener_task.cancel()
             progress_task.cancel()
@@ -336,15 +525,17 @@ async def call_tool(name: str, arguments: dict[str, Any]) -> list[TextContent]:
                 pass
 
         if received_message["data"]:
-            if "error" in received_message["data"]:
-                return [TextContent(type="text", text=f"Error: {received_message['data']['error']}")]
-            return [TextContent(type="text", text=json.dumps(received_message["data"], indent=2))]
+            return reply(received_message["data"])
         else:
-            return [TextContent(type="text", text=json.dumps({
+            result = {
                 "status": "timeout",
                 "agent_id": AGENT_ID,
-                "waited_seconds": timeout
-            }, indent=2))]
+                "waited_seconds": timeout,
+                "filtered": cursor["filtered"]
+            }
+            if not mailbox.connected and mailbox.last_error:
+                result["error"] = mailbox.last_error
+            return [TextContent(type="text", text=json.dumps(result, indent=2))]
 
     return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
@@ -356,8 +547,14 @@ async def main():
     logger.info(f"MQTT Broker: {MQTT_BROKER}:{MQTT_PORT}")
     logger.info(f"Progress Interval: {PROGRESS_INTERVAL}s")
 
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, server.create_initialization_options())
+    # Subscribe up front so messages sent before the first wait are kept.
+    if aiomqtt is not None or CLIENT_FACTORY is not None:
+        mailbox.start()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+    finally:
+        await mailbox.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,110 @@
+"""
+Offline tests for the stay-awake Mailbox.
+
+Messages are fed straight to Mailbox._put, so no broker is needed.
+
+Usage:
+    python -m pytest -q test_mailbox.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from message_filter import compile_filter  # noqa: E402
+from server import Mailbox  # noqa: E402
+
+TOPIC = "bacon/signal/test-agent"
+WAKE_ONLY = compile_filter({"type_in": ["WAKE"]})
+
+
+def put(mailbox: Mailbox, *payloads: dict):
+    for payload in payloads:
+        mailbox._put(SimpleNamespace(topic=TOPIC, payload=json.dumps(payload).encode()))
+
+
+def numbers(mailbox: Mailbox) -> list[int]:
+    return [m["payload"]["n"] for m in mailbox.messages]
+
+
+def test_take_returns_oldest_and_advances_cursor():
+    mailbox = Mailbox([TOPIC])
+    put(mailbox, {"n": 0}, {"n": 1})
+    message, after, skipped = mailbox.take()
+    assert (message["payload"]["n"], after, skipped) == (0, 1, 0)
+    assert numbers(mailbox) == [1]
+
+    message, after, _ = mailbox.take(after=after)
+    assert (message["payload"]["n"], after) == (1, 2)
+    assert mailbox.take(after=after) == (None, 2, 0)
+
+
+def test_cursor_checks_each_message_once():
+    mailbox = Mailbox([TOPIC])
+    put(mailbox, {"n": 0, "type": "text"}, {"n": 1, "type": "text"})
+    assert mailbox.take(WAKE_ONLY) == (None, 2, 2)
+    # Only the message after the cursor is looked at.
+    put(mailbox, {"n": 2, "type": "text"})
+    assert mailbox.take(WAKE_ONLY, after=2) == (None, 3, 1)
+
+
+def test_filtered_take_leaves_other_messages():
+    mailbox = Mailbox([TOPIC])
+    put(mailbox, {"n": 0, "type": "text"}, {"n": 1, "type": "wake"}, {"n": 2, "type": "text"})
+    message, after, skipped = mailbox.take(WAKE_ONLY)
+    assert (message["payload"]["n"], after, skipped) == (1, 2, 1)
+    assert numbers(mailbox) == [0, 2]
+
+    # A waiter without a filter still gets the skipped messages.
+    message, _, _ = mailbox.take()
+    assert message["payload"]["n"] == 0
+
+
+def test_full_mailbox_drops_oldest():
+    mailbox = Mailbox([TOPIC], maxsize=2)
+    put(mailbox, {"n": 0}, {"n": 1}, {"n": 2})
+    assert mailbox.dropped == 1
+    assert numbers(mailbox) == [1, 2]
+    assert mailbox.stats()["queued"] == 2
+
+
+def test_untaken_messages_expire():
+    mailbox = Mailbox([TOPIC], max_age=60)
+    put(mailbox, {"n": 0, "type": "text"}, {"n": 1, "type": "text"})
+    mailbox.messages[0]["arrived"] -= 120
+    assert mailbox.take(WAKE_ONLY) == (None, 2, 1)
+    assert mailbox.expired == 1
+    assert numbers(mailbox) == [1]
+
+    # Arrivals expire old messages too, even with no waiter.
+    mailbox.messages[0]["arrived"] -= 120
+    put(mailbox, {"n": 2})
+    assert mailbox.expired == 2
+    assert numbers(mailbox) == [2]
+
+
+def test_zero_max_age_keeps_messages():
+    mailbox = Mailbox([TOPIC], max_age=0)
+    put(mailbox, {"n": 0})
+    mailbox.messages[0]["arrived"] -= 10 ** 6
+    assert mailbox.expire() == 0
+    assert numbers(mailbox) == [0]
+
+
+def test_wait_after_returns_once_a_newer_message_arrives():
+    async def main():
+        mailbox = Mailbox([TOPIC])
+        put(mailbox, {"n": 0})
+        await asyncio.wait_for(mailbox.wait_after(0), 1)
+
+        waiter = asyncio.create_task(mailbox.wait_after(1))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        put(mailbox, {"n": 1})
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(main())